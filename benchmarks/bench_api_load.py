@@ -0,0 +1,359 @@
+"""
+Load test the HTTP API's read and write endpoints.
+
+Serves main.app with uvicorn in a subprocess on a database seeded with N synthetic
+deployments, then drives each scenario below with a fixed number of concurrent
+clients for a fixed time. Background provisioning is stubbed out: there is no
+DigitalOcean token and no embedded worker, so /provision only writes its rows and
+queues the job. Per scenario it reports requests per second, latency percentiles,
+errors, and the server's event-loop lag (how late a 10ms timer on the server loop
+fires), which is where blocking calls inside async endpoints show up.
+
+    python benchmarks/bench_api_load.py
+    python benchmarks/bench_api_load.py --rows 100000 --concurrency 50 --duration 20
+    python benchmarks/bench_api_load.py --scenarios status,renew --no-cache
+    python benchmarks/bench_api_load.py --save-baseline benchmarks/baselines/api_load_sqlite.json
+    python benchmarks/bench_api_load.py --baseline benchmarks/baselines/api_load_sqlite.json
+
+--no-cache turns the status, wallet and free deploy caches off so every read reaches
+the database. With --database-url the deployments and provision_jobs tables of that
+database are emptied and reseeded, so only point it at a scratch database.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+DEPLOYMENTS_PER_WALLET = 5
+STATUS_WEIGHTS = [("ready", 70), ("destroyed", 20), ("failed", 6), ("pending", 2), ("configuring_openclaw", 2)]
+INSERT_CHUNK = 10000
+LAG_INTERVAL = 0.01
+SAMPLE_IDS = 2000
+FAKE_KEY = "sk-ant-load-" + "x" * 40
+
+SCENARIOS = ["status", "deployments", "deployments_wallet", "free_deploys", "renew", "provision"]
+
+
+def percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Server side (runs in the subprocess)
+
+def seed(rows: int):
+    import main
+
+    now = datetime.utcnow()
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    wallets = max(1, rows // DEPLOYMENTS_PER_WALLET)
+    table = main.DeploymentModel.__table__
+    with main.engine.begin() as conn:
+        conn.execute(main.ProvisionJobModel.__table__.delete())
+        conn.execute(table.delete())
+        chunk = []
+        for i in range(rows):
+            created_at = now - timedelta(days=30) * (1 - i / rows)
+            status = random.choice(statuses)
+            # Nothing the expiry scheduler would act on mid-run
+            if status in ("destroyed", "failed"):
+                expires_at = created_at + timedelta(days=7)
+            else:
+                expires_at = now + timedelta(days=random.uniform(1, 7))
+            chunk.append({
+                "deployment_id": f"{i:08x}{random.getrandbits(32):08x}",
+                "status": status,
+                "anthropic_key_masked": "sk-ant-...",
+                "wallet_address": f"wallet{random.randrange(wallets)}",
+                "region": random.choice(["nyc3", "sfo3", "ams3", "sgp1"]),
+                "droplet_id": 100000000 + i,
+                "ip_address": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                "expires_at": expires_at,
+                "is_free_deploy": 0,
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+            if len(chunk) == INSERT_CHUNK:
+                conn.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(table.insert(), chunk)
+
+
+class LoopLagMonitor:
+    """Samples how late a short timer fires on the event loop it runs on"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(loop.time() - started - self.interval)
+
+    def take(self) -> dict:
+        samples, self.samples = self.samples, []
+        return {
+            "samples": len(samples),
+            "p50_ms": percentile(samples, 0.5) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "max_ms": max(samples, default=0.0) * 1000,
+        }
+
+
+def serve(args):
+    import logging
+
+    import uvicorn
+
+    import main
+
+    logging.getLogger().setLevel(logging.WARNING)
+    main.prepare_database()
+    random.seed(args.seed)
+    seed(args.rows)
+
+    monitor = LoopLagMonitor(LAG_INTERVAL)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with main.lifespan(app):
+            task = asyncio.create_task(monitor.run())
+            yield
+            task.cancel()
+
+    async def loop_lag():
+        return monitor.take()
+
+    app = main.create_app()
+    app.router.lifespan_context = lifespan
+    app.add_api_route("/_bench/loop-lag", loop_lag, methods=["POST"])
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# Client side
+
+def start_server(args, database_url: str) -> tuple:
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        EMBEDDED_WORKER="false",
+        DIGITALOCEAN_TOKEN="",
+        WARM_POOL_SIZES="",
+    )
+    if args.no_cache:
+        env.update(STATUS_CACHE_TTL="0", WALLET_CACHE_TTL="0", FREE_DEPLOYS_CACHE_TTL="0")
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+         "--rows", str(args.rows), "--seed", str(args.seed)],
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            httpx.get(f"{url}/")
+            return process, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("API server did not start")
+
+
+def sample_deployments(database_url: str) -> list:
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(text(
+                "SELECT deployment_id, wallet_address FROM deployments ORDER BY RANDOM() LIMIT :n"
+            ), {"n": SAMPLE_IDS})]
+    finally:
+        engine.dispose()
+
+
+def scenario_request(name: str, deployments: list) -> tuple:
+    deployment_id, wallet = random.choice(deployments)
+    if name == "status":
+        return "GET", f"/status/{deployment_id}", None
+    if name == "deployments":
+        return "GET", "/deployments", None
+    if name == "deployments_wallet":
+        return "GET", f"/deployments?wallet={wallet}", None
+    if name == "free_deploys":
+        return "GET", "/free-deploys", None
+    if name == "renew":
+        return "POST", "/renew", {
+            "deployment_id": deployment_id, "wallet_address": wallet, "payment_signature": "load-test"
+        }
+    if name == "provision":
+        return "POST", "/provision", {
+            "anthropic_api_key": FAKE_KEY, "wallet_address": wallet, "region": "nyc3"
+        }
+    raise ValueError(f"Unknown scenario {name}")
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, deployments: list, args) -> dict:
+    latencies = []
+    errors = 0
+
+    async def worker(until: float, record: bool):
+        nonlocal errors
+        while time.perf_counter() < until:
+            method, path, body = scenario_request(name, deployments)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if record:
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+    warmup_until = time.perf_counter() + args.warmup
+    await asyncio.gather(*(worker(warmup_until, False) for _ in range(args.concurrency)))
+
+    await client.post("/_bench/loop-lag")
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(started + args.duration, True) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    lag = (await client.post("/_bench/loop-lag")).json()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "loop_lag_p50_ms": lag["p50_ms"],
+        "loop_lag_p99_ms": lag["p99_ms"],
+        "loop_lag_max_ms": lag["max_ms"],
+    }
+
+
+def report(results: dict, baseline: dict = None):
+    print(f"\n  {'scenario':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'lag p99':>8} {'lag max':>8}")
+    for name, r in results.items():
+        print(f"  {name:<20} {r['rps']:>8.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['errors']:>7} {r['loop_lag_p99_ms']:>8.1f} {r['loop_lag_max_ms']:>8.1f}")
+    if not baseline:
+        return
+    print(f"\n  against baseline ({baseline['config']})")
+    print(f"  {'scenario':<20} {'req/s':>8} {'p95 ms':>8} {'lag p99':>8}")
+    for name, r in results.items():
+        b = baseline["results"].get(name)
+        if not b:
+            continue
+        print(f"  {name:<20} {r['rps'] / b['rps'] if b['rps'] else 0:>7.2f}x "
+              f"{r['p95_ms'] / b['p95_ms'] if b['p95_ms'] else 0:>7.2f}x "
+              f"{r['loop_lag_p99_ms'] / b['loop_lag_p99_ms'] if b['loop_lag_p99_ms'] else 0:>7.2f}x")
+
+
+async def run_all(url: str, deployments: list, scenarios: list, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        results = {}
+        for name in scenarios:
+            results[name] = await run_scenario(client, name, deployments, args)
+            print(f"  {name}: {results[name]['rps']:.0f} req/s")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="deployments to seed")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated scenarios to run")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--no-cache", action="store_true", help="disable the read caches on the server")
+    parser.add_argument("--database-url", help="scratch database to use instead of a temporary SQLite file")
+    parser.add_argument("--baseline", help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        started = time.perf_counter()
+        process, url = start_server(args, database_url)
+        try:
+            print(f"Seeded {args.rows:,} deployments and started the API in {time.perf_counter() - started:.1f}s")
+            deployments = sample_deployments(database_url)
+            results = asyncio.run(run_all(url, deployments, scenarios, args))
+        finally:
+            process.terminate()
+            process.wait()
+
+    config = {
+        "rows": args.rows,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "cache": not args.no_cache,
+        "database": database_url.split(":", 1)[0],
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            rounded = {
+                name: {key: round(value, 2) for key, value in result.items()} for name, result in results.items()
+            }
+            json.dump({"config": config, "results": rounded}, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+
+if __name__ == "__main__":
+    main()
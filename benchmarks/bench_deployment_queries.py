@@ -0,0 +1,211 @@
+"""
+Benchmark the hot deployments queries before and after the index migrations.
+
+Fills a scratch deployments table with N synthetic rows, times the queries the API
+runs (wallet listing, a deep keyset page, the expiry scan) without the indexes from
+migrations.py, applies them, and times the same queries again. The expiry scan is
+the statement main builds, and plans are taken for the SQL it actually executes.
+
+    python benchmarks/bench_deployment_queries.py
+    python benchmarks/bench_deployment_queries.py --sizes 10000,100000 --repeat 50
+    python benchmarks/bench_deployment_queries.py --database-url postgresql://localhost/scratch
+
+With --database-url the deployments and schema_migrations tables of that database
+are dropped and recreated, so only point it at a scratch database.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing main must not touch a real database; only the table definition is used
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+
+from main import DeploymentModel, ProvisionJobModel, upcoming_expiries_query  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+# Deployments still inside their 7 day term are mostly live; older ones have been reaped,
+# apart from a small backlog the expiry checker has not reached yet
+LIVE_STATUS_WEIGHTS = [("ready", 90), ("failed", 6), ("pending", 2), ("configuring_openclaw", 2)]
+PAST_STATUS_WEIGHTS = [("destroyed", 944), ("failed", 50), ("ready", 5), ("expired", 1)]
+DEPLOYMENTS_PER_WALLET = 5
+INSERT_CHUNK = 10000
+
+QUERIES = {
+    "wallet_first_page": text(
+        "SELECT deployment_id, status, created_at FROM deployments "
+        "WHERE wallet_address = :wallet "
+        "ORDER BY created_at DESC, deployment_id DESC LIMIT 101"
+    ),
+    "keyset_deep_page": text(
+        "SELECT deployment_id, status, created_at FROM deployments "
+        "WHERE created_at <= :cursor_created "
+        "AND (created_at < :cursor_created OR deployment_id < :cursor_id) "
+        "ORDER BY created_at DESC, deployment_id DESC LIMIT 101"
+    ),
+    # The expiry scheduler's own statement (see query_statements)
+    "expiry_scan": None,
+}
+
+
+def generate_rows(count: int, now: datetime):
+    live_statuses = [status for status, weight in LIVE_STATUS_WEIGHTS for _ in range(weight)]
+    past_statuses = [status for status, weight in PAST_STATUS_WEIGHTS for _ in range(weight)]
+    wallets = max(1, count // DEPLOYMENTS_PER_WALLET)
+    start = now - timedelta(days=365)
+    step = timedelta(days=365) / count
+
+    for i in range(count):
+        created_at = start + step * i
+        expires_at = created_at + timedelta(days=7)
+        status = random.choice(live_statuses if expires_at > now else past_statuses)
+        yield {
+            "deployment_id": f"{i:08x}{random.getrandbits(32):08x}",
+            "status": status,
+            "anthropic_key_masked": "sk-ant-...",
+            "wallet_address": f"wallet{random.randrange(wallets)}",
+            "region": random.choice(["nyc3", "sfo3", "ams3", "sgp1"]),
+            "droplet_id": 100000000 + i,
+            "ip_address": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            "expires_at": expires_at,
+            "is_free_deploy": 0,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+def populate(engine, count: int, now: datetime):
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+    DeploymentModel.__table__.drop(engine, checkfirst=True)
+    DeploymentModel.__table__.create(engine)
+    # Later migrations add columns to provision_jobs, so it has to exist (empty is fine)
+    ProvisionJobModel.__table__.create(engine, checkfirst=True)
+
+    table = DeploymentModel.__table__
+    chunk = []
+    with engine.begin() as conn:
+        for row in generate_rows(count, now):
+            chunk.append(row)
+            if len(chunk) == INSERT_CHUNK:
+                conn.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(table.insert(), chunk)
+
+
+def analyze(engine):
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def query_statements(engine, now: datetime) -> dict:
+    """{name: (statement, params)} for every query"""
+    with engine.connect() as conn:
+        wallet = conn.execute(text("SELECT wallet_address FROM deployments LIMIT 1")).scalar()
+        middle = conn.execute(text(
+            "SELECT created_at, deployment_id FROM deployments ORDER BY created_at, deployment_id "
+            "LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM deployments)"
+        )).first()
+    return {
+        "wallet_first_page": (QUERIES["wallet_first_page"], {"wallet": wallet}),
+        "keyset_deep_page": (QUERIES["keyset_deep_page"], {"cursor_created": middle[0], "cursor_id": middle[1]}),
+        "expiry_scan": (upcoming_expiries_query(now), {}),
+    }
+
+
+def query_plan(conn, statement, params: dict) -> str:
+    """Plan of the SQL and parameters the statement sends to the driver"""
+    executed = []
+
+    def capture(conn, cursor, sql, parameters, context, executemany):
+        executed.append((sql, parameters))
+
+    event.listen(conn, "before_cursor_execute", capture)
+    try:
+        conn.execute(statement, params).fetchall()
+    finally:
+        event.remove(conn, "before_cursor_execute", capture)
+
+    sql, parameters = executed[0]
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.exec_driver_sql(prefix + sql, parameters).fetchall()
+    return "; ".join(str(row[-1]) for row in rows)
+
+
+def time_queries(engine, statements: dict, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for name, (statement, params) in statements.items():
+            conn.execute(statement, params).fetchall()  # warm up
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(statement, params).fetchall()
+                samples.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                "median_ms": statistics.median(samples),
+                "plan": query_plan(conn, statement, params),
+            }
+    return results
+
+
+def run_size(database_url: str, count: int, repeat: int):
+    now = datetime.utcnow()
+    engine = create_engine(database_url)
+    try:
+        started = time.perf_counter()
+        populate(engine, count, now)
+        print(f"\n{count:,} rows (loaded in {time.perf_counter() - started:.1f}s)")
+
+        # Baseline: every migration except the index one
+        run_migrations(engine, target=1)
+        analyze(engine)
+        statements = query_statements(engine, now)
+        before = time_queries(engine, statements, repeat)
+
+        run_migrations(engine)
+        analyze(engine)
+        # Fresh connections: the driver's statement cache would otherwise replay the old EXPLAINs
+        engine.dispose()
+        after = time_queries(engine, statements, repeat)
+
+        print(f"  {'query':<20} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+        for name in QUERIES:
+            b, a = before[name]["median_ms"], after[name]["median_ms"]
+            print(f"  {name:<20} {b:>10.3f} {a:>10.3f} {b / a if a else 0:>8.1f}x")
+        for name in QUERIES:
+            print(f"  plan {name}:")
+            print(f"    before: {before[name]['plan']}")
+            print(f"    after:  {after[name]['plan']}")
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--database-url", help="scratch database to use instead of a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for count in [int(size) for size in args.sizes.split(",")]:
+        if args.database_url:
+            run_size(args.database_url, count, args.repeat)
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            run_size(f"sqlite:///{os.path.join(tmp, 'bench.db')}", count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Benchmark provisioning end to end against local DigitalOcean and SSH stand-ins.
+
+Starts fake_digitalocean.py (with its fake droplet SSH) as a subprocess, points main
+at it, and runs provision_droplet_async for N deployments at once for each level.
+Per level it reports throughput, end-to-end and per-phase latency (p50/p95, from
+the deployments' phase_timings), the peak number of threads held, SSH handshakes
+and the DigitalOcean API calls made. No droplet is ever created for real.
+
+    python benchmarks/bench_provisioning.py
+    python benchmarks/bench_provisioning.py --levels 1,10,100 --boot-seconds 30 --error-rate 0.02
+    python benchmarks/bench_provisioning.py --levels 500 --do-rate-limit 250
+
+The rate limiter is effectively off unless --do-rate-limit is given, so the numbers
+measure our own provisioning path rather than DigitalOcean's 250 requests/minute.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import paramiko
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+PHASES = ["droplet_create", "droplet_active", "ssh_ready", "configure", "dashboard_token"]
+FAKE_KEY = "sk-ant-bench-" + "x" * 40
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def start_fake_cloud(args, workdir: str) -> tuple:
+    api_port, ssh_port = free_port(), free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_digitalocean.py"),
+        "--port", str(api_port),
+        "--ssh-port", str(ssh_port),
+        "--create-latency", str(args.create_latency),
+        "--boot-seconds", str(args.boot_seconds),
+        "--settle-seconds", str(args.settle_seconds),
+        "--error-rate", str(args.error_rate),
+        "--ssh-latency", str(args.ssh_latency),
+        "--root", os.path.join(workdir, "droplets"),
+    ])
+    api_url = f"http://127.0.0.1:{api_port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{api_url}/_stats")
+            return process, api_url, ssh_port
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Fake DigitalOcean did not start")
+
+
+def configure_environment(args, workdir: str, api_url: str, ssh_port: int):
+    key_path = os.path.join(workdir, "id_rsa")
+    paramiko.RSAKey.generate(2048).write_private_key_file(key_path)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "DIGITALOCEAN_TOKEN": "bench",
+        "DIGITALOCEAN_API_URL": f"{api_url}/v2",
+        "DO_RATE_LIMIT_PER_MINUTE": str(args.do_rate_limit or 1_000_000),
+        "DO_RATE_LIMIT_BURST": str(args.do_rate_limit or 1_000_000),
+        "SSH_PORT": str(ssh_port),
+        "SSH_PRIVATE_KEY_PATH": key_path,
+        "SSH_KEY_ID": "",
+        "BOOT_CONFIGURE_MODE": "ssh",
+        "EMBEDDED_WORKER": "false",
+        # Poll at the same pace as production, scaled down with the fake boot times
+        "DROPLET_POLL_INTERVAL": str(args.poll_interval),
+        "SSH_POLL_MAX_INTERVAL": str(args.poll_interval),
+        "BOOT_POLL_MAX_INTERVAL": str(args.poll_interval),
+        "OPENCLAW_POLL_MAX_INTERVAL": str(args.poll_interval),
+    })
+
+
+class ThreadSampler:
+    """Peak thread count of this process while a level runs"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def create_deployments(count: int, region: str) -> list:
+    import main
+
+    db = main.SessionLocal()
+    try:
+        jobs = []
+        for _ in range(count):
+            deployment_id = main.generate_deployment_id()
+            db.add(main.DeploymentModel(
+                deployment_id=deployment_id,
+                status="pending",
+                anthropic_key_masked=FAKE_KEY[:10] + "...",
+                region=region,
+            ))
+            job = main.new_provision_job(deployment_id, region, FAKE_KEY)
+            db.add(job)
+            jobs.append((job.job_id, deployment_id))
+        db.commit()
+        return jobs
+    finally:
+        db.close()
+
+
+def load_results(deployment_ids: list) -> list:
+    import main
+
+    db = main.SessionLocal()
+    try:
+        rows = db.query(main.DeploymentModel.status, main.DeploymentModel.phase_timings).filter(
+            main.DeploymentModel.deployment_id.in_(deployment_ids)
+        ).all()
+        return [(status, json.loads(timings) if timings else {}) for status, timings in rows]
+    finally:
+        db.close()
+
+
+def api_calls(stats: dict) -> dict:
+    return {endpoint: values["calls"] for endpoint, values in stats["endpoints"].items()}
+
+
+async def run_level(count: int, api_url: str, region: str) -> dict:
+    import main
+    from ssh_session import session_totals
+
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{api_url}/_reset")
+
+    jobs = await asyncio.to_thread(create_deployments, count, region)
+    calls_before = api_calls(main.get_do_client().stats())
+    handshakes_before = session_totals()["handshakes"]
+    durations = []
+
+    async def provision(job_id: str, deployment_id: str):
+        started = time.perf_counter()
+        if await main.provision_droplet_async(job_id, deployment_id, FAKE_KEY, region):
+            durations.append(time.perf_counter() - started)
+
+    with ThreadSampler() as threads:
+        started = time.perf_counter()
+        await asyncio.gather(*(provision(job_id, deployment_id) for job_id, deployment_id in jobs))
+        elapsed = time.perf_counter() - started
+        await main.status_writer.flush()
+
+    results = await asyncio.to_thread(load_results, [deployment_id for _, deployment_id in jobs])
+    calls_after = api_calls(main.get_do_client().stats())
+    calls = {
+        endpoint: calls_after[endpoint] - calls_before.get(endpoint, 0)
+        for endpoint in calls_after if calls_after[endpoint] > calls_before.get(endpoint, 0)
+    }
+    phases = {
+        phase: [timings[phase] for status, timings in results if status == "ready" and phase in timings]
+        for phase in PHASES
+    }
+    return {
+        "count": count,
+        "ready": sum(1 for status, _ in results if status == "ready"),
+        "elapsed": elapsed,
+        "durations": durations,
+        "phases": phases,
+        "peak_threads": threads.peak,
+        "ssh_handshakes": session_totals()["handshakes"] - handshakes_before,
+        "api_calls": calls,
+    }
+
+
+def report(result: dict):
+    count, elapsed = result["count"], result["elapsed"]
+    durations = result["durations"]
+    print(f"\n{count} concurrent deployments: {result['ready']}/{count} ready in {elapsed:.1f}s "
+          f"({result['ready'] / elapsed * 60:.1f} deployments/min)")
+    print(f"  {'end to end':<16}p50 {percentile(durations, 0.5):7.2f}s  p95 {percentile(durations, 0.95):7.2f}s")
+    for phase, samples in result["phases"].items():
+        if samples:
+            print(f"  {phase:<16}p50 {percentile(samples, 0.5):7.2f}s  p95 {percentile(samples, 0.95):7.2f}s  "
+                  f"mean {statistics.mean(samples):6.2f}s")
+    print(f"  peak threads {result['peak_threads']}, SSH handshakes {result['ssh_handshakes']}, "
+          f"DO API calls {sum(result['api_calls'].values())} ({result['api_calls']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,10,100,500", help="comma separated concurrency levels")
+    parser.add_argument("--region", default="nyc3")
+    parser.add_argument("--create-latency", type=float, default=1.0, help="seconds per droplet create call")
+    parser.add_argument("--boot-seconds", type=float, default=10.0, help="seconds from create to active")
+    parser.add_argument("--settle-seconds", type=float, default=2.0, help="seconds from active to first boot done")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of DO API calls failing 500/429")
+    parser.add_argument("--ssh-latency", type=float, default=0.0, help="seconds added to every SSH command")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="cap on status/readiness poll intervals")
+    parser.add_argument("--do-rate-limit", type=int, help="DO requests per minute the client may make")
+    parser.add_argument("--verbose", action="store_true", help="keep the provisioning logs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process, api_url, ssh_port = start_fake_cloud(args, workdir)
+        try:
+            configure_environment(args, workdir, api_url, ssh_port)
+            import main as app_main
+
+            app_main.prepare_database()
+
+            # Per-deployment progress logs drown the report at high concurrency
+            logging.getLogger().setLevel(logging.WARNING if not args.verbose else logging.INFO)
+
+            async def run_all():
+                # Startup loads the catalog (and with it the SSH key id) before any provisioning
+                await app_main.catalog.refresh()
+                for count in [int(level) for level in args.levels.split(",")]:
+                    report(await run_level(count, api_url, args.region))
+                await app_main.get_do_client().aclose()
+
+            asyncio.run(run_all())
+            app_main.engine.dispose()
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark import and startup time of the API.
+
+Each run starts a fresh interpreter, so nothing is cached between runs. Three things
+are measured:
+
+- how long `import main` takes; the run also checks that importing it left the
+  database untouched
+- how long `python main.py migrate` takes on an empty database
+- cold start: the time from launching `uvicorn main:app` to its first response, and
+  the latency of the first request that reaches the database (/free-deploys)
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --importtime
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import main
+print(time.perf_counter() - started)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def environment(database_path: str) -> dict:
+    return dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{database_path}",
+        EMBEDDED_WORKER="false",
+        DIGITALOCEAN_TOKEN="",
+        MIGRATE_ON_STARTUP="false",
+    )
+
+
+def time_import(workdir: str) -> float:
+    database_path = os.path.join(workdir, "import.db")
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=environment(database_path),
+        capture_output=True, text=True, check=True,
+    )
+    if os.path.exists(database_path):
+        raise RuntimeError("Importing main created the database; import must not touch it")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_migrate(database_path: str) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "main.py", "migrate"], cwd=ROOT, env=environment(database_path),
+        capture_output=True, check=True,
+    )
+    return time.perf_counter() - started
+
+
+def time_cold_start(database_path: str) -> tuple:
+    """Seconds from launching uvicorn to its first response, and the first database request's latency"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=environment(database_path), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                try:
+                    client.get("/")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            first_response = time.perf_counter() - started
+
+            request_started = time.perf_counter()
+            client.get("/free-deploys").raise_for_status()
+            first_db_request = time.perf_counter() - request_started
+        return first_response, first_db_request
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def slowest_imports(workdir: str, count: int) -> list:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+        env=environment(os.path.join(workdir, "importtime.db")), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # "| main" is main itself, "|   fastapi" a module main imports directly
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative_us) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def summarize(label: str, samples: list):
+    print(f"  {label:<26} median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest modules main imports")
+    args = parser.parse_args()
+
+    imports, migrations, cold_starts, first_requests = [], [], [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for run in range(args.runs):
+            imports.append(time_import(workdir))
+            database_path = os.path.join(workdir, f"run{run}.db")
+            migrations.append(time_migrate(database_path))
+            first_response, first_db_request = time_cold_start(database_path)
+            cold_starts.append(first_response)
+            first_requests.append(first_db_request)
+
+        print(f"\n{args.runs} runs (import left the database untouched)")
+        summarize("import main", imports)
+        summarize("main.py migrate", migrations)
+        summarize("uvicorn to first response", cold_starts)
+        summarize("first database request", first_requests)
+
+        if args.importtime:
+            print("\n  slowest imports made by main (cumulative)")
+            for cumulative, name in slowest_imports(workdir, 10):
+                print(f"    {name:<30} {cumulative * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
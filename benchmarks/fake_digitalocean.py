@@ -0,0 +1,298 @@
+"""
+Local stand-in for the DigitalOcean API (and, with --ssh-port, the droplets' SSH).
+
+Serves the v2 endpoints the provisioning engine uses: droplets (create, multi-create,
+get, tagged listing, delete), tags, SSH keys, regions, sizes and images. Creates take --create-latency
+seconds; a droplet turns active --boot-seconds later with its own loopback address
+(127.1.x.y) as public IP, and its first boot settles --settle-seconds after that.
+--error-rate injects 500s and 429s into any call. Nothing is ever billed.
+
+    python benchmarks/fake_digitalocean.py --port 8765 --ssh-port 2222 --boot-seconds 20
+
+GET /_stats returns per-endpoint call counts and POST /_reset forgets every droplet.
+Used by bench_provisioning.py, which starts it as a subprocess.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from itertools import count
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+GATEWAY_TOKEN_PREFIX = "fake-gateway-token"
+
+INITIAL_ENV = """# OpenClaw configuration
+# ANTHROPIC_API_KEY=
+CLAWDBOT_GATEWAY_TOKEN={token}
+CLAWDBOT_GATEWAY_PORT=18789
+"""
+
+
+def droplet_ip(droplet_id: int) -> str:
+    return f"127.1.{droplet_id // 250 % 256}.{droplet_id % 250 + 1}"
+
+
+class FakeDroplet:
+    def __init__(self, droplet_id: int, spec: dict, boot_seconds: float, settle_seconds: float, root: str):
+        self.id = droplet_id
+        self.spec = spec
+        self.ip_address = droplet_ip(droplet_id)
+        self.created = time.monotonic()
+        self.active_at = self.created + boot_seconds
+        self.settled_at = self.active_at + settle_seconds
+        self.root = os.path.join(root, str(droplet_id))
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return time.monotonic() >= self.active_at
+
+    def payload(self) -> dict:
+        networks = [{"type": "public", "ip_address": self.ip_address}] if self.active else []
+        return {
+            "id": self.id,
+            "name": self.spec.get("name"),
+            "status": "active" if self.active else "new",
+            "region": {"slug": self.spec.get("region")},
+            "tags": self.spec.get("tags", []),
+            "networks": {"v4": networks},
+        }
+
+    def ensure_booted(self) -> bool:
+        """Lay down the droplet's filesystem once it is active; True once first boot has settled"""
+        if not self.active:
+            return False
+        with self._lock:
+            if not self._seeded:
+                self._seed()
+                self._seeded = True
+            settled = time.monotonic() >= self.settled_at
+            marker = os.path.join(self.root, "var/log/autoclawd_ready.log")
+            if settled and not os.path.exists(marker):
+                with open(marker, "w") as f:
+                    f.write("Droplet ready for Auto Clawd configuration\n")
+            return settled
+
+    def _seed(self):
+        for directory in ("opt", "root", "var/log", "var/lib", "bin", "state"):
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        with open(os.path.join(self.root, "opt/clawdbot.env"), "w") as f:
+            f.write(INITIAL_ENV.format(token=f"{GATEWAY_TOKEN_PREFIX}-{self.id}"))
+        os.chmod(os.path.join(self.root, "opt/clawdbot.env"), 0o600)
+
+        state = os.path.join(self.root, "state")
+        shims = {
+            # Services are always up; restart just records that it happened
+            "bin/systemctl": f"""#!/bin/bash
+case "$1" in
+    is-system-running) echo running ;;
+    is-active) [ "$2" = "--quiet" ] || echo active ;;
+    restart) echo "$2" >> {state}/restarts ;;
+esac
+exit 0
+""",
+            # The gateway port probe runs under timeout; the gateway is up once clawdbot is
+            "bin/timeout": """#!/bin/bash
+exit 0
+""",
+            "opt/clawdbot-cli.sh": f"""#!/bin/bash
+echo "$*" >> {state}/cli.log
+""",
+        }
+        for path, content in shims.items():
+            full_path = os.path.join(self.root, path)
+            with open(full_path, "w") as f:
+                f.write(content)
+            os.chmod(full_path, 0o755)
+
+
+class FakeCloud:
+    """Droplets of the fake account, shared by the API and SSH stand-ins"""
+
+    def __init__(self, root: str, create_latency: float, boot_seconds: float, settle_seconds: float,
+                 error_rate: float, jitter: float = 0.2):
+        self.root = root
+        self.create_latency = create_latency
+        self.boot_seconds = boot_seconds
+        self.settle_seconds = settle_seconds
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.droplets = {}
+        self.by_ip = {}
+        self.calls = {}
+        self._ids = count(1)
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * (1 + self.jitter * (2 * random.random() - 1))
+
+    def create(self, spec: dict) -> FakeDroplet:
+        droplet = FakeDroplet(
+            next(self._ids), spec, self._jittered(self.boot_seconds), self._jittered(self.settle_seconds), self.root
+        )
+        self.droplets[droplet.id] = droplet
+        self.by_ip[droplet.ip_address] = droplet
+        return droplet
+
+    def delete(self, droplet_id: int) -> bool:
+        droplet = self.droplets.pop(droplet_id, None)
+        if droplet is None:
+            return False
+        self.by_ip.pop(droplet.ip_address, None)
+        return True
+
+    def find(self, ip_address: str) -> Optional[FakeDroplet]:
+        return self.by_ip.get(ip_address)
+
+    def reset(self):
+        self.droplets.clear()
+        self.by_ip.clear()
+        self.calls.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+
+def create_app(cloud: FakeCloud) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def count_and_fail(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/v2/"):
+            name = f"{request.method} {path}"
+            for segment in path.split("/"):
+                if segment.isdigit():
+                    name = name.replace(segment, "{id}")
+            cloud.calls[name] = cloud.calls.get(name, 0) + 1
+            if random.random() < cloud.error_rate:
+                if random.random() < 0.5:
+                    return JSONResponse({"id": "too_many_requests", "message": "API rate limit exceeded"},
+                                        status_code=429, headers={"retry-after": "1"})
+                return JSONResponse({"id": "server_error", "message": "Server error"}, status_code=500)
+        response = await call_next(request)
+        response.headers["ratelimit-limit"] = "5000"
+        response.headers["ratelimit-remaining"] = "4999"
+        return response
+
+    def page(items: list, key: str, request: Request) -> dict:
+        per_page = int(request.query_params.get("per_page", 20))
+        number = int(request.query_params.get("page", 1))
+        start = (number - 1) * per_page
+        data = {key: items[start:start + per_page], "links": {"pages": {}}}
+        if start + per_page < len(items):
+            data["links"]["pages"]["next"] = f"{request.url.path}?page={number + 1}"
+        return data
+
+    @app.post("/v2/droplets", status_code=202)
+    async def create_droplet(spec: dict):
+        await asyncio.sleep(cloud._jittered(cloud.create_latency))
+        if "names" in spec:
+            names = spec.pop("names")
+            if len(names) > 10:
+                return JSONResponse({"id": "unprocessable_entity", "message": "At most 10 names"}, status_code=422)
+            return {"droplets": [cloud.create(dict(spec, name=name)).payload() for name in names]}
+        return {"droplet": cloud.create(spec).payload()}
+
+    @app.get("/v2/droplets")
+    async def list_droplets(request: Request, tag_name: Optional[str] = None):
+        droplets = [
+            droplet.payload() for droplet in cloud.droplets.values()
+            if tag_name is None or tag_name in droplet.spec.get("tags", [])
+        ]
+        return page(droplets, "droplets", request)
+
+    @app.get("/v2/droplets/{droplet_id}")
+    async def get_droplet(droplet_id: int):
+        droplet = cloud.droplets.get(droplet_id)
+        if droplet is None:
+            return JSONResponse({"id": "not_found", "message": "Droplet not found"}, status_code=404)
+        return {"droplet": droplet.payload()}
+
+    @app.delete("/v2/droplets/{droplet_id}", status_code=204)
+    async def delete_droplet(droplet_id: int):
+        if not cloud.delete(droplet_id):
+            return JSONResponse({"id": "not_found", "message": "Droplet not found"}, status_code=404)
+
+    @app.post("/v2/tags", status_code=201)
+    async def create_tag(body: dict):
+        return {"tag": {"name": body["name"]}}
+
+    @app.post("/v2/tags/{tag_name}/resources", status_code=204)
+    async def tag_resources(tag_name: str, body: dict):
+        for resource in body["resources"]:
+            droplet = cloud.droplets.get(int(resource["resource_id"]))
+            if droplet is not None and tag_name not in droplet.spec.get("tags", []):
+                # Droplets of one multi-create share their spec's tag list
+                droplet.spec["tags"] = droplet.spec.get("tags", []) + [tag_name]
+
+    @app.get("/v2/account/keys")
+    async def list_ssh_keys(request: Request):
+        return page([{"id": 1, "name": "bench"}], "ssh_keys", request)
+
+    @app.get("/v2/regions")
+    async def list_regions(request: Request):
+        regions = [{"slug": slug, "available": True, "sizes": ["s-2vcpu-4gb"]} for slug in ("nyc3", "sfo3", "ams3")]
+        return page(regions, "regions", request)
+
+    @app.get("/v2/sizes")
+    async def list_sizes(request: Request):
+        return page([{"slug": "s-2vcpu-4gb", "available": True}], "sizes", request)
+
+    @app.get("/v2/images/{image}")
+    async def get_image(image: str):
+        return {"image": {"slug": image, "regions": ["nyc3", "sfo3", "ams3"]}}
+
+    @app.get("/_stats")
+    async def stats():
+        return {"droplets": len(cloud.droplets), "calls": cloud.calls}
+
+    @app.post("/_reset")
+    async def reset():
+        cloud.reset()
+        return {"message": "reset"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765, help="API port")
+    parser.add_argument("--ssh-port", type=int, help="also serve droplet SSH on this port")
+    parser.add_argument("--create-latency", type=float, default=1.0, help="seconds per droplet create call")
+    parser.add_argument("--boot-seconds", type=float, default=20.0, help="seconds from create to active")
+    parser.add_argument("--settle-seconds", type=float, default=5.0, help="seconds from active to first boot done")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API calls answered 500/429")
+    parser.add_argument("--ssh-latency", type=float, default=0.0, help="seconds added to every SSH command")
+    parser.add_argument("--root", help="directory for droplet filesystems (default: a temporary one)")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix="fake-droplets-")
+    cloud = FakeCloud(root, args.create_latency, args.boot_seconds, args.settle_seconds, args.error_rate)
+    cloud.reset()
+
+    if args.ssh_port:
+        from fake_ssh import FakeSSHServer
+
+        # paramiko logs a traceback for every probe that hangs up before the banner
+        logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+        FakeSSHServer(cloud, args.ssh_port, command_latency=args.ssh_latency).start()
+
+    uvicorn.run(create_app(cloud), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
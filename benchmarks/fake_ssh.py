@@ -0,0 +1,188 @@
+"""
+Local SSH stand-in for fake droplets.
+
+A paramiko server listening on every loopback address: the address a client
+connected to (127.1.x.y) picks the fake droplet, whose filesystem is a directory
+laid down by FakeDroplet. Any public key is accepted. Commands run under real bash
+with /opt, /root and /var rewritten into that directory and shims for systemctl,
+timeout and clawdbot-cli.sh first on PATH, so the provisioning scripts themselves
+(sha256sum, heredocs, the atomic rename) run for real. SFTP is served from the same
+directory; uploaded scripts get the same path rewriting as commands.
+"""
+
+import logging
+import os
+import re
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Absolute paths the provisioning code touches on a droplet
+DROPLET_PATH = re.compile(r"(?<![\w.-])/(opt|root|var)(?=/)")
+
+
+def rewrite_paths(text: str, root: str) -> str:
+    return DROPLET_PATH.sub(lambda match: f"{root}/{match.group(1)}", text)
+
+
+class _DropletServer(paramiko.ServerInterface):
+    def __init__(self, cloud, droplet, command_latency: float):
+        self.cloud = cloud
+        self.droplet = droplet
+        self.command_latency = command_latency
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def _exec(self, channel, command: str):
+        try:
+            if self.command_latency:
+                time.sleep(self.command_latency)
+            self.droplet.ensure_booted()
+            root = self.droplet.root
+            result = subprocess.run(
+                ["bash", "-c", rewrite_paths(command, root)],
+                capture_output=True,
+                env={"PATH": f"{root}/bin:/usr/bin:/bin", "HOME": f"{root}/root"},
+                timeout=120,
+            )
+            channel.sendall(result.stdout)
+            channel.sendall_stderr(result.stderr)
+            channel.send_exit_status(result.returncode)
+        except Exception as e:
+            logger.warning(f"Fake SSH command failed on droplet {self.droplet.id}: {e}")
+            channel.send_exit_status(255)
+        finally:
+            channel.close()
+
+
+class _DropletSFTP(paramiko.SFTPServerInterface):
+    """SFTP rooted in the droplet's directory"""
+
+    def __init__(self, server: _DropletServer, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.droplet = server.droplet
+
+    def _path(self, path: str) -> str:
+        self.droplet.ensure_booted()
+        return os.path.join(self.droplet.root, path.lstrip("/"))
+
+    def open(self, path, flags, attr):
+        local_path = self._path(path)
+        try:
+            fd = os.open(local_path, flags, (attr.st_mode or 0o644) if attr and attr.st_mode else 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+        mode = "rb"
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        handle = _RewritingHandle(flags, local_path if path.endswith(".sh") else None, self.droplet.root)
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def chattr(self, path, attr):
+        try:
+            if attr.st_mode is not None:
+                os.chmod(self._path(path), attr.st_mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class _RewritingHandle(paramiko.SFTPHandle):
+    """File handle that rewrites droplet paths in an uploaded script when it is closed"""
+
+    def __init__(self, flags, script_path, root):
+        super().__init__(flags)
+        self.script_path = script_path
+        self.root = root
+
+    def chattr(self, attr):
+        if attr.st_mode is not None and self.script_path:
+            os.chmod(self.script_path, attr.st_mode)
+        return paramiko.SFTP_OK
+
+    def close(self):
+        super().close()
+        if self.script_path and os.path.exists(self.script_path):
+            with open(self.script_path) as f:
+                script = f.read()
+            with open(self.script_path, "w") as f:
+                f.write(rewrite_paths(script, self.root))
+
+
+class FakeSSHServer:
+    """Accepts SSH connections for every fake droplet on one port"""
+
+    def __init__(self, cloud, port: int, command_latency: float = 0.0):
+        self.cloud = cloud
+        self.port = port
+        self.command_latency = command_latency
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.connections = 0
+
+    def start(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Every 127.x address reaches the loopback interface; the one dialled names the droplet
+        listener.bind(("0.0.0.0", self.port))
+        listener.listen(1024)
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+
+    def _accept(self, listener: socket.socket):
+        while True:
+            conn, _ = listener.accept()
+            droplet = self.cloud.find(conn.getsockname()[0])
+            if droplet is None or not droplet.active:
+                # Not booted (or not ours): behave like a closed port
+                conn.close()
+                continue
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn, droplet), daemon=True).start()
+
+    def _serve(self, conn: socket.socket, droplet):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self.host_key)
+        server = _DropletServer(self.cloud, droplet, self.command_latency)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _DropletSFTP)
+        try:
+            transport.start_server(server=server)
+        except Exception as e:
+            # Port probes connect and hang up without a handshake
+            logger.debug(f"Fake SSH handshake failed for droplet {droplet.id}: {e}")
+            return
+        while transport.is_active():
+            time.sleep(1)
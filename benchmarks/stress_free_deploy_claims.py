@@ -0,0 +1,110 @@
+"""
+Fire thousands of simultaneous free-deploy claims and check none over-claim.
+
+Each claim runs the same code path as /provision: claim_free_deploy() in its own
+async session, then commit, with --concurrency claims in flight at once. The promo
+has --slots free deploys; exactly that many claims must succeed and claimed_count
+must end at exactly --slots. --legacy runs the old read-check-increment claim
+instead, for comparison.
+
+    python benchmarks/stress_free_deploy_claims.py
+    python benchmarks/stress_free_deploy_claims.py --claims 10000 --slots 500 --concurrency 256
+    python benchmarks/stress_free_deploy_claims.py --database-url postgresql://localhost/scratch
+
+With --database-url the free_deploy_config table of that database is reset, so only
+point it at a scratch database.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def legacy_claim(db) -> bool:
+    """The read-check-increment claim this replaced"""
+    from sqlalchemy import select
+
+    from main import FreeDeployConfig
+
+    config = await db.scalar(select(FreeDeployConfig).limit(1))
+    if not config or config.is_active != 1 or config.claimed_count >= config.total_free_deploys:
+        return False
+    config.claimed_count += 1
+    return True
+
+
+async def run_claims(claim, claims: int, concurrency: int) -> dict:
+    from main import AsyncSessionLocal
+
+    gate = asyncio.Semaphore(concurrency)
+    results = {"claimed": 0, "refused": 0, "errors": 0}
+
+    async def claimer():
+        async with gate:
+            async with AsyncSessionLocal() as db:
+                try:
+                    outcome = "claimed" if await claim(db) else "refused"
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    outcome = "errors"
+            results[outcome] += 1
+
+    await asyncio.gather(*(claimer() for _ in range(claims)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=5000, help="claims to fire")
+    parser.add_argument("--slots", type=int, default=100, help="free deploys on offer")
+    parser.add_argument("--concurrency", type=int, default=64, help="claims in flight at once")
+    parser.add_argument("--database-url", help="scratch database to use instead of a temporary SQLite file")
+    parser.add_argument("--legacy", action="store_true", help="use the old read-modify-write claim")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'stress.db')}"
+
+    import main as app_main
+    from main import FreeDeployConfig, SessionLocal, claim_free_deploy
+
+    app_main.prepare_database()
+    db = SessionLocal()
+    db.query(FreeDeployConfig).delete()
+    db.add(FreeDeployConfig(total_free_deploys=args.slots, claimed_count=0, is_active=1))
+    db.commit()
+    db.close()
+
+    claim = legacy_claim if args.legacy else claim_free_deploy
+    started = time.perf_counter()
+    results = asyncio.run(run_claims(claim, args.claims, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    final = db.query(FreeDeployConfig).first().claimed_count
+    db.close()
+    app_main.engine.dispose()
+
+    print(f"{args.claims} claims, {args.concurrency} in flight, in {elapsed:.2f}s ({args.claims / elapsed:.0f} claims/s)")
+    print(f"granted={results['claimed']} refused={results['refused']} errors={results['errors']} "
+          f"claimed_count={final} slots={args.slots}")
+
+    ok = results["claimed"] == final == min(args.slots, args.claims)
+    print("OK" if ok else "FAIL: free deploys were over- or under-claimed")
+    if tmp:
+        tmp.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
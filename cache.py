@@ -0,0 +1,78 @@
+"""
+Bounded in-process caches for hot read endpoints.
+
+TTLCache is a thread-safe LRU map whose entries also expire after a fixed TTL.
+Writers keep it coherent by invalidating keys right after they commit; the
+TTL bounds staleness for writes made by other processes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU cache with per-entry expiry and hit/miss counters"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable]):
+        if key is None:
+            return
+        with self._lock:
+            if self._entries.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
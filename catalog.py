@@ -0,0 +1,106 @@
+"""
+Cached DigitalOcean catalog: SSH keys, regions, sizes and image availability.
+
+A background task refreshes the catalog every few minutes, so /provision can check
+a region against it synchronously instead of finding out from a failed droplet
+create. A catalog that has not loaded yet, or whose last refresh is older than its
+TTL, validates nothing rather than rejecting requests on stale data.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from do_client import DigitalOceanClient, DigitalOceanError
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """Snapshot of the account's SSH keys and where the droplet size and image are available"""
+
+    def __init__(self, client: Callable[[], DigitalOceanClient], size: str, image: str, ttl: float):
+        self.client = client
+        self.size = size
+        self.image = image
+        self.ttl = ttl
+
+        self.ssh_key_ids = []
+        self.regions = {}
+        self.sizes = {}
+        self.image_regions = set()
+        self.loaded_at: Optional[float] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @property
+    def fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    async def refresh(self):
+        client = self.client()
+        keys, regions, sizes, image = await asyncio.gather(
+            client.list_ssh_keys(),
+            client.list_regions(),
+            client.list_sizes(),
+            self._get_image(client),
+        )
+        self.ssh_key_ids = [key["id"] for key in keys]
+        self.regions = {region["slug"]: region for region in regions}
+        self.sizes = {size["slug"]: size for size in sizes}
+        self.image_regions = set(image["regions"]) if image else set()
+        self.loaded_at = time.monotonic()
+        self.refreshes += 1
+
+    async def _get_image(self, client: DigitalOceanClient) -> Optional[dict]:
+        try:
+            return await client.get_image(self.image)
+        except DigitalOceanError as e:
+            if e.status_code != 404:
+                raise
+            logger.error(f"Droplet image {self.image} not found")
+            return None
+
+    async def run(self, interval: float):
+        """Refresh the catalog every `interval` seconds"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.error(f"Error refreshing DigitalOcean catalog: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def ssh_key_id(self) -> Optional[int]:
+        """First SSH key on the account, fetched on demand only before the first refresh"""
+        if not self.ssh_key_ids:
+            self.ssh_key_ids = [key["id"] for key in await self.client().list_ssh_keys()]
+        return self.ssh_key_ids[0] if self.ssh_key_ids else None
+
+    def region_error(self, region: str) -> Optional[str]:
+        """Why a droplet can't be created in the region, or None if it can (or we don't know)"""
+        if not self.fresh:
+            return None
+        info = self.regions.get(region)
+        if info is None:
+            return f"Unknown region '{region}'"
+        if not info.get("available"):
+            return f"Region '{region}' is not accepting new droplets"
+        if self.size not in info.get("sizes", []):
+            return f"Droplet size {self.size} is not available in region '{region}'"
+        if self.image_regions and region not in self.image_regions:
+            return f"The OpenClaw image is not available in region '{region}'"
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "fresh": self.fresh,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None,
+            "ssh_keys": len(self.ssh_key_ids),
+            "regions": len(self.regions),
+            "sizes": len(self.sizes),
+            "image_regions": len(self.image_regions),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
@@ -0,0 +1,309 @@
+"""
+Async DigitalOcean API client.
+
+A thin httpx wrapper over the v2 REST API covering what the provisioning engine
+needs: droplets, droplet actions, snapshots, tags and SSH keys. One client is shared
+per process: it keeps connections alive, paces requests with a token bucket that
+follows DigitalOcean's ratelimit-* response headers, and retries 429s and 5xxs.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import quote
+
+# httpx is imported when the first client is built, keeping it off the app's import path
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+DO_API_URL = "https://api.digitalocean.com/v2"
+
+
+class DigitalOceanError(Exception):
+    """Non-2xx response from the DigitalOcean API"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"DigitalOcean API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+def droplet_public_ip(droplet: dict) -> Optional[str]:
+    """Public IPv4 address of a droplet payload, if it has one yet"""
+    for network in droplet.get("networks", {}).get("v4", []):
+        if network.get("type") == "public":
+            return network.get("ip_address")
+    return None
+
+
+class RateLimiter:
+    """
+    Token bucket pacing requests under DigitalOcean's API rate limit.
+
+    The bucket refills at `rate` tokens per second up to `burst`. Every response's
+    ratelimit-remaining header caps the tokens left, and once the API reports none
+    remaining, requests wait for its ratelimit-reset time.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+    def observe(self, headers: "httpx.Headers"):
+        """Align the bucket with the rate-limit headers of a response"""
+        remaining = headers.get("ratelimit-remaining")
+        if remaining is None or not remaining.isdigit():
+            return
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = min(self._tokens, float(remaining))
+        if int(remaining) == 0:
+            self.block_until_reset(headers)
+
+    def block_until_reset(self, headers: "httpx.Headers", default: float = 1.0):
+        """Hold all requests until the API's reset time (or Retry-After)"""
+        delay = default
+        retry_after = headers.get("retry-after")
+        reset = headers.get("ratelimit-reset")
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        elif reset and reset.isdigit():
+            delay = max(0.0, int(reset) - time.time())
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": round(min(self.burst, self._tokens), 1),
+            "blocked_for": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+            "waited_seconds": round(self.waited, 1),
+        }
+
+
+# Path segments that identify a resource are folded so stats group by endpoint
+RESOURCE_ID = re.compile(r"/(\d+|[0-9a-f-]{36})(?=/|$)")
+TAG_NAME = re.compile(r"(?<=/tags/)[^/]+(?=/resources$)")
+
+
+def endpoint_name(method: str, path: str) -> str:
+    return f"{method} {TAG_NAME.sub('{tag}', RESOURCE_ID.sub('/{id}', path))}"
+
+
+class DigitalOceanClient:
+    """Async client for the DigitalOcean v2 API"""
+
+    # Retried on any request; the API refused it without acting on it
+    RETRY_ALWAYS = {429}
+    # Retried on idempotent requests only, so a POST that timed out mid-create is never replayed
+    RETRY_IDEMPOTENT = {500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+    def __init__(self, token: str, base_url: str = DO_API_URL, timeout: float = 30.0, max_connections: int = 20,
+                 rate: float = 250 / 60, burst: int = 50, max_retries: int = 5, backoff: float = 0.5,
+                 max_backoff: float = 30.0):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.limiter = RateLimiter(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._endpoints = {}
+
+    def _retry_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    def _record(self, endpoint: str, started: float, error: bool = False, retried: bool = False):
+        stats = self._endpoints.setdefault(
+            endpoint, {"calls": 0, "errors": 0, "retries": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        elapsed = time.monotonic() - started
+        stats["calls"] += 1
+        stats["errors"] += error
+        stats["retries"] += retried
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    async def _send(self, method: str, path: str, **kwargs) -> "httpx.Response":
+        """Send a request under the rate limiter, retrying throttled and transient failures"""
+        import httpx
+
+        endpoint = endpoint_name(method, path)
+        idempotent = method in self.IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                retry = idempotent and attempt < self.max_retries
+                self._record(endpoint, started, error=True, retried=retry)
+                if not retry:
+                    raise
+                logger.warning(f"{endpoint} failed ({e}), retrying")
+            else:
+                self.limiter.observe(response.headers)
+                status = response.status_code
+                retryable = status in self.RETRY_ALWAYS or (idempotent and status in self.RETRY_IDEMPOTENT)
+                retry = retryable and attempt < self.max_retries
+                self._record(endpoint, started, error=status >= 400, retried=retry)
+                if not retry:
+                    return response
+                if status == 429:
+                    # The limiter holds every request until the reset, this one included
+                    self.limiter.block_until_reset(response.headers, default=self._retry_delay(attempt))
+                    logger.warning(f"{endpoint} rate limited, retrying")
+                    attempt += 1
+                    continue
+                logger.warning(f"{endpoint} returned {status}, retrying")
+
+            await asyncio.sleep(self._retry_delay(attempt))
+            attempt += 1
+
+    async def request(self, method: str, path: str, **kwargs) -> dict:
+        response = await self._send(method, path, **kwargs)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            raise DigitalOceanError(response.status_code, message)
+
+        if response.status_code == 204 or not response.content:
+            return {}
+        return response.json()
+
+    async def paginate(self, path: str, key: str, params: Optional[dict] = None, per_page: int = 200) -> list:
+        """Fetch every page of a list endpoint and return the concatenated items"""
+        params = dict(params or {}, per_page=per_page, page=1)
+        items = []
+        while True:
+            data = await self.request("GET", path, params=params)
+            items.extend(data.get(key, []))
+            if not data.get("links", {}).get("pages", {}).get("next"):
+                return items
+            params["page"] += 1
+
+    # Droplets
+
+    async def create_droplet(self, **spec) -> dict:
+        data = await self.request("POST", "/droplets", json=spec)
+        return data["droplet"]
+
+    async def create_droplets(self, names: list, **spec) -> list:
+        """Create up to 10 droplets sharing one spec in a single call"""
+        data = await self.request("POST", "/droplets", json={"names": names, **spec})
+        return data["droplets"]
+
+    async def get_droplet(self, droplet_id: int) -> dict:
+        data = await self.request("GET", f"/droplets/{droplet_id}")
+        return data["droplet"]
+
+    async def list_droplets(self, tag_name: Optional[str] = None) -> list:
+        params = {"tag_name": tag_name} if tag_name else None
+        return await self.paginate("/droplets", "droplets", params)
+
+    async def delete_droplet(self, droplet_id: int):
+        await self.request("DELETE", f"/droplets/{droplet_id}")
+
+    async def droplet_action(self, droplet_id: int, action_type: str, **params) -> dict:
+        data = await self.request("POST", f"/droplets/{droplet_id}/actions", json={"type": action_type, **params})
+        return data["action"]
+
+    async def get_action(self, action_id: int) -> dict:
+        data = await self.request("GET", f"/actions/{action_id}")
+        return data["action"]
+
+    # Snapshots
+
+    async def list_droplet_snapshots(self, droplet_id: int) -> list:
+        return await self.paginate(f"/droplets/{droplet_id}/snapshots", "snapshots")
+
+    async def list_snapshots(self, resource_type: str = "droplet") -> list:
+        return await self.paginate("/snapshots", "snapshots", {"resource_type": resource_type})
+
+    async def delete_snapshot(self, snapshot_id):
+        await self.request("DELETE", f"/snapshots/{snapshot_id}")
+
+    # Tags
+
+    async def tag_droplets(self, tag_name: str, droplet_ids: list):
+        """Create the tag if needed and attach it to the droplets"""
+        try:
+            await self.request("POST", "/tags", json={"name": tag_name})
+        except DigitalOceanError as e:
+            # Tag already exists
+            if e.status_code != 422:
+                raise
+        await self.request(
+            "POST",
+            f"/tags/{quote(tag_name, safe='')}/resources",
+            json={"resources": [{"resource_id": str(i), "resource_type": "droplet"} for i in droplet_ids]},
+        )
+
+    # Account and catalog
+
+    async def list_ssh_keys(self) -> list:
+        return await self.paginate("/account/keys", "ssh_keys")
+
+    async def list_regions(self) -> list:
+        return await self.paginate("/regions", "regions")
+
+    async def list_sizes(self) -> list:
+        return await self.paginate("/sizes", "sizes")
+
+    async def get_image(self, image) -> dict:
+        """Image by ID or slug"""
+        data = await self.request("GET", f"/images/{image}")
+        return data["image"]
+
+    def stats(self) -> dict:
+        """Rate limiter state and per-endpoint call counts and latencies"""
+        endpoints = {}
+        for endpoint, stats in sorted(self._endpoints.items()):
+            endpoints[endpoint] = {
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "retries": stats["retries"],
+                "avg_ms": round(1000 * stats["total_seconds"] / stats["calls"], 1),
+                "max_ms": round(1000 * stats["max_seconds"], 1),
+            }
+        return {"rate_limit": self.limiter.stats(), "endpoints": endpoints}
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -53,42 +53,67 @@ function Create() {
   useEffect(() => {
     if (!deploymentId || step !== 4) return
 
+    const applyStatus = (data) => {
+      setDeploymentStatus(data)
+
+      switch (data.status) {
+        case 'pending':
+          setProgress(10)
+          break
+        case 'creating_droplet':
+          setProgress(30)
+          break
+        case 'waiting_for_droplet':
+          setProgress(50)
+          break
+        case 'configuring_openclaw':
+          setProgress(75)
+          break
+        case 'ready':
+          setProgress(100)
+          setStep(5)
+          break
+        case 'failed':
+          setError(data.error_message || 'Deployment failed')
+          setStep(3)
+          break
+      }
+    }
+
     const pollStatus = async () => {
       try {
         const response = await fetch(`${API_URL}/status/${deploymentId}`)
         const data = await response.json()
-        setDeploymentStatus(data)
-
-        switch (data.status) {
-          case 'pending':
-            setProgress(10)
-            break
-          case 'creating_droplet':
-            setProgress(30)
-            break
-          case 'waiting_for_droplet':
-            setProgress(50)
-            break
-          case 'configuring_openclaw':
-            setProgress(75)
-            break
-          case 'ready':
-            setProgress(100)
-            setStep(5)
-            break
-          case 'failed':
-            setError(data.error_message || 'Deployment failed')
-            setStep(3)
-            break
-        }
+        applyStatus(data)
       } catch (err) {
         console.error('Error polling status:', err)
       }
     }
 
-    pollStatus()
-    const interval = setInterval(pollStatus, 3000)
-    return () => clearInterval(interval)
+    let interval = null
+    const startPolling = () => {
+      if (interval) return
+      pollStatus()
+      interval = setInterval(pollStatus, 3000)
+    }
+
+    // Prefer pushed updates; fall back to polling if the stream is unavailable
+    let source = null
+    if (typeof EventSource !== 'undefined') {
+      source = new EventSource(`${API_URL}/status/${deploymentId}/stream`)
+      source.addEventListener('status', (event) => applyStatus(JSON.parse(event.data)))
+      source.onerror = () => {
+        source.close()
+        startPolling()
+      }
+    } else {
+      startPolling()
+    }
+
+    return () => {
+      if (source) source.close()
+      if (interval) clearInterval(interval)
+    }
   }, [deploymentId, step])
 
   const handlePayment = async () => {
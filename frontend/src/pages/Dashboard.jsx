@@ -38,11 +38,18 @@ function Dashboard() {
   const fetchDeployments = async () => {
     try {
       setLoading(true)
-      const response = await fetch(
-        `${API_URL}/deployments?wallet=${walletAddress}`
-      )
-      const data = await response.json()
-      setDeployments(data.deployments || [])
+      // Listings are paginated; follow next_cursor until the wallet's history is loaded
+      const all = []
+      let cursor = null
+      do {
+        const params = new URLSearchParams({ wallet: walletAddress })
+        if (cursor) params.set('cursor', cursor)
+        const response = await fetch(`${API_URL}/deployments?${params}`)
+        const data = await response.json()
+        all.push(...(data.deployments || []))
+        cursor = data.next_cursor
+      } while (cursor)
+      setDeployments(all)
     } catch (err) {
       setError('Failed to fetch deployments')
       console.error(err)
@@ -188,7 +195,7 @@ function Dashboard() {
                   <div className="card-body">
                     <div className="info-row">
                       <Globe size={16} />
-                      <span>{deployment.ip_address || 'Provisioning...'}</span>
+                      <span>{deployment.ip_address || (deployment.status === 'hibernated' ? 'Hibernated' : 'Provisioning...')}</span>
                     </div>
 
                     <div className="info-row">
@@ -0,0 +1,97 @@
+"""
+Leader election for periodic background jobs.
+
+Every API process runs a LeaderElection, but only the one holding the named lease
+runs the jobs registered with it, so periodic work (the expiry reaper, snapshot
+retention, the warm pool) stays a single copy however many workers or replicas
+serve requests. The lease is a database row with an expiry: the leader renews it
+every third of its duration, and if the leader dies another process takes the
+row over once it has expired. A leader that cannot renew in time stops its jobs
+before anyone else can acquire the lease. Stopping a job cancels it and waits for
+it to finish, so jobs must cancel any tasks of their own when they are cancelled.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """Runs the registered jobs only while this process holds the lease"""
+
+    def __init__(self, name: str, holder: str, lease_seconds: float,
+                 acquire: Callable[[str, str, float], bool], release: Callable[[str, str], None]):
+        self.name = name
+        self.holder = holder
+        self.lease_seconds = lease_seconds
+        self.renew_interval = lease_seconds / 3
+        self._acquire = acquire
+        self._release = release
+
+        self._jobs = {}
+        self._tasks = {}
+        self._renewed_at = 0.0
+        self.terms = 0
+        self.renew_errors = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, name: str, job: Callable[[], Awaitable]):
+        """Add a periodic job; it is started whenever this process becomes leader"""
+        self._jobs[name] = job
+
+    async def run(self):
+        while True:
+            try:
+                held = await asyncio.to_thread(self._acquire, self.name, self.holder, self.lease_seconds)
+            except Exception as e:
+                self.renew_errors += 1
+                logger.error(f"Error renewing {self.name} lease: {str(e)}")
+                # Without a renewal the lease may lapse and pass to another process; stop first
+                held = self.is_leader and time.monotonic() - self._renewed_at < self.lease_seconds - self.renew_interval
+            else:
+                if held:
+                    self._renewed_at = time.monotonic()
+
+            if held and not self.is_leader:
+                self._start()
+            elif not held and self.is_leader:
+                logger.warning(f"Lost {self.name} leadership, stopping {', '.join(self._tasks)}")
+                await self._stop()
+            await asyncio.sleep(self.renew_interval)
+
+    def _start(self):
+        self.terms += 1
+        logger.info(f"{self.holder} is {self.name} leader, starting {', '.join(self._jobs) or 'no jobs'}")
+        self._tasks = {name: asyncio.create_task(job()) for name, job in self._jobs.items()}
+
+    async def _stop(self):
+        tasks = list(self._tasks.values())
+        self._tasks = {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def resign(self):
+        """Stop the jobs and hand the lease back so another process can take over right away"""
+        if not self.is_leader:
+            return
+        await self._stop()
+        try:
+            await asyncio.to_thread(self._release, self.name, self.holder)
+        except Exception as e:
+            logger.error(f"Error releasing {self.name} lease: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "jobs": list(self._jobs),
+            "terms": self.terms,
+            "renew_errors": self.renew_errors,
+        }
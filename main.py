@@ -1,21 +1,44 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-import digitalocean
-import paramiko
 import time
+import base64
 import secrets
+import socket
+import sys
+import hashlib
+import hmac
+import shlex
 import string
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 import asyncio
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit
 import logging
 import os
 import json
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, event, Column, String, Integer, DateTime, Text, func, or_, and_, select, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from do_client import DO_API_URL, DigitalOceanClient, DigitalOceanError, droplet_public_ip
+from readiness import ProbePolicy, tcp_port_open, wait_until
+from cache import TTLCache
+from catalog import Catalog
+from migrations import run_migrations
+from ssh_session import AsyncSSHSession, SSHSession, session_totals
+from status_stream import StatusBroker, sse_event
+from metrics import Counter, Gauge, Histogram, Registry
+from leader import LeaderElection
 
 # Load environment variables
 load_dotenv()
@@ -30,8 +53,72 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./deployments.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+# Connection pools (ignored for in-memory SQLite, which keeps one connection per thread). The async
+# engine serves requests; the sync engine only serves background threads, so it gets a smaller pool.
+# Each process can open up to the sum of both pools' size + overflow
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "5"))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# SQLite runs in WAL mode so provisioning writes don't queue behind readers
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Schema changes normally run once per release (`python main.py migrate`), not in every worker
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "false").lower() == "true"
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def async_database_url(url: str) -> str:
+    """The same database addressed through an asyncio driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        # asyncpg takes ssl=, not libpq's sslmode=
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1).replace("sslmode=", "ssl=")
+    return url
+
+
+def engine_options(is_async: bool = False) -> dict:
+    options = {}
+    if IS_SQLITE:
+        options["connect_args"] = {"check_same_thread": False}
+        if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+            return options
+        if is_async:
+            # aiosqlite defaults to NullPool; reuse connections like the sync engine does
+            options["poolclass"] = AsyncAdaptedQueuePool
+    options.update(
+        pool_size=DB_POOL_SIZE if is_async else DB_SYNC_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW if is_async else DB_SYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+# Request handlers use the async engine; background loops and the worker keep the sync
+# engine, whose blocking calls they make from worker threads
+engine = create_engine(DATABASE_URL, **engine_options())
+async_engine = create_async_engine(async_database_url(DATABASE_URL), **engine_options(is_async=True))
+if IS_SQLITE:
+    event.listen(engine, "connect", configure_sqlite_connection)
+    event.listen(async_engine.sync_engine, "connect", configure_sqlite_connection)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Database model
@@ -51,6 +138,10 @@ class DeploymentModel(Base):
     expires_at = Column(DateTime, nullable=True)  # 7 days after creation
     error_message = Column(Text, nullable=True)
     is_free_deploy = Column(Integer, default=0)  # 1 if this was a free deploy
+    snapshot_id = Column(String, nullable=True)  # Snapshot of a hibernated deployment's droplet
+    hibernated_at = Column(DateTime, nullable=True)
+    phase_timings = Column(Text, nullable=True)  # JSON {phase: seconds} of the last provisioning run
+    batch_id = Column(String, nullable=True, index=True)  # Set when ordered through /provision/batch
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -66,27 +157,59 @@ class FreeDeployConfig(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Pre-provisioned droplets waiting to be assigned to a deployment
+class WarmDropletModel(Base):
+    __tablename__ = "warm_droplets"
 
-# Run migrations for existing tables (add new columns)
-def run_migrations():
-    """Add new columns to existing tables if they don't exist"""
-    from sqlalchemy import text
+    droplet_id = Column(Integer, primary_key=True)
+    region = Column(String, index=True)
+    status = Column(String, default="booting")  # booting -> ready -> claimed
+    ip_address = Column(String, nullable=True)
+    deployment_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    ready_at = Column(DateTime, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
 
-    with engine.connect() as conn:
-        # PostgreSQL: Add is_free_deploy column if it doesn't exist
-        try:
-            conn.execute(text("""
-                ALTER TABLE deployments
-                ADD COLUMN IF NOT EXISTS is_free_deploy INTEGER DEFAULT 0
-            """))
-            conn.commit()
-            logger.info("Migration: Ensured is_free_deploy column exists in deployments table")
-        except Exception as e:
-            logger.warning(f"Migration note: {e}")
+# Named leases: the process holding "scheduler" runs the periodic background jobs
+class SchedulerLeaseModel(Base):
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Durable provisioning work, claimed by workers with a lease and checkpointed per phase
+class ProvisionJobModel(Base):
+    __tablename__ = "provision_jobs"
+
+    job_id = Column(String, primary_key=True)
+    deployment_id = Column(String, index=True)
+    status = Column(String, default="queued", index=True)  # queued -> running -> done / failed / cancelled
+    phase = Column(String, default="pending")  # last completed checkpoint, see PROVISION_PHASES
+    region = Column(String)
+    encrypted_key = Column(Text, nullable=True)  # Fernet-encrypted Anthropic key, cleared when the job ends
+    attempts = Column(Integer, default=0)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    bootstrap_fetched_at = Column(DateTime, nullable=True)  # When the droplet fetched its key on first boot
+    bootstrap_report = Column(Text, nullable=True)  # JSON readiness report posted by the droplet
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def prepare_database():
+    """
+    Create tables, apply pending schema migrations and seed the free deploy config.
+
+    Runs once per release through `python main.py migrate` (or on startup with
+    MIGRATE_ON_STARTUP=true), never on import.
+    """
+    Base.metadata.create_all(bind=engine)
+    # Apply pending schema migrations (new columns and indexes)
+    run_migrations(engine)
+    init_free_deploy_config()
 
-run_migrations()
 
 # Initialize free deploy config if not exists
 def init_free_deploy_config():
@@ -105,9 +228,8 @@ def init_free_deploy_config():
     finally:
         db.close()
 
-init_free_deploy_config()
-
-app = FastAPI(title="AutoClaw - OpenClaw Provisioning Platform")
+# Endpoints are declared on a router; create_app() mounts it on the application
+router = APIRouter()
 
 # CORS middleware for frontend
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -120,21 +242,20 @@ ALLOWED_ORIGINS = [
 if os.getenv("ADDITIONAL_ORIGINS"):
     ALLOWED_ORIGINS.extend(os.getenv("ADDITIONAL_ORIGINS").split(","))
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=ALLOWED_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Helper function to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass  # Session will be closed after use
+async def get_db():
+    """Request-scoped async session; closed (and any open transaction rolled back) after the response"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def literal_in(column, values: list):
+    """
+    `column IN (...)` with the values written into the SQL instead of bound as parameters.
+
+    SQLite only uses a partial index when the query repeats the index predicate, and a
+    bound `status IN (?, ?)` never matches `WHERE status IN ('ready', 'expired')`.
+    """
+    return column.in_(bindparam(column.key, list(values), unique=True, expanding=True, literal_execute=True))
 
 class ProvisionRequest(BaseModel):
     anthropic_api_key: str = Field(..., min_length=20, description="Anthropic API key")
@@ -152,6 +273,15 @@ class ProvisionResponse(BaseModel):
     dashboard_url: Optional[str] = None
     ip_address: Optional[str] = None
 
+class BatchProvisionRequest(BaseModel):
+    deployments: List[ProvisionRequest] = Field(..., min_length=1, description="One spec per deployment")
+
+class BatchProvisionResponse(BaseModel):
+    batch_id: str
+    deployment_ids: List[str]
+    status: str
+    message: str
+
 class DeploymentStatus(BaseModel):
     deployment_id: str
     status: str
@@ -161,25 +291,176 @@ class DeploymentStatus(BaseModel):
     created_at: str
     updated_at: str
     error_message: Optional[str] = None
+    phase_timings: Optional[dict] = None
+    batch_id: Optional[str] = None
 
 # Configuration - Loaded from .env file
 DIGITALOCEAN_TOKEN = os.getenv("DIGITALOCEAN_TOKEN")
 SSH_KEY_ID = os.getenv("SSH_KEY_ID") or None  # Empty string becomes None
 SSH_PRIVATE_KEY_PATH = os.getenv("SSH_PRIVATE_KEY_PATH", os.path.expanduser("~/.ssh/id_ed25519"))
+SSH_PORT = int(os.getenv("SSH_PORT", "22"))
+# "atomic" renders the env file locally and applies it with a single remote script run,
+# "legacy" keeps the original line-by-line sed/echo path
+SSH_CONFIGURE_MODE = os.getenv("SSH_CONFIGURE_MODE", "atomic")
+# "cloud-init" configures new droplets on first boot: user_data carries a one-time token the
+# droplet uses to fetch its API key from PUBLIC_API_URL, then it reports back. Droplets that
+# don't report in time, warm pool droplets and restores are configured over SSH ("ssh")
+BOOT_CONFIGURE_MODE = os.getenv("BOOT_CONFIGURE_MODE", "ssh").lower()
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "").rstrip("/")
+
+# Provisioning engine: deployments in flight per process, and threads for blocking SSH I/O
+PROVISION_CONCURRENCY = int(os.getenv("PROVISION_CONCURRENCY", "200"))
+SSH_IO_THREADS = int(os.getenv("SSH_IO_THREADS", "16"))
+SSH_EXECUTOR = ThreadPoolExecutor(max_workers=SSH_IO_THREADS, thread_name_prefix="ssh-io")
+
+# Provisioning job queue. Web processes run an embedded worker unless EMBEDDED_WORKER=false,
+# in which case jobs are picked up by `python main.py worker` processes
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "true").lower() == "true"
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Key used to encrypt API keys while jobs are queued; derived from the DO token if unset
+JOB_ENCRYPTION_KEY = os.getenv("JOB_ENCRYPTION_KEY") or base64.urlsafe_b64encode(
+    hashlib.sha256(f"autoclawd-jobs:{os.getenv('DIGITALOCEAN_TOKEN', '')}".encode()).digest()
+).decode()
+# Bootstrap tokens are HMACs under this secret, so it must be set explicitly: a key derived from the
+# DO token (or from nothing) would let anyone forge them. Droplets fetch their API key from
+# PUBLIC_API_URL, which must be https. Without both, cloud-init mode falls back to ssh.
+BOOTSTRAP_SECRET = os.getenv("BOOTSTRAP_SECRET") or os.getenv("JOB_ENCRYPTION_KEY", "")
+if BOOT_CONFIGURE_MODE == "cloud-init":
+    if not BOOTSTRAP_SECRET:
+        logger.warning("BOOT_CONFIGURE_MODE=cloud-init needs BOOTSTRAP_SECRET or JOB_ENCRYPTION_KEY set, "
+                       "configuring droplets over SSH")
+        BOOT_CONFIGURE_MODE = "ssh"
+    elif not PUBLIC_API_URL.startswith("https://"):
+        logger.warning("BOOT_CONFIGURE_MODE=cloud-init needs an https:// PUBLIC_API_URL, "
+                       "configuring droplets over SSH")
+        BOOT_CONFIGURE_MODE = "ssh"
+
+# Periodic jobs (expiry reaper, snapshot retention, warm pool) run only in the process holding
+# the scheduler lease; another process takes over within this long of the leader dying
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+
+# Status streams: keepalive interval, and how often an idle stream re-reads the row to catch
+# transitions written by other processes. Each process has its own broker, so a stream served by
+# one web worker never hears about a job another worker (or a separate worker process) is running
+STATUS_STREAM_HEARTBEAT = float(os.getenv("STATUS_STREAM_HEARTBEAT", "15"))
+STATUS_STREAM_RESYNC_INTERVAL = float(os.getenv("STATUS_STREAM_RESYNC_INTERVAL", "15"))
+
+# Read caches for /status (by deployment) and wallet listings. Writes in this process update
+# them immediately; the TTL bounds staleness for writes made by separate worker processes
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "5"))
+WALLET_CACHE_SIZE = int(os.getenv("WALLET_CACHE_SIZE", "1000"))
+WALLET_CACHE_TTL = float(os.getenv("WALLET_CACHE_TTL", "30"))
+FREE_DEPLOYS_CACHE_TTL = float(os.getenv("FREE_DEPLOYS_CACHE_TTL", "5"))
+
+# Status updates from provisioning are batched and written once per interval
+STATUS_WRITE_INTERVAL = float(os.getenv("STATUS_WRITE_INTERVAL", "0.1"))
+
+# Shared DigitalOcean API client: connection pool, request pacing under DO's 250/minute
+# limit (also steered by its ratelimit-* headers) and retries on 429/5xx
+DIGITALOCEAN_API_URL = os.getenv("DIGITALOCEAN_API_URL", DO_API_URL)
+DO_MAX_CONNECTIONS = int(os.getenv("DO_MAX_CONNECTIONS", "20"))
+DO_RATE_LIMIT_PER_MINUTE = float(os.getenv("DO_RATE_LIMIT_PER_MINUTE", "240"))
+DO_RATE_LIMIT_BURST = int(os.getenv("DO_RATE_LIMIT_BURST", "50"))
+DO_MAX_RETRIES = int(os.getenv("DO_MAX_RETRIES", "5"))
+
+# Batch orders (/provision/batch): deployments per request, and how long droplet creates of
+# one batch are gathered into DigitalOcean multi-create calls (up to 10 droplets each)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "50"))
+DROPLET_BATCH_WINDOW = float(os.getenv("DROPLET_BATCH_WINDOW", "0.5"))
+
+# Catalog of SSH keys, regions, sizes and image availability used to validate /provision;
+# ignored once older than CATALOG_TTL (e.g. while DO is unreachable)
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "600"))
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "3600"))
+
+# Droplet spec shared by cold provisions and the warm pool
+DROPLET_SIZE = os.getenv("DEFAULT_DROPLET_SIZE", "s-2vcpu-4gb")  # Minimum recommended
+DROPLET_IMAGE = "moltbot"  # Marketplace image slug
+
+# Warm pool: booted, unassigned droplets per region, e.g. WARM_POOL_SIZES=nyc3:2,sfo3:1
+WARM_POOL_SIZES = {
+    region.strip(): int(size)
+    for region, size in (
+        entry.split(":", 1) for entry in os.getenv("WARM_POOL_SIZES", "").split(",") if ":" in entry
+    )
+}
+WARM_POOL_MAX_TOTAL = int(os.getenv("WARM_POOL_MAX_TOTAL", "10"))
+# A region's pool drains once it has seen no provisions for this long, and idle droplets are recycled
+WARM_POOL_IDLE_TIMEOUT = int(os.getenv("WARM_POOL_IDLE_TIMEOUT", "21600"))
+WARM_POOL_REPLENISH_INTERVAL = int(os.getenv("WARM_POOL_REPLENISH_INTERVAL", "60"))
+
+# Expiry: deadlines due within two reload intervals are kept in memory and reaped on time;
+# destroys run concurrently but are started at no more than EXPIRY_DESTROY_RATE per second
+EXPIRY_RELOAD_INTERVAL = float(os.getenv("EXPIRY_RELOAD_INTERVAL", "300"))
+EXPIRY_DESTROY_CONCURRENCY = int(os.getenv("EXPIRY_DESTROY_CONCURRENCY", "5"))
+EXPIRY_DESTROY_RATE = float(os.getenv("EXPIRY_DESTROY_RATE", "5"))
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "50"))
+EXPIRY_RETRY_DELAY = float(os.getenv("EXPIRY_RETRY_DELAY", "60"))
+# EXPIRY_MODE=hibernate powers expired droplets off and snapshots them before destroying them, so a
+# late /renew restores from the snapshot instead of reprovisioning. Snapshots are kept for
+# HIBERNATE_RETENTION_DAYS and at most HIBERNATE_MAX_SNAPSHOTS exist at once (oldest evicted first)
+EXPIRY_MODE = os.getenv("EXPIRY_MODE", "destroy").lower()
+HIBERNATE_RETENTION_DAYS = float(os.getenv("HIBERNATE_RETENTION_DAYS", "14"))
+HIBERNATE_MAX_SNAPSHOTS = int(os.getenv("HIBERNATE_MAX_SNAPSHOTS", "100"))
+SNAPSHOT_RETENTION_INTERVAL = float(os.getenv("SNAPSHOT_RETENTION_INTERVAL", "3600"))
+
+# Droplet status is polled for all deployments at once: one tag listing per interval
+DROPLET_POLL_TAG = "autoclawd"
+DROPLET_POLL_INTERVAL = float(os.getenv("DROPLET_POLL_INTERVAL", "5"))
+
+# Readiness probes: how long each provisioning phase may take and the ceiling on its poll interval
+PROBE_POLICIES = {
+    "droplet_active": ProbePolicy(timeout=float(os.getenv("DROPLET_READY_TIMEOUT", "300"))),
+    # Power-off and snapshot actions; snapshots of a full disk take minutes
+    "droplet_action": ProbePolicy(
+        timeout=float(os.getenv("DROPLET_ACTION_TIMEOUT", "1800")),
+        initial_delay=5.0,
+        max_delay=30.0,
+    ),
+    "ssh_ready": ProbePolicy(
+        timeout=float(os.getenv("SSH_READY_TIMEOUT", "180")),
+        max_delay=float(os.getenv("SSH_POLL_MAX_INTERVAL", "10")),
+    ),
+    "boot_settled": ProbePolicy(
+        timeout=float(os.getenv("BOOT_SETTLE_TIMEOUT", "120")),
+        max_delay=float(os.getenv("BOOT_POLL_MAX_INTERVAL", "5")),
+    ),
+    "openclaw_ready": ProbePolicy(
+        timeout=float(os.getenv("OPENCLAW_INIT_TIMEOUT", "600")),
+        max_delay=float(os.getenv("OPENCLAW_POLL_MAX_INTERVAL", "15")),
+    ),
+    # From droplet active to its first-boot report; past this we configure over SSH
+    "boot_configured": ProbePolicy(
+        timeout=float(os.getenv("BOOT_CONFIGURE_TIMEOUT", "420")),
+        initial_delay=5.0,
+        max_delay=10.0,
+    ),
+}
 
 # For Railway: SSH key can be passed as base64 encoded string
 SSH_PRIVATE_KEY_BASE64 = os.getenv("SSH_PRIVATE_KEY_BASE64")
-if SSH_PRIVATE_KEY_BASE64:
-    import base64
-    import tempfile
-    # Decode and write to temp file
-    key_content = base64.b64decode(SSH_PRIVATE_KEY_BASE64).decode('utf-8')
-    temp_key_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='_ssh_key')
-    temp_key_file.write(key_content)
-    temp_key_file.close()
-    os.chmod(temp_key_file.name, 0o600)
-    SSH_PRIVATE_KEY_PATH = temp_key_file.name
-    logger.info(f"Using SSH key from environment variable")
+_ssh_key_file: Optional[str] = None
+
+
+def ssh_private_key_path() -> str:
+    """Private key file for droplet SSH; a key passed in the environment is written out on first use"""
+    global _ssh_key_file
+    if not SSH_PRIVATE_KEY_BASE64:
+        return SSH_PRIVATE_KEY_PATH
+    if _ssh_key_file is None:
+        import tempfile
+        # Decode and write to temp file
+        key_content = base64.b64decode(SSH_PRIVATE_KEY_BASE64).decode('utf-8')
+        temp_key_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='_ssh_key')
+        temp_key_file.write(key_content)
+        temp_key_file.close()
+        os.chmod(temp_key_file.name, 0o600)
+        _ssh_key_file = temp_key_file.name
+        logger.info(f"Using SSH key from environment variable")
+    return _ssh_key_file
 
 
 def generate_deployment_id():
@@ -187,7 +468,7 @@ def generate_deployment_id():
     return ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(12))
 
 
-def get_or_create_ssh_key(manager: digitalocean.Manager):
+async def get_or_create_ssh_key():
     """Get existing SSH key or create one"""
     global SSH_KEY_ID
     
@@ -195,9 +476,9 @@ def get_or_create_ssh_key(manager: digitalocean.Manager):
         return SSH_KEY_ID
     
     # Try to find existing key
-    keys = manager.get_all_sshkeys()
-    if keys:
-        SSH_KEY_ID = keys[0].id
+    key_id = await catalog.ssh_key_id()
+    if key_id:
+        SSH_KEY_ID = key_id
         logger.info(f"Using existing SSH key: {SSH_KEY_ID}")
         return SSH_KEY_ID
     
@@ -206,679 +487,3185 @@ def get_or_create_ssh_key(manager: digitalocean.Manager):
     raise HTTPException(status_code=500, detail="No SSH keys configured in DigitalOcean")
 
 
-def create_cloud_init_script(anthropic_key: str) -> str:
-    """Generate cloud-init script - API key is configured via SSH after boot for reliability"""
-    return """#cloud-config
+def create_cloud_init_script(bootstrap_job_id: Optional[str] = None) -> str:
+    """
+    Generate cloud-init user_data.
+
+    Without a job ID the droplet only marks first boot done and is configured over SSH.
+    With one it also runs the bootstrap script, which configures OpenClaw itself; the
+    API key is not in user_data, only the job's one-time token for fetching it.
+    """
+    if not bootstrap_job_id:
+        return f"""#cloud-config
+package_update: false
+
+runcmd:
+  - echo "Droplet ready for Auto Clawd configuration" > {BOOT_MARKER_PATH}
+"""
+
+    script = build_bootstrap_script(f"{PUBLIC_API_URL}/bootstrap/{bootstrap_job_id}", bootstrap_token(bootstrap_job_id))
+    return f"""#cloud-config
 package_update: false
 
+write_files:
+  - path: {BOOTSTRAP_SCRIPT_PATH}
+    permissions: '0700'
+    encoding: b64
+    content: {base64.b64encode(script.encode()).decode()}
+
 runcmd:
-  - echo "Droplet ready for Auto Clawd configuration" > /var/log/autoclawd_ready.log
+  - echo "Droplet ready for Auto Clawd configuration" > {BOOT_MARKER_PATH}
+  - bash {BOOTSTRAP_SCRIPT_PATH}
 """
 
 
-def wait_for_droplet_ready(droplet: digitalocean.Droplet, timeout: int = 300):
-    """Wait for droplet to be active and have an IP"""
-    start_time = time.time()
-    
-    while time.time() - start_time < timeout:
-        droplet.load()
-        
-        if droplet.status == 'active' and droplet.ip_address:
-            logger.info(f"Droplet {droplet.id} is ready with IP {droplet.ip_address}")
-            return True
-        
-        logger.info(f"Droplet status: {droplet.status}, waiting...")
-        time.sleep(10)
-    
-    raise TimeoutError(f"Droplet {droplet.id} did not become ready within {timeout} seconds")
+class DropletStatusPoller:
+    """
+    Central droplet status poller shared by every deployment waiting for its droplet.
+
+    Each tick makes one paginated listing of all droplets carrying our tag and resolves
+    every waiter whose droplet is active with an IP, so DO API traffic stays flat no
+    matter how many provisions are in flight. A droplet missing from the listing for a
+    few ticks (e.g. it lacks the tag) is looked up directly instead.
+    """
 
+    MISSING_TICKS_BEFORE_DIRECT_LOOKUP = 3
+
+    def __init__(self, tag: str, interval: float):
+        self.tag = tag
+        self.interval = interval
+        self._waiters = {}
+        self._missing = {}
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.list_calls = 0
+        self.direct_lookups = 0
+
+    async def wait_active(self, droplet_id: int, timeout: float) -> str:
+        """Wait until the droplet is active and return its public IP"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(droplet_id, []).append(future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
 
-def wait_for_ssh_ready(ip_address: str, timeout: int = 180):
-    """Wait for SSH to be available on the droplet"""
-    start_time = time.time()
-    
-    while time.time() - start_time < timeout:
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(
-                ip_address,
-                username='root',
-                key_filename=SSH_PRIVATE_KEY_PATH,
-                timeout=10,
-                banner_timeout=10
-            )
-            ssh.close()
-            logger.info(f"SSH is ready on {ip_address}")
-            return True
-        except Exception as e:
-            logger.info(f"SSH not ready yet: {str(e)}")
-            time.sleep(10)
-    
-    raise TimeoutError(f"SSH did not become ready on {ip_address} within {timeout} seconds")
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Droplet {droplet_id} did not become ready within {timeout:.0f} seconds")
+        finally:
+            waiters = self._waiters.get(droplet_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(droplet_id, None)
+                self._missing.pop(droplet_id, None)
+
+    def _resolve(self, droplet_id: int, droplet: dict) -> bool:
+        ip_address = droplet_public_ip(droplet)
+        if droplet["status"] != 'active' or not ip_address:
+            return False
+        for future in self._waiters.get(droplet_id, []):
+            if not future.done():
+                future.set_result(ip_address)
+        return True
+
+    async def _tick(self):
+        client = get_do_client()
+        droplets = await client.list_droplets(tag_name=self.tag)
+        self.ticks += 1
+        self.list_calls += 1
+        by_id = {droplet["id"]: droplet for droplet in droplets}
+
+        for droplet_id in list(self._waiters):
+            droplet = by_id.get(droplet_id)
+            if droplet is None:
+                self._missing[droplet_id] = self._missing.get(droplet_id, 0) + 1
+                if self._missing[droplet_id] < self.MISSING_TICKS_BEFORE_DIRECT_LOOKUP:
+                    continue
+                self.direct_lookups += 1
+                droplet = await client.get_droplet(droplet_id)
+
+            self._missing.pop(droplet_id, None)
+            if not self._resolve(droplet_id, droplet):
+                logger.info(f"Droplet {droplet_id} status: {droplet['status']}, waiting...")
+
+    async def _run(self):
+        while self._waiters:
+            try:
+                await self._tick()
+            except Exception as e:
+                logger.error(f"Error polling droplet status: {str(e)}")
+            if self._waiters:
+                await asyncio.sleep(self.interval)
 
+    def stats(self) -> dict:
+        return {
+            "waiting": len(self._waiters),
+            "ticks": self.ticks,
+            "list_calls": self.list_calls,
+            "direct_lookups": self.direct_lookups,
+        }
 
-def configure_api_key_via_ssh(ip_address: str, anthropic_key: str) -> bool:
-    """Configure Anthropic API key on the droplet via SSH"""
 
-    # Wait for SSH to be ready
-    wait_for_ssh_ready(ip_address)
+droplet_poller = DropletStatusPoller(DROPLET_POLL_TAG, DROPLET_POLL_INTERVAL)
 
-    # Give the system time to fully boot
-    logger.info("Waiting for system to fully boot before configuring API key...")
-    time.sleep(30)
 
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+async def wait_for_droplet_ready(droplet_id: int) -> str:
+    """Wait for droplet to be active and have an IP, and return the IP"""
+    ip_address = await droplet_poller.wait_active(droplet_id, PROBE_POLICIES["droplet_active"].timeout)
+    logger.info(f"Droplet {droplet_id} is ready with IP {ip_address}")
+    return ip_address
 
-    try:
-        ssh.connect(
-            ip_address,
-            username='root',
-            key_filename=SSH_PRIVATE_KEY_PATH,
-            timeout=30
-        )
 
-        logger.info(f"Connected to {ip_address}, configuring Anthropic API key...")
+def open_ssh_session(ip_address: str) -> AsyncSSHSession:
+    """New async SSH session for a droplet, running its I/O on the shared SSH executor"""
+    return AsyncSSHSession(SSHSession(ip_address, ssh_private_key_path(), port=SSH_PORT), SSH_EXECUTOR)
 
-        # Check if clawdbot.env exists
-        stdin, stdout, stderr = ssh.exec_command("test -f /opt/clawdbot.env && echo 'exists'")
-        if stdout.read().decode().strip() != 'exists':
-            logger.error("/opt/clawdbot.env not found")
-            ssh.close()
+
+async def wait_for_ssh_ready(session: AsyncSSHSession):
+    """Wait for SSH to be available on the droplet, leaving the session connected"""
+
+    async def ssh_ready():
+        # A refused TCP connect is much cheaper than a failed SSH handshake
+        if not await tcp_port_open(session.host, session.port):
             return False
+        await session.connect(timeout=10)
+        return True
 
-        # Remove any existing ANTHROPIC_API_KEY line (commented or not)
-        ssh.exec_command("sed -i '/ANTHROPIC_API_KEY/d' /opt/clawdbot.env")
-        time.sleep(1)
+    await wait_until(ssh_ready, PROBE_POLICIES["ssh_ready"], f"SSH on {session.host}")
+    return True
 
-        # Add the API key
-        stdin, stdout, stderr = ssh.exec_command(f"echo 'ANTHROPIC_API_KEY={anthropic_key}' >> /opt/clawdbot.env")
-
-        # Enable ALL features by default for dashboard access
-        logger.info("Enabling all features for dashboard...")
-
-        features_to_enable = [
-            # Web login and dashboard features
-            ("WEB_LOGIN_ENABLED", "true"),
-            ("ENABLE_WEB_CHANNEL_LOGIN", "true"),
-            ("DASHBOARD_ENABLED", "true"),
-            ("WEB_UI_ENABLED", "true"),
-
-            # WhatsApp
-            ("WHATSAPP_ENABLED", "true"),
-            ("WHATSAPP_WEB_ENABLED", "true"),
-            ("WHATSAPP_QR_LOGIN", "true"),
-
-            # Telegram
-            ("TELEGRAM_ENABLED", "true"),
-            ("TELEGRAM_WEB_LOGIN", "true"),
-
-            # Discord
-            ("DISCORD_ENABLED", "true"),
-            ("DISCORD_WEB_LOGIN", "true"),
-
-            # Slack
-            ("SLACK_ENABLED", "true"),
-            ("SLACK_WEB_LOGIN", "true"),
-
-            # Other messaging platforms
-            ("SIGNAL_ENABLED", "true"),
-            ("MATRIX_ENABLED", "true"),
-            ("IRC_ENABLED", "true"),
-
-            # Email
-            ("EMAIL_ENABLED", "true"),
-            ("GMAIL_ENABLED", "true"),
-            ("SMTP_ENABLED", "true"),
-            ("IMAP_ENABLED", "true"),
-
-            # Productivity integrations
-            ("GITHUB_ENABLED", "true"),
-            ("NOTION_ENABLED", "true"),
-            ("GOOGLE_CALENDAR_ENABLED", "true"),
-            ("GOOGLE_DRIVE_ENABLED", "true"),
-
-            # AI features
-            ("WEB_BROWSING_ENABLED", "true"),
-            ("FILE_ACCESS_ENABLED", "true"),
-            ("CODE_EXECUTION_ENABLED", "true"),
-            ("AUTONOMOUS_MODE_ENABLED", "true"),
-
-            # MCP (Model Context Protocol) servers
-            ("MCP_ENABLED", "true"),
-            ("MCP_FILESYSTEM_ENABLED", "true"),
-            ("MCP_BROWSER_ENABLED", "true"),
-            ("MCP_GITHUB_ENABLED", "true"),
-
-            # Other features
-            ("WEBHOOKS_ENABLED", "true"),
-            ("API_ACCESS_ENABLED", "true"),
-            ("SCHEDULED_TASKS_ENABLED", "true"),
-            ("VOICE_ENABLED", "true"),
-            ("IMAGE_GENERATION_ENABLED", "true"),
-        ]
 
-        for key, value in features_to_enable:
-            ssh.exec_command(f"sed -i '/{key}/d' /opt/clawdbot.env")
-            ssh.exec_command(f"echo '{key}={value}' >> /opt/clawdbot.env")
+async def wait_for_boot_settled(session: AsyncSSHSession):
+    """Wait until first boot has finished: cloud-init ran and clawdbot.env exists"""
+    probe_command = (
+        f"test -f {CLAWDBOT_ENV_PATH} && test -f {BOOT_MARKER_PATH} && "
+        "! systemctl is-system-running 2>/dev/null | grep -qE '^(initializing|starting)$'"
+    )
+
+    async def boot_settled():
+        exit_status, _, _ = await session.exec(probe_command)
+        return exit_status == 0
+
+    await wait_until(boot_settled, PROBE_POLICIES["boot_settled"], f"First boot on {session.host}")
+
+
+CLAWDBOT_ENV_PATH = "/opt/clawdbot.env"
+CLAWDBOT_CLI_PATH = "/opt/clawdbot-cli.sh"
+CONFIGURE_SCRIPT_PATH = "/root/.autoclawd-configure.sh"
+BOOT_MARKER_PATH = "/var/log/autoclawd_ready.log"
+BOOTSTRAP_SCRIPT_PATH = "/root/.autoclawd-bootstrap.sh"
+BOOTSTRAP_REPORT_PATH = "/var/lib/autoclawd/bootstrap.json"
+OPENCLAW_GATEWAY_PORT = 18789
+
+# Enable ALL features by default for dashboard access
+FEATURES_TO_ENABLE = [
+    # Web login and dashboard features
+    ("WEB_LOGIN_ENABLED", "true"),
+    ("ENABLE_WEB_CHANNEL_LOGIN", "true"),
+    ("DASHBOARD_ENABLED", "true"),
+    ("WEB_UI_ENABLED", "true"),
+
+    # WhatsApp
+    ("WHATSAPP_ENABLED", "true"),
+    ("WHATSAPP_WEB_ENABLED", "true"),
+    ("WHATSAPP_QR_LOGIN", "true"),
+
+    # Telegram
+    ("TELEGRAM_ENABLED", "true"),
+    ("TELEGRAM_WEB_LOGIN", "true"),
+
+    # Discord
+    ("DISCORD_ENABLED", "true"),
+    ("DISCORD_WEB_LOGIN", "true"),
+
+    # Slack
+    ("SLACK_ENABLED", "true"),
+    ("SLACK_WEB_LOGIN", "true"),
+
+    # Other messaging platforms
+    ("SIGNAL_ENABLED", "true"),
+    ("MATRIX_ENABLED", "true"),
+    ("IRC_ENABLED", "true"),
+
+    # Email
+    ("EMAIL_ENABLED", "true"),
+    ("GMAIL_ENABLED", "true"),
+    ("SMTP_ENABLED", "true"),
+    ("IMAP_ENABLED", "true"),
+
+    # Productivity integrations
+    ("GITHUB_ENABLED", "true"),
+    ("NOTION_ENABLED", "true"),
+    ("GOOGLE_CALENDAR_ENABLED", "true"),
+    ("GOOGLE_DRIVE_ENABLED", "true"),
+
+    # AI features
+    ("WEB_BROWSING_ENABLED", "true"),
+    ("FILE_ACCESS_ENABLED", "true"),
+    ("CODE_EXECUTION_ENABLED", "true"),
+    ("AUTONOMOUS_MODE_ENABLED", "true"),
+
+    # MCP (Model Context Protocol) servers
+    ("MCP_ENABLED", "true"),
+    ("MCP_FILESYSTEM_ENABLED", "true"),
+    ("MCP_BROWSER_ENABLED", "true"),
+    ("MCP_GITHUB_ENABLED", "true"),
+
+    # Other features
+    ("WEBHOOKS_ENABLED", "true"),
+    ("API_ACCESS_ENABLED", "true"),
+    ("SCHEDULED_TASKS_ENABLED", "true"),
+    ("VOICE_ENABLED", "true"),
+    ("IMAGE_GENERATION_ENABLED", "true"),
+]
 
-        logger.info("All features enabled for dashboard")
+# clawdbot-cli.sh settings: full host access for TUI/Dashboard so the bot can
+# configure channels itself, and sandbox mode disabled
+CLAWDBOT_CLI_SETTINGS = [
+    ("tools.exec.host", "gateway"),
+    ("tools.exec.security", "full"),
+    ("agents.defaults.sandbox.mode", "off"),
+]
 
-        # Enable full host access for TUI/Dashboard so bot can configure channels itself
-        logger.info("Enabling full host access for Clawdbot...")
-        ssh.exec_command("/opt/clawdbot-cli.sh config set tools.exec.host gateway")
-        time.sleep(1)
-        ssh.exec_command("/opt/clawdbot-cli.sh config set tools.exec.security full")
-        time.sleep(1)
 
-        # Disable sandbox mode
-        ssh.exec_command("/opt/clawdbot-cli.sh config set agents.defaults.sandbox.mode off")
-        time.sleep(1)
-        stderr_output = stderr.read().decode().strip()
-        if stderr_output:
-            logger.error(f"Error adding API key: {stderr_output}")
-
-        # Verify the key was added
-        stdin, stdout, stderr = ssh.exec_command("grep '^ANTHROPIC_API_KEY=' /opt/clawdbot.env")
-        verify_output = stdout.read().decode().strip()
-        if anthropic_key in verify_output:
-            logger.info("Anthropic API key configured successfully")
-        else:
-            logger.warning(f"API key verification failed, got: {verify_output[:50]}...")
-
-        # Restart clawdbot service to pick up the new key
-        logger.info("Restarting clawdbot service...")
-        stdin, stdout, stderr = ssh.exec_command("systemctl restart clawdbot")
-        time.sleep(5)
-
-        # Check service status
-        stdin, stdout, stderr = ssh.exec_command("systemctl is-active clawdbot")
-        service_status = stdout.read().decode().strip()
-        logger.info(f"Clawdbot service status: {service_status}")
-
-        ssh.close()
-        return service_status == "active"
+def render_clawdbot_env(current_env: str, anthropic_key: str) -> str:
+    """Render the full clawdbot.env: existing entries minus the ones we manage, plus ours"""
+    managed = {"ANTHROPIC_API_KEY"} | {key for key, _ in FEATURES_TO_ENABLE}
 
-    except Exception as e:
-        logger.error(f"Error configuring API key via SSH: {str(e)}")
+    lines = []
+    for line in current_env.splitlines():
+        # Drop managed keys whether they are commented out or not
+        name = line.strip().lstrip("#").strip().split("=", 1)[0].strip()
+        if name in managed:
+            continue
+        lines.append(line)
+
+    lines.append(f"ANTHROPIC_API_KEY={anthropic_key}")
+    lines.extend(f"{key}={value}" for key, value in FEATURES_TO_ENABLE)
+    return "\n".join(lines) + "\n"
+
+
+def build_configure_script(rendered_env: str, expected_sha256: str) -> str:
+    """
+    Build the remote script that swaps in the rendered env file and applies CLI settings.
+
+    The env file is only replaced if it still matches the hash it had when we read it,
+    and the swap itself is a single rename. The script prints one AUTOCLAWD_REPORT line
+    with the exit status of every step.
+    """
+    delimiter = "AUTOCLAWD_ENV_EOF"
+    if delimiter in rendered_env:
+        raise ValueError("Rendered env file contains the heredoc delimiter")
+
+    new_env_path = f"{CLAWDBOT_ENV_PATH}.autoclawd-new"
+    cli_steps = "\n".join(
+        f"run_step {shlex.quote('config:' + key)} {CLAWDBOT_CLI_PATH} config set "
+        f"{shlex.quote(key)} {shlex.quote(value)}"
+        for key, value in CLAWDBOT_CLI_SETTINGS
+    )
+
+    return f"""#!/bin/bash
+# Generated by AutoClaw: applies a pre-rendered {CLAWDBOT_ENV_PATH} in one step
+set -u
+rm -f "$0"
+umask 077
+
+ENV_FILE={CLAWDBOT_ENV_PATH}
+NEW_FILE={new_env_path}
+RESULTS=""
+
+report() {{
+    echo "AUTOCLAWD_REPORT {{$RESULTS}}"
+}}
+
+run_step() {{
+    local name="$1"
+    shift
+    "$@" >/dev/null 2>&1
+    local rc=$?
+    RESULTS="$RESULTS${{RESULTS:+,}}\\"$name\\":$rc"
+    return $rc
+}}
+
+if [ ! -f "$ENV_FILE" ]; then
+    RESULTS="\\"env_file\\":\\"missing\\""
+    report
+    exit 2
+fi
+
+if [ "$(sha256sum "$ENV_FILE" | cut -d' ' -f1)" != "{expected_sha256}" ]; then
+    RESULTS="\\"env_file\\":\\"changed\\""
+    report
+    exit 3
+fi
+
+cat > "$NEW_FILE" <<'{delimiter}'
+{rendered_env}{delimiter}
+
+run_step env_permissions chmod --reference="$ENV_FILE" "$NEW_FILE"
+run_step env_owner chown --reference="$ENV_FILE" "$NEW_FILE"
+if ! run_step env_swap mv -f "$NEW_FILE" "$ENV_FILE"; then
+    rm -f "$NEW_FILE"
+    report
+    exit 1
+fi
+run_step verify_key grep -q '^ANTHROPIC_API_KEY=' "$ENV_FILE"
+
+{cli_steps}
+
+# Restart clawdbot service to pick up the new key
+run_step restart systemctl restart clawdbot
+for _ in $(seq 1 10); do
+    systemctl is-active --quiet clawdbot && break
+    sleep 1
+done
+SERVICE_STATUS=$(systemctl is-active clawdbot 2>/dev/null)
+RESULTS="$RESULTS,\\"service\\":\\"$SERVICE_STATUS\\""
+report
+
+[ "$SERVICE_STATUS" = "active" ]
+"""
+
+
+def parse_configure_report(output: str) -> dict:
+    """Extract the AUTOCLAWD_REPORT JSON line printed by the configure script"""
+    for line in reversed(output.splitlines()):
+        if line.startswith("AUTOCLAWD_REPORT "):
+            try:
+                return json.loads(line[len("AUTOCLAWD_REPORT "):])
+            except json.JSONDecodeError:
+                break
+    return {}
+
+
+def bootstrap_token(job_id: str) -> str:
+    """Secret a job's droplet presents to fetch its key and post its report"""
+    return hmac.new(BOOTSTRAP_SECRET.encode(), f"bootstrap:{job_id}".encode(), hashlib.sha256).hexdigest()
+
+
+def build_bootstrap_script(bootstrap_url: str, token: str) -> str:
+    """
+    Build the first-boot script that configures OpenClaw without SSH.
+
+    It waits for the image to create clawdbot.env, fetches the API key once from
+    bootstrap_url, rewrites the env file in one rename, applies the CLI settings and
+    restarts the service. Once the gateway is up it writes a JSON report (step exit
+    statuses, service state and the gateway token) to BOOTSTRAP_REPORT_PATH and posts
+    it back, so the worker knows the droplet is configured.
+    """
+    managed = "|".join(["ANTHROPIC_API_KEY"] + [key for key, _ in FEATURES_TO_ENABLE])
+    features = "\n".join(f"{key}={value}" for key, value in FEATURES_TO_ENABLE)
+    cli_steps = "\n".join(
+        f"run_step {shlex.quote('config:' + key)} {CLAWDBOT_CLI_PATH} config set "
+        f"{shlex.quote(key)} {shlex.quote(value)}"
+        for key, value in CLAWDBOT_CLI_SETTINGS
+    )
+    curl = f"curl -fsS -m 15 --retry 5 --retry-delay 2 -X POST -H {shlex.quote('X-Bootstrap-Token: ' + token)}"
+
+    return f"""#!/bin/bash
+# Generated by AutoClaw: configures OpenClaw on first boot
+set -u
+rm -f "$0"
+umask 077
+
+ENV_FILE={CLAWDBOT_ENV_PATH}
+NEW_FILE={CLAWDBOT_ENV_PATH}.autoclawd-new
+REPORT_FILE={BOOTSTRAP_REPORT_PATH}
+URL={shlex.quote(bootstrap_url)}
+RESULTS=""
+
+report() {{
+    mkdir -p "$(dirname "$REPORT_FILE")"
+    echo "{{$RESULTS}}" > "$REPORT_FILE"
+    {curl} -H 'Content-Type: application/json' --data-binary @"$REPORT_FILE" "$URL/report" >/dev/null
+}}
+
+run_step() {{
+    local name="$1"
+    shift
+    "$@" >/dev/null 2>&1
+    local rc=$?
+    RESULTS="$RESULTS${{RESULTS:+,}}\\"$name\\":$rc"
+    return $rc
+}}
+
+for _ in $(seq 1 120); do
+    [ -f "$ENV_FILE" ] && break
+    sleep 2
+done
+if [ ! -f "$ENV_FILE" ]; then
+    RESULTS="\\"env_file\\":\\"missing\\""
+    report
+    exit 2
+fi
+
+KEY=$({curl} "$URL/key" | tr -d '\\r\\n')
+if [ -z "$KEY" ]; then
+    RESULTS="\\"key\\":\\"unavailable\\""
+    report
+    exit 3
+fi
+
+grep -vE '^[[:space:]#]*({managed})[[:space:]]*=' "$ENV_FILE" > "$NEW_FILE"
+printf 'ANTHROPIC_API_KEY=%s\\n' "$KEY" >> "$NEW_FILE"
+unset KEY
+cat >> "$NEW_FILE" <<'AUTOCLAWD_ENV_EOF'
+{features}
+AUTOCLAWD_ENV_EOF
+
+run_step env_permissions chmod --reference="$ENV_FILE" "$NEW_FILE"
+run_step env_owner chown --reference="$ENV_FILE" "$NEW_FILE"
+if ! run_step env_swap mv -f "$NEW_FILE" "$ENV_FILE"; then
+    rm -f "$NEW_FILE"
+    report
+    exit 1
+fi
+
+{cli_steps}
+
+run_step restart systemctl restart clawdbot
+for _ in $(seq 1 120); do
+    systemctl is-active --quiet clawdbot && timeout 2 bash -c '</dev/tcp/127.0.0.1/{OPENCLAW_GATEWAY_PORT}' 2>/dev/null && break
+    sleep 2
+done
+SERVICE_STATUS=$(systemctl is-active clawdbot 2>/dev/null)
+GATEWAY_TOKEN=$(grep '^CLAWDBOT_GATEWAY_TOKEN=' "$ENV_FILE" | cut -d'=' -f2 | tr -cd 'A-Za-z0-9._~-')
+RESULTS="$RESULTS,\\"service\\":\\"$SERVICE_STATUS\\",\\"gateway_token\\":\\"$GATEWAY_TOKEN\\""
+report
+"""
+
+
+def apply_clawdbot_config_atomic(session: SSHSession, anthropic_key: str, max_attempts: int = 3) -> bool:
+    """Render clawdbot.env locally, upload it with one SFTP write and apply it with one script run"""
+    for attempt in range(max_attempts):
+        sftp = session.open_sftp()
         try:
-            ssh.close()
-        except:
-            pass
+            try:
+                with sftp.open(CLAWDBOT_ENV_PATH, "r") as f:
+                    current_env = f.read()
+            except FileNotFoundError:
+                logger.error(f"{CLAWDBOT_ENV_PATH} not found")
+                return False
+
+            expected_sha256 = hashlib.sha256(current_env).hexdigest()
+            rendered_env = render_clawdbot_env(current_env.decode(), anthropic_key)
+            script = build_configure_script(rendered_env, expected_sha256)
+
+            with sftp.open(CONFIGURE_SCRIPT_PATH, "w") as f:
+                f.chmod(0o700)
+                f.write(script)
+        finally:
+            sftp.close()
+
+        exit_status, output, _ = session.exec(f"bash {CONFIGURE_SCRIPT_PATH}")
+        report = parse_configure_report(output)
+        logger.info(f"Configure script exited with {exit_status}: {report}")
+
+        if report.get("env_file") == "changed":
+            # Something else rewrote the env file between our read and the swap; re-render
+            logger.info(f"clawdbot.env changed during configuration, retrying ({attempt + 1}/{max_attempts})")
+            continue
+
+        failed_steps = [name for name, rc in report.items() if isinstance(rc, int) and rc != 0]
+        if failed_steps:
+            logger.warning(f"Configure steps failed: {', '.join(failed_steps)}")
+
+        return exit_status == 0 and report.get("service") == "active"
+
+    logger.error("clawdbot.env kept changing during configuration, giving up")
+    return False
+
+
+def apply_clawdbot_config_legacy(session: SSHSession, anthropic_key: str) -> bool:
+    """Original line-by-line configuration path (one sed/echo pair per entry)"""
+    ssh = session.connect()
+
+    # Check if clawdbot.env exists
+    stdin, stdout, stderr = ssh.exec_command(f"test -f {CLAWDBOT_ENV_PATH} && echo 'exists'")
+    if stdout.read().decode().strip() != 'exists':
+        logger.error(f"{CLAWDBOT_ENV_PATH} not found")
         return False
 
+    # Remove any existing ANTHROPIC_API_KEY line (commented or not)
+    ssh.exec_command(f"sed -i '/ANTHROPIC_API_KEY/d' {CLAWDBOT_ENV_PATH}")
+    time.sleep(1)
 
-def get_dashboard_url_via_ssh(ip_address: str, max_retries: int = 20) -> str:
-    """Retrieve OpenClaw dashboard URL via SSH"""
+    # Add the API key
+    stdin, stdout, stderr = ssh.exec_command(f"echo 'ANTHROPIC_API_KEY={anthropic_key}' >> {CLAWDBOT_ENV_PATH}")
 
-    # Give OpenClaw time to initialize after API key config
-    logger.info("Waiting for OpenClaw to fully initialize...")
-    time.sleep(30)
-    
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
-    for attempt in range(max_retries):
-        try:
-            ssh.connect(
-                ip_address,
-                username='root',
-                key_filename=SSH_PRIVATE_KEY_PATH,
-                timeout=30
-            )
-            
-            # Try multiple methods to get the dashboard URL
-            commands = [
-                # Method 1: Check clawdbot.env for gateway token (primary method)
-                "grep 'CLAWDBOT_GATEWAY_TOKEN=' /opt/clawdbot.env 2>/dev/null | cut -d'=' -f2 || echo ''",
-
-                # Method 2: Run status script to get gateway info
-                "/opt/status-clawdbot.sh 2>&1 | grep -A1 'Gateway Token' | tail -1 || echo ''",
-
-                # Method 3: Check for gateway token in various locations
-                "cat /root/.openclaw/gateway_token 2>/dev/null || echo ''",
-
-                # Method 4: Check clawdbot service status
-                "systemctl is-active clawdbot 2>/dev/null || echo ''",
-
-                # Method 5: Check if clawdbot is running and on what port
-                "ss -tlnp | grep -E ':18789' || echo ''",
-            ]
-            
-            results = {}
-            for i, cmd in enumerate(commands):
-                stdin, stdout, stderr = ssh.exec_command(cmd)
-                output = stdout.read().decode().strip()
-                results[f"method_{i+1}"] = output
-                logger.info(f"Method {i+1} output: {output[:200]}")
-            
-            # Get gateway token from clawdbot.env
-            stdin, stdout, stderr = ssh.exec_command(
-                "grep 'CLAWDBOT_GATEWAY_TOKEN=' /opt/clawdbot.env 2>/dev/null | cut -d'=' -f2"
-            )
-            gateway_token = stdout.read().decode().strip()
-
-            # Check if clawdbot service is running
-            stdin, stdout, stderr = ssh.exec_command("systemctl is-active clawdbot 2>/dev/null")
-            service_status = stdout.read().decode().strip()
-
-            if gateway_token and service_status == "active":
-                # Use HTTPS on port 443 (Caddy reverse proxy handles this)
-                dashboard_url = f"https://{ip_address}?token={gateway_token}"
-                logger.info(f"Constructed dashboard URL: {dashboard_url}")
-                ssh.close()
-                return dashboard_url
-            
-            # If no token found yet, wait and retry
-            logger.info(f"Attempt {attempt + 1}/{max_retries}: OpenClaw not fully initialized yet")
-            ssh.close()
-            time.sleep(15)
-            
-        except Exception as e:
-            logger.error(f"SSH error on attempt {attempt + 1}: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(15)
-            else:
-                raise
-    
-    # Fallback: return basic URL without token
-    logger.warning("Could not retrieve gateway token, returning basic URL")
-    ssh.close()
-    return f"https://{ip_address}"
+    logger.info("Enabling all features for dashboard...")
+    for key, value in FEATURES_TO_ENABLE:
+        ssh.exec_command(f"sed -i '/{key}/d' {CLAWDBOT_ENV_PATH}")
+        ssh.exec_command(f"echo '{key}={value}' >> {CLAWDBOT_ENV_PATH}")
 
+    logger.info("All features enabled for dashboard")
 
-def update_deployment_status(deployment_id: str, **kwargs):
-    """Helper function to update deployment status in database"""
-    db = SessionLocal()
-    try:
-        deployment = db.query(DeploymentModel).filter(DeploymentModel.deployment_id == deployment_id).first()
-        if deployment:
-            for key, value in kwargs.items():
-                if hasattr(deployment, key):
-                    setattr(deployment, key, value)
-            deployment.updated_at = datetime.utcnow()
-            db.commit()
-    finally:
-        db.close()
+    logger.info("Enabling full host access for Clawdbot...")
+    for key, value in CLAWDBOT_CLI_SETTINGS:
+        ssh.exec_command(f"{CLAWDBOT_CLI_PATH} config set {key} {value}")
+        time.sleep(1)
+
+    stderr_output = stderr.read().decode().strip()
+    if stderr_output:
+        logger.error(f"Error adding API key: {stderr_output}")
+
+    # Verify the key was added
+    stdin, stdout, stderr = ssh.exec_command(f"grep '^ANTHROPIC_API_KEY=' {CLAWDBOT_ENV_PATH}")
+    verify_output = stdout.read().decode().strip()
+    if anthropic_key in verify_output:
+        logger.info("Anthropic API key configured successfully")
+    else:
+        logger.warning(f"API key verification failed, got: {verify_output[:50]}...")
+
+    # Restart clawdbot service to pick up the new key
+    logger.info("Restarting clawdbot service...")
+    stdin, stdout, stderr = ssh.exec_command("systemctl restart clawdbot")
+    time.sleep(5)
+
+    # Check service status
+    stdin, stdout, stderr = ssh.exec_command("systemctl is-active clawdbot")
+    service_status = stdout.read().decode().strip()
+    logger.info(f"Clawdbot service status: {service_status}")
+    return service_status == "active"
 
 
-async def provision_droplet_async(deployment_id: str, anthropic_key: str, region: str):
-    """Async function to provision droplet in background"""
+async def configure_api_key_via_ssh(session: AsyncSSHSession, anthropic_key: str) -> bool:
+    """Configure Anthropic API key on the droplet via SSH (once wait_for_ssh_ready has connected)"""
     try:
-        logger.info(f"Starting provisioning for deployment {deployment_id}")
+        # Configure as soon as the system has fully booted
+        await wait_for_boot_settled(session)
 
-        # Update status
-        update_deployment_status(deployment_id, status='creating_droplet')
+        logger.info(f"Connected to {session.host}, configuring Anthropic API key ({SSH_CONFIGURE_MODE} mode)...")
 
-        # Initialize DigitalOcean manager
-        manager = digitalocean.Manager(token=DIGITALOCEAN_TOKEN)
+        if SSH_CONFIGURE_MODE == "legacy":
+            return await session.run(apply_clawdbot_config_legacy, anthropic_key)
+        return await session.run(apply_clawdbot_config_atomic, anthropic_key)
+
+    except Exception as e:
+        logger.error(f"Error configuring API key via SSH: {str(e)}")
+        return False
 
-        # Get SSH key
-        ssh_key_id = get_or_create_ssh_key(manager)
 
-        # Create cloud-init script
-        user_data = create_cloud_init_script(anthropic_key)
+async def get_dashboard_url_via_ssh(session: AsyncSSHSession) -> str:
+    """Retrieve OpenClaw dashboard URL via SSH"""
+    ip_address = session.host
+
+    # Ready once the service is active, the gateway accepts TCP connections and the token exists
+    probe_command = (
+        "systemctl is-active --quiet clawdbot && "
+        f"timeout 2 bash -c '</dev/tcp/127.0.0.1/{OPENCLAW_GATEWAY_PORT}' && "
+        "grep 'CLAWDBOT_GATEWAY_TOKEN=' /opt/clawdbot.env 2>/dev/null | cut -d'=' -f2"
+    )
 
-        # Create droplet with Moltbot image
-        logger.info(f"Creating droplet for deployment {deployment_id}")
-        droplet = digitalocean.Droplet(
-            token=DIGITALOCEAN_TOKEN,
-            name=f"autoclawd-{deployment_id}",
-            region=region,
-            size_slug='s-2vcpu-4gb',  # Minimum recommended
-            image='moltbot',  # Marketplace image slug
-            ssh_keys=[ssh_key_id],
-            user_data=user_data,
-            tags=[f'deployment:{deployment_id}', 'autoclawd', 'platform-managed']
+    async def gateway_token_ready():
+        exit_status, output, _ = await session.exec(probe_command)
+        return output.strip() if exit_status == 0 else None
+
+    try:
+        gateway_token = await wait_until(
+            gateway_token_ready, PROBE_POLICIES["openclaw_ready"], f"OpenClaw on {ip_address}"
         )
+    except TimeoutError as e:
+        logger.warning(str(e))
+        await log_dashboard_diagnostics(session)
 
-        droplet.create()
-        logger.info(f"Droplet {droplet.id} created for deployment {deployment_id}")
+        # Fallback: return basic URL without token
+        logger.warning("Could not retrieve gateway token, returning basic URL")
+        return f"https://{ip_address}"
 
-        # Update deployment record
-        update_deployment_status(deployment_id, droplet_id=droplet.id, status='waiting_for_droplet')
+    # Use HTTPS on port 443 (Caddy reverse proxy handles this)
+    dashboard_url = f"https://{ip_address}?token={gateway_token}"
+    logger.info(f"Constructed dashboard URL: {dashboard_url}")
+    return dashboard_url
 
-        # Wait for droplet to be ready
-        await asyncio.to_thread(wait_for_droplet_ready, droplet)
 
-        ip_address = droplet.ip_address
-        update_deployment_status(deployment_id, ip_address=ip_address, status='configuring_openclaw')
+async def log_dashboard_diagnostics(session: AsyncSSHSession):
+    """Log everything we know about the gateway when the dashboard never came up"""
+    commands = [
+        # Method 1: Check clawdbot.env for gateway token (primary method)
+        "grep 'CLAWDBOT_GATEWAY_TOKEN=' /opt/clawdbot.env 2>/dev/null | cut -d'=' -f2 || echo ''",
 
-        logger.info(f"Droplet ready at {ip_address}, configuring API key...")
+        # Method 2: Run status script to get gateway info
+        "/opt/status-clawdbot.sh 2>&1 | grep -A1 'Gateway Token' | tail -1 || echo ''",
 
-        # Configure API key via SSH (more reliable than cloud-init)
-        api_key_configured = await asyncio.to_thread(configure_api_key_via_ssh, ip_address, anthropic_key)
-        if not api_key_configured:
-            logger.warning("API key configuration may have failed, continuing anyway...")
+        # Method 3: Check for gateway token in various locations
+        "cat /root/.openclaw/gateway_token 2>/dev/null || echo ''",
 
-        # Get dashboard URL via SSH
-        dashboard_url = await asyncio.to_thread(get_dashboard_url_via_ssh, ip_address)
+        # Method 4: Check clawdbot service status
+        "systemctl is-active clawdbot 2>/dev/null || echo ''",
 
-        # Update final status
-        update_deployment_status(deployment_id, dashboard_url=dashboard_url, status='ready')
+        # Method 5: Check if clawdbot is running and on what port
+        f"ss -tlnp | grep -E ':{OPENCLAW_GATEWAY_PORT}' || echo ''",
+    ]
 
-        logger.info(f"Deployment {deployment_id} completed successfully!")
-        logger.info(f"Dashboard URL: {dashboard_url}")
+    for i, cmd in enumerate(commands):
+        try:
+            _, output, _ = await session.exec(cmd)
+            logger.info(f"Method {i+1} output: {output.strip()[:200]}")
+        except Exception as e:
+            logger.info(f"Method {i+1} failed: {str(e)}")
+
+
+def get_do_client() -> DigitalOceanClient:
+    """Process-wide async DigitalOcean client"""
+    global _do_client
+    if _do_client is None:
+        _do_client = DigitalOceanClient(
+            DIGITALOCEAN_TOKEN,
+            base_url=DIGITALOCEAN_API_URL,
+            max_connections=DO_MAX_CONNECTIONS,
+            rate=DO_RATE_LIMIT_PER_MINUTE / 60,
+            burst=DO_RATE_LIMIT_BURST,
+            max_retries=DO_MAX_RETRIES,
+        )
+    return _do_client
 
-    except Exception as e:
-        logger.error(f"Error provisioning deployment {deployment_id}: {str(e)}")
-        update_deployment_status(deployment_id, status='failed', error_message=str(e))
 
+_do_client: Optional[DigitalOceanClient] = None
 
-@app.post("/provision", response_model=ProvisionResponse)
-async def provision_openclaw(request: ProvisionRequest, background_tasks: BackgroundTasks):
+catalog = Catalog(get_do_client, DROPLET_SIZE, DROPLET_IMAGE, CATALOG_TTL)
+
+
+async def create_moltbot_droplet(name: str, region: str, tags: list, user_data: Optional[str],
+                                 image=DROPLET_IMAGE) -> dict:
+    """Create a droplet from the Moltbot marketplace image (or a snapshot of one)"""
+    spec = dict(
+        name=name,
+        region=region,
+        size=DROPLET_SIZE,
+        image=image,
+        ssh_keys=[await get_or_create_ssh_key()],
+        tags=tags
+    )
+    if user_data:
+        spec["user_data"] = user_data
+    return await get_do_client().create_droplet(**spec)
+
+
+class DropletBatcher:
     """
-    Provision a new OpenClaw VPS for a user
+    Gathers droplet creates that share a spec into DigitalOcean multi-create calls.
+
+    The jobs of a batch order reach their droplet_create phase at about the same time.
+    Each asks for its droplet here; requests with the same region, tags and user data
+    that arrive within `window` seconds of the first go out as one POST /droplets with
+    up to MAX_NAMES names, and each caller gets back the droplet created under its name.
+    A multi-create gives every droplet the same tags, so tags that belong to one droplet
+    (its deployment:{id} tag) are attached to it right after the create.
     """
-    try:
-        # Generate unique deployment ID
-        deployment_id = generate_deployment_id()
 
-        # Create deployment record in database
-        db = SessionLocal()
+    MAX_NAMES = 10
+
+    class _Group:
+        def __init__(self, region: str, tags: list, user_data: Optional[str]):
+            self.region = region
+            self.tags = tags
+            self.user_data = user_data
+            self.requests = []
+            self.sent = False
+
+    def __init__(self, window: float):
+        self.window = window
+        self._groups = {}
+        self.calls = 0
+        self.droplets = 0
+
+    async def create(self, name: str, region: str, tags: list, user_data: Optional[str],
+                     droplet_tags: Optional[list] = None) -> dict:
+        key = (region, tuple(tags), user_data)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = self._Group(region, tags, user_data)
+            asyncio.get_running_loop().call_later(self.window, self._send, key, group)
+        future = asyncio.get_running_loop().create_future()
+        group.requests.append((name, droplet_tags or [], future))
+        if len(group.requests) == self.MAX_NAMES:
+            self._send(key, group)
+        return await future
+
+    def _send(self, key: tuple, group: "DropletBatcher._Group"):
+        if group.sent:
+            return
+        group.sent = True
+        if self._groups.get(key) is group:
+            del self._groups[key]
+        asyncio.create_task(self._create(group))
+
+    async def _create(self, group: "DropletBatcher._Group"):
+        names = [name for name, _, _ in group.requests]
         try:
-            is_free_deploy = 0
+            spec = dict(
+                region=group.region,
+                size=DROPLET_SIZE,
+                image=DROPLET_IMAGE,
+                ssh_keys=[await get_or_create_ssh_key()],
+                tags=group.tags
+            )
+            if group.user_data:
+                spec["user_data"] = group.user_data
+            self.calls += 1
+            droplets = {droplet["name"]: droplet for droplet in await get_do_client().create_droplets(names, **spec)}
+        except Exception as e:
+            for _, _, future in group.requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.droplets += len(droplets)
+        logger.info(f"Created {len(droplets)} droplets in one call ({group.region})")
+        await asyncio.gather(*(
+            self._resolve(name, droplets.get(name), droplet_tags, future)
+            for name, droplet_tags, future in group.requests
+        ))
+
+    async def _resolve(self, name: str, droplet: Optional[dict], droplet_tags: list, future: asyncio.Future):
+        if droplet is None:
+            if not future.done():
+                future.set_exception(RuntimeError(f"DigitalOcean did not return droplet {name}"))
+            return
+        for tag in droplet_tags:
+            try:
+                await get_do_client().tag_droplets(tag, [droplet["id"]])
+                droplet.setdefault("tags", []).append(tag)
+            except Exception as e:
+                # The batch tag and the droplet name still identify it for retries
+                logger.warning(f"Could not tag droplet {droplet['id']} with {tag}: {str(e)}")
+        if not future.done():
+            future.set_result(droplet)
 
-            # Check if user wants to use a free deploy
-            if request.use_free_deploy:
-                if claim_free_deploy(db):
-                    is_free_deploy = 1
-                    logger.info(f"Deployment {deployment_id} is using a free deploy slot")
-                else:
-                    raise HTTPException(status_code=400, detail="No free deploys available")
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(group.requests) for group in self._groups.values()),
+            "calls": self.calls,
+            "droplets": self.droplets,
+        }
 
-            deployment = DeploymentModel(
-                deployment_id=deployment_id,
-                status='pending',
-                anthropic_key_masked=request.anthropic_api_key[:10] + '...',
-                wallet_address=request.wallet_address,
-                payment_signature=request.payment_signature,
-                user_email=request.user_email,
-                region=request.region,
-                expires_at=datetime.utcnow() + timedelta(days=7),  # 7 days hosting
-                is_free_deploy=is_free_deploy,
-            )
-            db.add(deployment)
-            db.commit()
-        finally:
-            db.close()
 
-        # Start provisioning in background
-        background_tasks.add_task(
-            provision_droplet_async,
-            deployment_id,
-            request.anthropic_api_key,
-            request.region
-        )
+droplet_batcher = DropletBatcher(DROPLET_BATCH_WINDOW)
 
-        return ProvisionResponse(
-            deployment_id=deployment_id,
-            status='pending',
-            message='Provisioning started. Use /status endpoint to check progress.'
+
+async def claim_warm_droplet(db: AsyncSession, region: str, deployment_id: str) -> Optional[WarmDropletModel]:
+    """
+    Atomically claim a ready warm droplet in the region for a deployment.
+
+    The claim is a conditional UPDATE on status='ready', so two concurrent
+    provisions can never be handed the same droplet. It commits with the
+    caller's transaction.
+    """
+    candidates = (await db.execute(
+        select(WarmDropletModel.droplet_id).where(
+            WarmDropletModel.region == region,
+            WarmDropletModel.status == 'ready'
+        ).order_by(WarmDropletModel.ready_at).limit(5)
+    )).all()
+
+    for (droplet_id,) in candidates:
+        claimed = await db.execute(
+            update(WarmDropletModel).where(
+                WarmDropletModel.droplet_id == droplet_id,
+                WarmDropletModel.status == 'ready'
+            ).values(
+                status='claimed',
+                deployment_id=deployment_id,
+                claimed_at=datetime.utcnow(),
+            ).execution_options(synchronize_session=False)
         )
 
+        if claimed.rowcount:
+            warm = await db.get(WarmDropletModel, droplet_id)
+            logger.info(f"Deployment {deployment_id} claimed warm droplet {droplet_id} in {region}")
+            return warm
+
+    return None
+
+
+async def assign_warm_droplet(droplet_id: int, deployment_id: str):
+    """Tag and rename a claimed warm droplet so it looks like a cold-provisioned one"""
+    client = get_do_client()
+    try:
+        await client.tag_droplets(f"deployment:{deployment_id}", [droplet_id])
+        await client.droplet_action(droplet_id, "rename", name=f"autoclawd-{deployment_id}")
     except Exception as e:
-        logger.error(f"Error starting provisioning: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.warning(f"Could not tag/rename warm droplet {droplet_id}: {str(e)}")
 
 
-@app.get("/status/{deployment_id}", response_model=DeploymentStatus)
-async def get_deployment_status(deployment_id: str):
-    """
-    Get the status of a deployment
-    """
+async def prepare_warm_droplet(droplet_id: int) -> str:
+    """Wait until a new warm droplet is active and its first boot has settled"""
+    ip_address = await wait_for_droplet_ready(droplet_id)
+
+    async with open_ssh_session(ip_address) as session:
+        await wait_for_ssh_ready(session)
+        await wait_for_boot_settled(session)
+
+    return ip_address
+
+
+def record_warm_droplet(droplet_id: int, region: str):
     db = SessionLocal()
     try:
-        deployment = db.query(DeploymentModel).filter(DeploymentModel.deployment_id == deployment_id).first()
-        if not deployment:
-            raise HTTPException(status_code=404, detail="Deployment not found")
-
-        return DeploymentStatus(
-            deployment_id=deployment.deployment_id,
-            status=deployment.status,
-            droplet_id=deployment.droplet_id,
-            dashboard_url=deployment.dashboard_url,
-            ip_address=deployment.ip_address,
-            created_at=deployment.created_at.isoformat() if deployment.created_at else None,
-            updated_at=deployment.updated_at.isoformat() if deployment.updated_at else None,
-            error_message=deployment.error_message
-        )
+        db.add(WarmDropletModel(droplet_id=droplet_id, region=region, status='booting'))
+        db.commit()
     finally:
         db.close()
 
 
-@app.get("/deployments")
-async def list_deployments(wallet: Optional[str] = None):
-    """
-    List all deployments, optionally filtered by wallet address
-    """
+def mark_warm_droplet_ready(droplet_id: int, ip_address: str):
     db = SessionLocal()
     try:
-        if wallet:
-            deployments_list = db.query(DeploymentModel).filter(DeploymentModel.wallet_address == wallet).all()
-        else:
-            deployments_list = db.query(DeploymentModel).all()
-
-        result = []
-        for d in deployments_list:
-            result.append({
-                "deployment_id": d.deployment_id,
-                "status": d.status,
-                "wallet_address": d.wallet_address,
-                "droplet_id": d.droplet_id,
-                "ip_address": d.ip_address,
-                "dashboard_url": d.dashboard_url,
-                "created_at": d.created_at.isoformat() if d.created_at else None,
-                "updated_at": d.updated_at.isoformat() if d.updated_at else None,
-                "expires_at": d.expires_at.isoformat() if d.expires_at else None,
-                "error_message": d.error_message
-            })
-
-        return {
-            "total": len(result),
-            "deployments": result
-        }
+        db.query(WarmDropletModel).filter(
+            WarmDropletModel.droplet_id == droplet_id,
+            WarmDropletModel.status == 'booting'
+        ).update({
+            WarmDropletModel.status: 'ready',
+            WarmDropletModel.ip_address: ip_address,
+            WarmDropletModel.ready_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        db.commit()
     finally:
         db.close()
 
 
-@app.delete("/deployment/{deployment_id}")
-async def delete_deployment(deployment_id: str):
-    """
-    Delete a deployment and destroy the droplet
-    """
-    db = SessionLocal()
+async def create_warm_droplet(region: str) -> dict:
+    droplet = await create_moltbot_droplet(
+        f"autoclawd-warm-{generate_deployment_id()}",
+        region,
+        ['autoclawd', 'autoclawd-warm', 'platform-managed'],
+        create_cloud_init_script()
+    )
+    await asyncio.to_thread(record_warm_droplet, droplet["id"], region)
+    logger.info(f"Warm pool: created droplet {droplet['id']} in {region}")
+    return droplet
+
+
+async def boot_warm_droplet(region: str):
+    """Create one warm droplet and mark it ready once it has settled"""
+    # Shielded so a create that went out is always recorded; if the replenisher is stopped
+    # meanwhile, the droplet stays 'booting' until the next leader gives up on it as stuck
+    droplet = await asyncio.shield(create_warm_droplet(region))
+
     try:
-        deployment = db.query(DeploymentModel).filter(DeploymentModel.deployment_id == deployment_id).first()
-        if not deployment:
-            raise HTTPException(status_code=404, detail="Deployment not found")
+        ip_address = await prepare_warm_droplet(droplet["id"])
+    except asyncio.CancelledError:
+        # Lost leadership: the next leader plans the pool afresh, so don't leave this one behind
+        await asyncio.shield(evict_warm_droplet(droplet["id"]))
+        raise
+    except Exception as e:
+        logger.error(f"Warm pool: droplet {droplet['id']} failed to boot: {str(e)}")
+        await evict_warm_droplet(droplet["id"])
+        return
 
-        droplet_id = deployment.droplet_id
+    await asyncio.to_thread(mark_warm_droplet_ready, droplet["id"], ip_address)
+    logger.info(f"Warm pool: droplet {droplet['id']} ready in {region} at {ip_address}")
 
-        if droplet_id:
-            try:
-                manager = digitalocean.Manager(token=DIGITALOCEAN_TOKEN)
-                droplet = manager.get_droplet(droplet_id)
-                droplet.destroy()
-                logger.info(f"Destroyed droplet {droplet_id}")
-            except Exception as e:
-                logger.error(f"Error destroying droplet: {str(e)}")
 
-        # Remove from database
-        db.delete(deployment)
+def forget_warm_droplet(droplet_id: int) -> bool:
+    """Remove an unassigned warm droplet from the pool; False if it was claimed meanwhile"""
+    db = SessionLocal()
+    try:
+        removed = db.query(WarmDropletModel).filter(
+            WarmDropletModel.droplet_id == droplet_id,
+            WarmDropletModel.status.in_(['booting', 'ready'])
+        ).delete(synchronize_session=False)
         db.commit()
-
-        return {"message": f"Deployment {deployment_id} deleted"}
+        return bool(removed)
     finally:
         db.close()
 
 
-class RenewRequest(BaseModel):
-    deployment_id: str
-    payment_signature: str
-    wallet_address: str
-
+async def evict_warm_droplet(droplet_id: int):
+    """Destroy an unassigned warm droplet and forget it"""
+    if not await asyncio.to_thread(forget_warm_droplet, droplet_id):
+        return
 
-@app.post("/renew")
-async def renew_deployment(request: RenewRequest):
-    """
-    Renew a deployment for another 7 days (requires payment verification)
-    """
-    db = SessionLocal()
     try:
-        deployment = db.query(DeploymentModel).filter(
-            DeploymentModel.deployment_id == request.deployment_id
-        ).first()
+        await get_do_client().delete_droplet(droplet_id)
+        logger.info(f"Warm pool: destroyed droplet {droplet_id}")
+    except Exception as e:
+        logger.error(f"Warm pool: error destroying droplet {droplet_id}: {str(e)}")
 
-        if not deployment:
-            raise HTTPException(status_code=404, detail="Deployment not found")
 
-        # Verify wallet matches
-        if deployment.wallet_address != request.wallet_address:
-            raise HTTPException(status_code=403, detail="Wallet address does not match deployment owner")
+def plan_warm_pool(started_at: datetime) -> tuple:
+    """Work out which warm droplets to evict and how many to boot per region"""
+    now = datetime.utcnow()
+    idle_cutoff = now - timedelta(seconds=WARM_POOL_IDLE_TIMEOUT)
+    # Droplets stuck booting (e.g. the process that created them died) are given up on
+    stuck_cutoff = now - timedelta(seconds=PROBE_POLICIES["droplet_active"].timeout
+                                   + PROBE_POLICIES["ssh_ready"].timeout
+                                   + PROBE_POLICIES["boot_settled"].timeout)
 
-        # Extend expiry by 7 days from now (or from current expiry if still valid)
-        current_expiry = deployment.expires_at or datetime.utcnow()
-        if current_expiry < datetime.utcnow():
-            # Already expired, extend from now
-            new_expiry = datetime.utcnow() + timedelta(days=7)
-        else:
-            # Still valid, extend from current expiry
-            new_expiry = current_expiry + timedelta(days=7)
+    db = SessionLocal()
+    try:
+        pool = db.query(WarmDropletModel).filter(WarmDropletModel.status.in_(['booting', 'ready'])).all()
+
+        evict = []
+        to_boot = {}
+        total = 0
+        for region, size in WARM_POOL_SIZES.items():
+            last_provision = db.query(func.max(DeploymentModel.created_at)).filter(
+                DeploymentModel.region == region
+            ).scalar()
+            last_demand = max(filter(None, [last_provision, started_at]))
+            target = size if last_demand >= idle_cutoff else 0
+
+            region_pool = sorted((w for w in pool if w.region == region), key=lambda w: w.created_at)
+            keep = []
+            for warm in region_pool:
+                idle_since = warm.ready_at or warm.created_at
+                if warm.status == 'ready' and idle_since < idle_cutoff:
+                    evict.append(warm.droplet_id)
+                elif warm.status == 'booting' and warm.created_at < stuck_cutoff:
+                    evict.append(warm.droplet_id)
+                else:
+                    keep.append(warm)
 
-        deployment.expires_at = new_expiry
-        deployment.payment_signature = request.payment_signature  # Store latest payment
-        deployment.updated_at = datetime.utcnow()
+            # Shrink regions that no longer need as many droplets, oldest ready ones first
+            ready = [w for w in keep if w.status == 'ready']
+            while len(keep) > target and ready:
+                warm = ready.pop(0)
+                keep.remove(warm)
+                evict.append(warm.droplet_id)
 
-        # If status was 'expired', set it back to 'ready'
-        if deployment.status == 'expired':
-            deployment.status = 'ready'
+            total += len(keep)
+            to_boot[region] = max(0, target - len(keep))
 
-        db.commit()
+        # Droplets in regions that were removed from the config
+        evict.extend(w.droplet_id for w in pool if w.region not in WARM_POOL_SIZES)
 
-        logger.info(f"Deployment {request.deployment_id} renewed until {new_expiry}")
+        # Never exceed the global cap
+        budget = max(0, WARM_POOL_MAX_TOTAL - total)
+        for region in to_boot:
+            to_boot[region] = min(to_boot[region], budget)
+            budget -= to_boot[region]
 
-        return {
-            "message": "Deployment renewed successfully",
-            "deployment_id": request.deployment_id,
-            "expires_at": new_expiry.isoformat()
-        }
+        return evict, to_boot
     finally:
         db.close()
 
 
-async def check_expired_deployments():
-    """Background task to check and destroy expired deployments"""
-    while True:
-        try:
-            db = SessionLocal()
+async def replenish_warm_pool():
+    """Background task keeping the warm pool topped up and evicting idle droplets"""
+    started_at = datetime.utcnow()
+    booting = set()
+
+    try:
+        while True:
             try:
-                # Find all expired deployments that haven't been destroyed yet
-                expired = db.query(DeploymentModel).filter(
-                    DeploymentModel.expires_at < datetime.utcnow(),
-                    DeploymentModel.status.in_(['ready', 'expired'])
-                ).all()
-
-                for deployment in expired:
-                    logger.info(f"Deployment {deployment.deployment_id} has expired, destroying droplet...")
-
-                    # Destroy the droplet
-                    if deployment.droplet_id:
-                        try:
-                            manager = digitalocean.Manager(token=DIGITALOCEAN_TOKEN)
-                            droplet = manager.get_droplet(deployment.droplet_id)
-                            droplet.destroy()
-                            logger.info(f"Destroyed expired droplet {deployment.droplet_id}")
-                        except Exception as e:
-                            logger.error(f"Error destroying expired droplet: {str(e)}")
-
-                    # Update status to destroyed
-                    deployment.status = 'destroyed'
-                    deployment.updated_at = datetime.utcnow()
-                    db.commit()
+                evict, to_boot = await asyncio.to_thread(plan_warm_pool, started_at)
 
-            finally:
-                db.close()
+                for droplet_id in evict:
+                    await evict_warm_droplet(droplet_id)
 
-        except Exception as e:
-            logger.error(f"Error in expiry checker: {str(e)}")
+                for region, count in to_boot.items():
+                    for _ in range(count):
+                        task = asyncio.create_task(boot_warm_droplet(region))
+                        booting.add(task)
+                        task.add_done_callback(booting.discard)
 
-        # Check every hour
-        await asyncio.sleep(3600)
+            except Exception as e:
+                logger.error(f"Error in warm pool replenisher: {str(e)}")
 
+            await asyncio.sleep(WARM_POOL_REPLENISH_INTERVAL)
+    finally:
+        # Stopped on losing leadership: boots in progress stop with it
+        for task in booting:
+            task.cancel()
+        await asyncio.gather(*booting, return_exceptions=True)
 
-@app.on_event("startup")
-async def startup_event():
-    """Start background tasks on app startup"""
-    logger.info("Starting AutoClaw API...")
-    logger.info(f"Frontend URL: {FRONTEND_URL}")
-    asyncio.create_task(check_expired_deployments())
-    logger.info("Started expired deployment checker background task")
 
+status_cache = TTLCache(STATUS_CACHE_SIZE, STATUS_CACHE_TTL)
+wallet_cache = TTLCache(WALLET_CACHE_SIZE, WALLET_CACHE_TTL)
+free_deploys_cache = TTLCache(1, FREE_DEPLOYS_CACHE_TTL)
 
-@app.get("/")
-async def root():
-    """Health check endpoint"""
-    logger.info("Health check endpoint called")
+
+def deployment_status_payload(deployment: DeploymentModel) -> dict:
+    """Status snapshot returned by /status and pushed to status streams"""
     return {
-        "service": "AutoClaw - OpenClaw Provisioning Platform",
-        "status": "running",
-        "version": "1.0.0"
+        "deployment_id": deployment.deployment_id,
+        "status": deployment.status,
+        "droplet_id": deployment.droplet_id,
+        "dashboard_url": deployment.dashboard_url,
+        "ip_address": deployment.ip_address,
+        "created_at": deployment.created_at.isoformat() if deployment.created_at else None,
+        "updated_at": deployment.updated_at.isoformat() if deployment.updated_at else None,
+        "error_message": deployment.error_message,
+        "phase_timings": json.loads(deployment.phase_timings) if deployment.phase_timings else None,
+        "batch_id": deployment.batch_id
     }
 
 
-@app.get("/free-deploys")
-async def get_free_deploys():
-    """
-    Get the status of free deploy promotion
-    """
-    db = SessionLocal()
-    try:
-        config = db.query(FreeDeployConfig).first()
-        if not config:
-            return {
-                "is_active": False,
-                "total": 0,
-                "claimed": 0,
-                "remaining": 0
-            }
+def deployment_changed(deployment: DeploymentModel) -> dict:
+    """Refresh the caches after a committed write and return the new status snapshot"""
+    snapshot = deployment_status_payload(deployment)
+    status_cache.set(deployment.deployment_id, snapshot)
+    wallet_cache.invalidate(deployment.wallet_address)
+    return snapshot
 
-        remaining = max(0, config.total_free_deploys - config.claimed_count)
-        is_active = config.is_active == 1 and remaining > 0
 
-        return {
-            "is_active": is_active,
-            "total": config.total_free_deploys,
-            "claimed": config.claimed_count,
-            "remaining": remaining
-        }
-    finally:
-        db.close()
+def deployment_removed(deployment_id: str, wallet_address: Optional[str]):
+    status_cache.invalidate(deployment_id)
+    wallet_cache.invalidate(wallet_address)
 
 
-def claim_free_deploy(db) -> bool:
-    """
-    Try to claim a free deploy. Returns True if successful.
+async def fetch_deployment_status(db: AsyncSession, deployment_id: str) -> Optional[dict]:
+    deployment = await db.get(DeploymentModel, deployment_id)
+    if not deployment:
+        return None
+    snapshot = deployment_status_payload(deployment)
+    status_cache.set(deployment_id, snapshot)
+    return snapshot
+
+
+async def load_deployment_status(deployment_id: str) -> Optional[dict]:
+    """Fresh status snapshot in a short-lived session (for long-running streams)"""
+    async with AsyncSessionLocal() as db:
+        return await fetch_deployment_status(db, deployment_id)
+
+
+async def fetch_batch_statuses(db: AsyncSession, batch_id: str) -> dict:
+    """Status snapshots of a batch's deployments, {deployment_id: snapshot}"""
+    deployments = (await db.execute(
+        select(DeploymentModel)
+        .where(DeploymentModel.batch_id == batch_id)
+        .order_by(DeploymentModel.created_at, DeploymentModel.deployment_id)
+    )).scalars().all()
+    return {deployment.deployment_id: deployment_status_payload(deployment) for deployment in deployments}
+
+
+async def load_batch_statuses(batch_id: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        return await fetch_batch_statuses(db, batch_id)
+
+
+def batch_progress(batch_id: str, snapshots: dict) -> dict:
+    """Aggregate progress of a batch from its deployments' snapshots"""
+    counts = {}
+    for snapshot in snapshots.values():
+        counts[snapshot["status"]] = counts.get(snapshot["status"], 0) + 1
+    finished = sum(count for status, count in counts.items() if status in TERMINAL_STATUSES)
+    return {
+        "batch_id": batch_id,
+        "total": len(snapshots),
+        "counts": counts,
+        "ready": counts.get("ready", 0),
+        "failed": counts.get("failed", 0),
+        "finished": finished,
+        "done": finished == len(snapshots),
+    }
+
+
+def save_deployment_statuses(updates: dict) -> list:
+    """
+    Apply pending status updates, {deployment_id: fields}, in one transaction.
+
+    Updates with the same set of fields share one executemany UPDATE by primary key;
+    the changed rows are then read back in one SELECT. Returns their new snapshots,
+    built from that SELECT (the session keeps the rows loaded across the commit).
+    """
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        groups = {}
+        for deployment_id, fields in updates.items():
+            groups.setdefault(tuple(sorted(fields)), []).append(dict(fields, _deployment_id=deployment_id))
+
+        table = DeploymentModel.__table__
+        for keys, rows in groups.items():
+            db.execute(
+                table.update()
+                .where(table.c.deployment_id == bindparam("_deployment_id"))
+                .values({key: bindparam(key) for key in keys}),
+                rows
+            )
+
+        deployments = db.query(DeploymentModel).filter(DeploymentModel.deployment_id.in_(list(updates))).all()
+        db.commit()
+        return [deployment_changed(deployment) for deployment in deployments]
+    finally:
+        db.close()
+
+
+def batch_stream_key(batch_id: str) -> str:
+    """Broker key the status events of every deployment in a batch are also published under"""
+    return f"batch:{batch_id}"
+
+
+def publish_status(snapshot: Optional[dict]):
+    if snapshot:
+        status_broker.publish(snapshot["deployment_id"], snapshot)
+        if snapshot.get("batch_id"):
+            status_broker.publish(batch_stream_key(snapshot["batch_id"]), snapshot)
+
+
+class StatusWriter:
+    """
+    Single writer for deployment status updates.
+
+    Updates are merged per deployment into a pending set, and every `interval` the
+    whole set is written in one transaction by save_deployment_statuses(), so many
+    concurrent provisions make a handful of write transactions instead of one per
+    phase transition. Terminal statuses wait for (and trigger) the flush that
+    persists them; updates that fail to write are retried on the next tick.
+    """
+
+    COLUMNS = frozenset(DeploymentModel.__table__.columns.keys())
+    RETRY_DELAY = 1.0
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending = {}
+        self._waiters = {}
+        self._in_flight = {}
+        self._flushed: Optional[asyncio.Future] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def _ensure_running(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, deployment_id: str, fields: dict, wait: bool = False) -> Optional[dict]:
+        """Queue an update; with `wait`, flush now and return the persisted snapshot"""
+        fields = {key: value for key, value in fields.items() if key in self.COLUMNS}
+        fields["updated_at"] = datetime.utcnow()
+        self._pending.setdefault(deployment_id, {}).update(fields)
+        self.updates += 1
+        self._ensure_running()
+        if not wait:
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(deployment_id, []).append(future)
+        self._wake.set()
+        return await future
+
+    async def take(self, deployment_id: str) -> dict:
+        """
+        Remove and return a deployment's pending fields, so the caller can write them
+        in its own transaction. Waits out a flush already writing that deployment, so
+        the caller's write always lands after it.
+        """
+        while deployment_id in self._in_flight:
+            await asyncio.shield(self._flushed)
+        return self._pending.pop(deployment_id, {})
+
+    async def flush(self):
+        """Write everything queued so far"""
+        while self._pending or self._in_flight:
+            if not self._pending:
+                await asyncio.shield(self._flushed)
+                continue
+            self._ensure_running()
+            future = asyncio.get_running_loop().create_future()
+            deployment_id = next(iter(self._pending))
+            self._waiters.setdefault(deployment_id, []).append(future)
+            self._wake.set()
+            await future
+
+    async def _run(self):
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not await self._flush_pending():
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def _flush_pending(self) -> bool:
+        if not self._pending:
+            return True
+        batch, self._pending = self._pending, {}
+        waiters = {deployment_id: self._waiters.pop(deployment_id, []) for deployment_id in batch}
+        self._in_flight = batch
+        self._flushed = asyncio.get_running_loop().create_future()
+        try:
+            snapshots = await asyncio.to_thread(save_deployment_statuses, batch)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} deployment status updates: {str(e)}")
+            # Newer updates queued meanwhile win over the failed ones
+            for deployment_id, fields in batch.items():
+                self._pending[deployment_id] = {**fields, **self._pending.get(deployment_id, {})}
+            for futures in waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return False
+        finally:
+            self._in_flight = {}
+            self._flushed.set_result(None)
+
+        self.flushes += 1
+        self.rows_written += len(batch)
+        by_id = {snapshot["deployment_id"]: snapshot for snapshot in snapshots}
+        for snapshot in snapshots:
+            publish_status(snapshot)
+        for deployment_id, futures in waiters.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(by_id.get(deployment_id))
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "updates": self.updates,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
+
+
+status_writer = StatusWriter(STATUS_WRITE_INTERVAL)
+
+
+async def update_deployment_status(deployment_id: str, **kwargs):
+    """
+    Queue a deployment status update for the status writer.
+
+    Returns once queued, except for terminal statuses, which return only after the
+    update is in the database.
+    """
+    await status_writer.write(deployment_id, kwargs, wait=kwargs.get("status") in TERMINAL_STATUSES)
+
+
+# Statuses after which a deployment no longer changes on its own
+TERMINAL_STATUSES = {"ready", "failed", "destroyed", "deleted", "hibernated"}
+
+status_broker = StatusBroker()
+
+
+# Checkpoints a provisioning job passes through, in order
+PROVISION_PHASES = ["pending", "warm_claimed", "droplet_created", "droplet_active", "configured", "ready"]
+
+
+def phase_reached(current: str, phase: str) -> bool:
+    return PROVISION_PHASES.index(current) >= PROVISION_PHASES.index(phase)
+
+
+# Statuses of deployments that are still being provisioned or restored, in the order the
+# ix_deployments_in_flight predicate lists them
+IN_FLIGHT_STATUSES = ["pending", "creating_droplet", "waiting_for_droplet", "configuring_openclaw", "restoring"]
+
+metrics_registry = Registry()
+PROVISION_PHASE_SECONDS = metrics_registry.register(Histogram(
+    "autoclaw_provision_phase_seconds",
+    "Duration of each provisioning phase",
+    ["phase", "region", "path"]
+))
+PROVISION_PHASE_FAILURES = metrics_registry.register(Counter(
+    "autoclaw_provision_phase_failures_total",
+    "Provisioning phases that failed",
+    ["phase", "region", "path"]
+))
+DEPLOYMENTS_IN_FLIGHT = metrics_registry.register(Gauge(
+    "autoclaw_deployments_in_flight",
+    "Deployments being provisioned or restored, by status",
+    ["status"]
+))
+
+
+class PhaseTimer:
+    """
+    Times the phases of one provisioning run.
+
+    Each phase's duration goes into the phase histogram (by region and path: cold,
+    warm or restore) and into the deployment's phase_timings, queued on the status
+    writer so it lands with the next checkpoint. Failed phases are counted.
+    """
+
+    def __init__(self, deployment_id: str, region: str, path: str, timings: Optional[dict] = None):
+        self.deployment_id = deployment_id
+        self.region = region
+        self.path = path
+        self.timings = dict(timings or {})
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.failed(name)
+            raise
+        duration = time.monotonic() - started
+        self.timings[name] = round(duration, 2)
+        PROVISION_PHASE_SECONDS.observe(duration, phase=name, region=self.region, path=self.path)
+        await update_deployment_status(self.deployment_id, phase_timings=json.dumps(self.timings))
+
+    def failed(self, name: str):
+        PROVISION_PHASE_FAILURES.inc(phase=name, region=self.region, path=self.path)
+
+
+def save_checkpoint(job_id: str, deployment_id: str, phase: str, **fields) -> Optional[dict]:
+    """Record a completed phase on the job and its deployment in one transaction"""
+    db = SessionLocal()
+    try:
+        db.query(ProvisionJobModel).filter(ProvisionJobModel.job_id == job_id).update({
+            ProvisionJobModel.phase: phase,
+            ProvisionJobModel.updated_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        deployment = db.query(DeploymentModel).filter(DeploymentModel.deployment_id == deployment_id).first()
+        if deployment:
+            for key, value in fields.items():
+                setattr(deployment, key, value)
+            deployment.updated_at = datetime.utcnow()
+        db.commit()
+        return deployment_changed(deployment) if deployment else None
+    finally:
+        db.close()
+
+
+async def checkpoint(job_id: str, deployment_id: str, phase: str, **fields):
+    # Status updates still queued for the deployment go out in the checkpoint's transaction
+    fields = {**await status_writer.take(deployment_id), **fields}
+    publish_status(await asyncio.to_thread(save_checkpoint, job_id, deployment_id, phase, **fields))
+
+
+def load_deployment(deployment_id: str) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        deployment = db.query(DeploymentModel).filter(DeploymentModel.deployment_id == deployment_id).first()
+        if not deployment:
+            return None
+        return {
+            "droplet_id": deployment.droplet_id,
+            "ip_address": deployment.ip_address,
+            "dashboard_url": deployment.dashboard_url,
+            "snapshot_id": deployment.snapshot_id,
+            "phase_timings": json.loads(deployment.phase_timings) if deployment.phase_timings else {},
+            "status": deployment.status,
+            "batch_id": deployment.batch_id,
+        }
+    finally:
+        db.close()
+
+
+def load_bootstrap_state(job_id: str) -> dict:
+    db = SessionLocal()
+    try:
+        job = db.query(
+            ProvisionJobModel.bootstrap_fetched_at, ProvisionJobModel.bootstrap_report
+        ).filter(ProvisionJobModel.job_id == job_id).first()
+        if not job:
+            return {"fetched": False, "report": None}
+        return {
+            "fetched": job.bootstrap_fetched_at is not None,
+            "report": json.loads(job.bootstrap_report) if job.bootstrap_report else None,
+        }
+    finally:
+        db.close()
+
+
+async def wait_for_boot_configured(job_id: str, expected: bool) -> Optional[dict]:
+    """
+    Wait for the first-boot report of a droplet configuring itself and return it.
+
+    Only waits if the droplet was created with the bootstrap script (`expected`) or has
+    already fetched its key. Returns None when there is nothing to wait for or no
+    report arrived in time, so the caller configures over SSH instead.
+    """
+    state = await asyncio.to_thread(load_bootstrap_state, job_id)
+    if state["report"] or not (expected or state["fetched"]):
+        return state["report"]
+
+    async def reported():
+        return (await asyncio.to_thread(load_bootstrap_state, job_id))["report"]
+
+    try:
+        return await wait_until(reported, PROBE_POLICIES["boot_configured"], f"First-boot configuration of job {job_id}")
+    except TimeoutError as e:
+        logger.warning(f"{e}; configuring over SSH")
+        return None
+
+
+def boot_configuration_succeeded(report: Optional[dict]) -> bool:
+    return bool(report) and report.get("env_swap") == 0 and report.get("service") == "active"
+
+
+async def find_droplet_for_deployment(deployment_id: str, batch_id: Optional[str] = None) -> Optional[dict]:
+    """Droplet already created for a deployment by an earlier attempt, if any"""
+    if batch_id:
+        # Droplets of a multi-create share the batch tag and are told apart by name
+        droplets = await get_do_client().list_droplets(tag_name=f"batch:{batch_id}")
+        return next((droplet for droplet in droplets if droplet["name"] == f"autoclawd-{deployment_id}"), None)
+    droplets = await get_do_client().list_droplets(tag_name=f"deployment:{deployment_id}")
+    return droplets[0] if droplets else None
+
+
+async def provision_droplet_async(job_id: str, deployment_id: str, anthropic_key: str, region: str,
+                                  phase: str = "pending") -> bool:
+    """
+    Provision a droplet end to end without blocking the event loop.
+
+    Resumes after the last checkpointed phase, so a job picked up again after a
+    worker restart reuses the droplet it already created.
+    """
+    if phase == "ready":
+        return True
+
+    try:
+        logger.info(f"Starting provisioning for deployment {deployment_id} (from phase {phase})")
+        deployment = await asyncio.to_thread(load_deployment, deployment_id)
+        if deployment is None:
+            # Deleted while the job was queued; there is nothing left to provision for
+            logger.warning(f"Deployment {deployment_id} no longer exists, dropping job {job_id}")
+            return False
+        if deployment.get("snapshot_id"):
+            return await restore_deployment_async(job_id, deployment_id, deployment, region, phase)
+
+        droplet_id = deployment.get("droplet_id")
+        ip_address = deployment.get("ip_address")
+        timer = PhaseTimer(deployment_id, region, "warm" if phase == "warm_claimed" else "cold",
+                           deployment.get("phase_timings"))
+        boot_configure = BOOT_CONFIGURE_MODE == "cloud-init"
+        created_here = False
+        dashboard_url = None
+
+        if phase == "pending":
+            batch_id = deployment.get("batch_id")
+            # A first attempt waits for this write, so only a deployment already marked
+            # creating_droplet can have a droplet from an earlier attempt to look for
+            first_attempt = deployment.get("status") == "pending"
+            await status_writer.write(deployment_id, {"status": 'creating_droplet'}, wait=first_attempt)
+
+            async with timer.phase("droplet_create"):
+                # An earlier attempt may have created the droplet without getting to checkpoint it
+                droplet = None if first_attempt else await find_droplet_for_deployment(deployment_id, batch_id)
+                if droplet:
+                    logger.info(f"Reusing droplet {droplet['id']} for deployment {deployment_id}")
+                elif batch_id and not boot_configure:
+                    logger.info(f"Creating droplet for deployment {deployment_id} (batch {batch_id})")
+                    droplet = await droplet_batcher.create(
+                        f"autoclawd-{deployment_id}",
+                        region,
+                        [f'batch:{batch_id}', 'autoclawd', 'platform-managed'],
+                        create_cloud_init_script(None),
+                        droplet_tags=[f'deployment:{deployment_id}']
+                    )
+                    logger.info(f"Droplet {droplet['id']} created for deployment {deployment_id}")
+                else:
+                    # Create droplet with Moltbot image. Boot-configured droplets carry per-job user
+                    # data, so batch jobs can't share a multi-create and skip the batch window
+                    logger.info(f"Creating droplet for deployment {deployment_id}")
+                    tags = [f'deployment:{deployment_id}', 'autoclawd', 'platform-managed']
+                    if batch_id:
+                        tags.append(f'batch:{batch_id}')
+                    droplet = await create_moltbot_droplet(
+                        f"autoclawd-{deployment_id}",
+                        region,
+                        tags,
+                        create_cloud_init_script(job_id if boot_configure else None)
+                    )
+                    logger.info(f"Droplet {droplet['id']} created for deployment {deployment_id}")
+
+            droplet_id = droplet["id"]
+            created_here = True
+            phase = "droplet_created"
+            await checkpoint(job_id, deployment_id, phase, droplet_id=droplet_id, status='waiting_for_droplet')
+
+        if phase == "warm_claimed":
+            # Droplet came from the warm pool: already booted, only the key is missing
+            logger.info(f"Using warm droplet {droplet_id} for deployment {deployment_id}")
+            async with timer.phase("warm_assign"):
+                await assign_warm_droplet(droplet_id, deployment_id)
+            phase = "droplet_active"
+            await checkpoint(job_id, deployment_id, phase, status='configuring_openclaw')
+
+        if not phase_reached(phase, "droplet_active"):
+            # Wait for droplet to be ready
+            async with timer.phase("droplet_active"):
+                ip_address = await wait_for_droplet_ready(droplet_id)
+            phase = "droplet_active"
+            await checkpoint(job_id, deployment_id, phase, ip_address=ip_address, status='configuring_openclaw')
+
+        if boot_configure and not phase_reached(phase, "configured"):
+            # A droplet created with the bootstrap script configures itself on first boot
+            async with timer.phase("boot_configure"):
+                report = await wait_for_boot_configured(job_id, expected=created_here)
+            if boot_configuration_succeeded(report):
+                logger.info(f"Droplet {droplet_id} configured itself on first boot")
+                phase = "configured"
+                await checkpoint(job_id, deployment_id, phase)
+                if report.get("gateway_token"):
+                    dashboard_url = f"https://{ip_address}?token={report['gateway_token']}"
+            elif report:
+                timer.failed("boot_configure")
+                logger.warning(f"First-boot configuration of droplet {droplet_id} failed: {report}")
+
+        if dashboard_url is None:
+            logger.info(f"Droplet ready at {ip_address}, configuring API key...")
+
+            # One SSH connection is shared by every SSH phase of this deployment
+            ssh_session = open_ssh_session(ip_address)
+            try:
+                async with timer.phase("ssh_ready"):
+                    await wait_for_ssh_ready(ssh_session)
+
+                if not phase_reached(phase, "configured"):
+                    # Configure API key via SSH
+                    async with timer.phase("configure"):
+                        api_key_configured = await configure_api_key_via_ssh(ssh_session, anthropic_key)
+                    if not api_key_configured:
+                        timer.failed("configure")
+                        logger.warning("API key configuration may have failed, continuing anyway...")
+                    phase = "configured"
+                    await checkpoint(job_id, deployment_id, phase)
+
+                # Get dashboard URL via SSH
+                async with timer.phase("dashboard_token"):
+                    dashboard_url = await get_dashboard_url_via_ssh(ssh_session)
+            finally:
+                await ssh_session.close()
+                logger.info(f"SSH session stats for deployment {deployment_id}: {ssh_session.stats()}")
+
+        # Update final status
+        await checkpoint(job_id, deployment_id, "ready", dashboard_url=dashboard_url, status='ready')
+
+        logger.info(f"Deployment {deployment_id} completed successfully!")
+        logger.info(f"Dashboard URL: {dashboard_url}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error provisioning deployment {deployment_id}: {str(e)}")
+        await update_deployment_status(deployment_id, status='failed', error_message=str(e))
+        return False
+
+
+def rehost_dashboard_url(dashboard_url: Optional[str], ip_address: str) -> str:
+    """Point a dashboard URL at a new droplet IP, keeping its scheme, port, path and token"""
+    if not dashboard_url:
+        return f"https://{ip_address}"
+    parts = urlsplit(dashboard_url)
+    netloc = f"{ip_address}:{parts.port}" if parts.port else ip_address
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+async def restore_deployment_async(job_id: str, deployment_id: str, deployment: dict, region: str,
+                                   phase: str = "pending") -> bool:
+    """
+    Recreate a hibernated deployment from its snapshot.
+
+    The snapshot's disk already holds the configured API key and gateway token, so the
+    SSH configuration and dashboard-token phases are skipped; only the IP changes.
+    """
+    snapshot_id = deployment["snapshot_id"]
+    droplet_id = deployment.get("droplet_id")
+    ip_address = deployment.get("ip_address")
+    timer = PhaseTimer(deployment_id, region, "restore", deployment.get("phase_timings") if phase != "pending" else None)
+
+    try:
+        logger.info(f"Restoring deployment {deployment_id} from snapshot {snapshot_id} (from phase {phase})")
+
+        if phase == "pending":
+            async with timer.phase("droplet_create"):
+                droplet = await find_droplet_for_deployment(deployment_id)
+                if not droplet:
+                    droplet = await create_moltbot_droplet(
+                        f"autoclawd-{deployment_id}",
+                        region,
+                        [f'deployment:{deployment_id}', 'autoclawd', 'platform-managed'],
+                        None,
+                        image=int(snapshot_id)
+                    )
+            droplet_id = droplet["id"]
+            phase = "droplet_created"
+            await checkpoint(job_id, deployment_id, phase, droplet_id=droplet_id)
+
+        if not phase_reached(phase, "droplet_active"):
+            async with timer.phase("droplet_active"):
+                ip_address = await wait_for_droplet_ready(droplet_id)
+            phase = "droplet_active"
+            await checkpoint(job_id, deployment_id, phase, ip_address=ip_address)
+
+        # OpenClaw comes back up on boot from the restored disk; wait for its dashboard port
+        dashboard_url = rehost_dashboard_url(deployment.get("dashboard_url"), ip_address)
+        dashboard_port = urlsplit(dashboard_url).port or 443
+        try:
+            async with timer.phase("dashboard_ready"):
+                await wait_until(
+                    lambda: tcp_port_open(ip_address, dashboard_port),
+                    PROBE_POLICIES["openclaw_ready"],
+                    f"Dashboard on restored droplet {droplet_id}"
+                )
+        except TimeoutError as e:
+            logger.warning(f"{e}; marking deployment ready anyway")
+
+        await delete_snapshot_quietly(snapshot_id)
+        await checkpoint(
+            job_id, deployment_id, "ready",
+            status='ready', dashboard_url=dashboard_url, snapshot_id=None, hibernated_at=None, error_message=None
+        )
+        logger.info(f"Deployment {deployment_id} restored at {ip_address}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error restoring deployment {deployment_id}: {str(e)}")
+        # Keep the snapshot so the restore can be retried
+        await update_deployment_status(deployment_id, status='hibernated', error_message=f"Restore failed: {e}")
+        return False
+
+
+class ProvisionScheduler:
+    """
+    Runs provisioning coroutines as event-loop tasks, at most `limit` at a time.
+
+    Submissions beyond the limit wait on a semaphore instead of holding a thread,
+    so hundreds of deployments can be in flight on one worker.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._tasks = set()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    def submit(self, coro_fn, *args) -> asyncio.Task:
+        task = asyncio.create_task(self._run(coro_fn, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, coro_fn, *args):
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            await coro_fn(*args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+        }
+
+
+provision_scheduler = ProvisionScheduler(PROVISION_CONCURRENCY)
+
+
+def encrypt_secret(value: str) -> str:
+    return Fernet(JOB_ENCRYPTION_KEY.encode()).encrypt(value.encode()).decode()
+
+
+def decrypt_secret(token: str) -> str:
+    return Fernet(JOB_ENCRYPTION_KEY.encode()).decrypt(token.encode()).decode()
+
+
+def new_provision_job(deployment_id: str, region: str, anthropic_key: Optional[str],
+                      phase: str = "pending") -> ProvisionJobModel:
+    """Job row for a deployment; add it in the same transaction as the deployment (restores carry no key)"""
+    return ProvisionJobModel(
+        job_id=generate_deployment_id(),
+        deployment_id=deployment_id,
+        status='queued',
+        phase=phase,
+        region=region,
+        encrypted_key=encrypt_secret(anthropic_key) if anthropic_key else None,
+    )
+
+
+def claim_next_job(worker_id: str) -> Optional[dict]:
+    """
+    Lease the oldest runnable job: a queued one, or a running one whose worker stopped renewing.
+
+    Candidates are read with FOR UPDATE SKIP LOCKED on Postgres, and the claim itself
+    is a conditional UPDATE, so two workers can never lease the same job.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        runnable = or_(
+            ProvisionJobModel.status == 'queued',
+            and_(ProvisionJobModel.status == 'running', ProvisionJobModel.lease_expires_at < now)
+        )
+        candidates = db.query(ProvisionJobModel.job_id).filter(runnable).order_by(
+            ProvisionJobModel.created_at
+        ).limit(10).with_for_update(skip_locked=True).all()
+
+        for (job_id,) in candidates:
+            claimed = db.query(ProvisionJobModel).filter(ProvisionJobModel.job_id == job_id, runnable).update({
+                ProvisionJobModel.status: 'running',
+                ProvisionJobModel.lease_owner: worker_id,
+                ProvisionJobModel.lease_expires_at: now + timedelta(seconds=JOB_LEASE_SECONDS),
+                ProvisionJobModel.attempts: ProvisionJobModel.attempts + 1,
+            }, synchronize_session=False)
+            db.commit()
+
+            if claimed:
+                job = db.query(ProvisionJobModel).filter(ProvisionJobModel.job_id == job_id).first()
+                return {
+                    "job_id": job.job_id,
+                    "deployment_id": job.deployment_id,
+                    "phase": job.phase,
+                    "region": job.region,
+                    "encrypted_key": job.encrypted_key,
+                    "attempts": job.attempts,
+                }
+
+        db.commit()
+        return None
+    finally:
+        db.close()
+
+
+def renew_job_lease(job_id: str, worker_id: str) -> bool:
+    """Extend our lease; False means another worker has taken the job over"""
+    db = SessionLocal()
+    try:
+        renewed = db.query(ProvisionJobModel).filter(
+            ProvisionJobModel.job_id == job_id,
+            ProvisionJobModel.lease_owner == worker_id,
+            ProvisionJobModel.status == 'running'
+        ).update({
+            ProvisionJobModel.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS),
+        }, synchronize_session=False)
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+
+def finish_job(job_id: str, worker_id: str, status: str, error: Optional[str] = None):
+    """End a job: 'done' and 'failed' are final, 'queued' hands it back for another worker"""
+    db = SessionLocal()
+    try:
+        values = {
+            ProvisionJobModel.status: status,
+            ProvisionJobModel.lease_owner: None,
+            ProvisionJobModel.lease_expires_at: None,
+            ProvisionJobModel.last_error: error,
+        }
+        if status in ('done', 'failed'):
+            values[ProvisionJobModel.encrypted_key] = None
+        db.query(ProvisionJobModel).filter(
+            ProvisionJobModel.job_id == job_id,
+            ProvisionJobModel.lease_owner == worker_id
+        ).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def count_jobs_by_status() -> dict:
+    db = SessionLocal()
+    try:
+        rows = db.query(ProvisionJobModel.status, func.count()).group_by(ProvisionJobModel.status).all()
+        return {status: count for status, count in rows}
+    finally:
+        db.close()
+
+
+class ProvisionWorker:
+    """Claims provisioning jobs from the database and runs them on the provision scheduler"""
+
+    def __init__(self, scheduler: ProvisionScheduler):
+        self.scheduler = scheduler
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """Look for new jobs now instead of at the next poll"""
+        self._wake.set()
+
+    async def run(self):
+        logger.info(f"Provisioning worker {self.worker_id} started")
+        while True:
+            try:
+                stats = self.scheduler.stats()
+                job = None
+                if stats["queued"] + stats["running"] < self.scheduler.limit:
+                    job = await asyncio.to_thread(claim_next_job, self.worker_id)
+
+                if job:
+                    self.scheduler.submit(self.run_job, job)
+                    continue
+            except Exception as e:
+                logger.error(f"Error claiming provisioning jobs: {str(e)}")
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_job(self, job: dict):
+        job_id = job["job_id"]
+
+        if job["attempts"] > JOB_MAX_ATTEMPTS:
+            error = f"Provisioning abandoned after {JOB_MAX_ATTEMPTS} attempts"
+            await update_deployment_status(job["deployment_id"], status='failed', error_message=error)
+            await asyncio.to_thread(finish_job, job_id, self.worker_id, 'failed', error)
+            return
+
+        task = asyncio.create_task(provision_droplet_async(
+            job_id,
+            job["deployment_id"],
+            decrypt_secret(job["encrypted_key"]) if job["encrypted_key"] else None,
+            job["region"],
+            job["phase"]
+        ))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, task))
+
+        try:
+            succeeded = await task
+            await asyncio.to_thread(finish_job, job_id, self.worker_id, 'done' if succeeded else 'failed')
+        except asyncio.CancelledError:
+            # Lost the lease or shutting down: leave the job for the next worker to resume
+            await asyncio.shield(asyncio.to_thread(finish_job, job_id, self.worker_id, 'queued'))
+            # Deleting the deployment also cancels its job; destroy a droplet it got to create
+            await asyncio.shield(self._reap_if_deleted(job["deployment_id"]))
+            raise
+        finally:
+            heartbeat.cancel()
+
+    async def _reap_if_deleted(self, deployment_id: str):
+        try:
+            if await asyncio.to_thread(load_deployment, deployment_id) is not None:
+                return
+            for droplet in await get_do_client().list_droplets(tag_name=f"deployment:{deployment_id}"):
+                logger.info(f"Destroying droplet {droplet['id']} of deleted deployment {deployment_id}")
+                await delete_droplet_quietly(droplet["id"])
+        except Exception as e:
+            logger.error(f"Error cleaning up after deleted deployment {deployment_id}: {str(e)}")
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                if not await asyncio.to_thread(renew_job_lease, job_id, self.worker_id):
+                    logger.warning(f"Lost lease on job {job_id}, stopping it here")
+                    task.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"Error renewing lease on job {job_id}: {str(e)}")
+
+
+provision_worker = ProvisionWorker(provision_scheduler)
+
+
+async def add_deployment(db: AsyncSession, request: ProvisionRequest, is_free_deploy: int,
+                         batch_id: Optional[str] = None) -> tuple:
+    """
+    Add a deployment row and its provisioning job to the caller's transaction.
+
+    Claims a warm droplet for it when the pool has one. Returns (deployment, warm).
+    """
+    deployment_id = generate_deployment_id()
+    warm = None
+    if is_free_deploy:
+        logger.info(f"Deployment {deployment_id} is using a free deploy slot")
+
+    # Skip droplet creation entirely if the warm pool has one ready
+    if WARM_POOL_SIZES:
+        warm = await claim_warm_droplet(db, request.region, deployment_id)
+
+    deployment = DeploymentModel(
+        deployment_id=deployment_id,
+        status='configuring_openclaw' if warm else 'pending',
+        anthropic_key_masked=request.anthropic_api_key[:10] + '...',
+        wallet_address=request.wallet_address,
+        payment_signature=request.payment_signature,
+        user_email=request.user_email,
+        region=request.region,
+        droplet_id=warm.droplet_id if warm else None,
+        ip_address=warm.ip_address if warm else None,
+        expires_at=datetime.utcnow() + timedelta(days=7),  # 7 days hosting
+        is_free_deploy=is_free_deploy,
+        batch_id=batch_id,
+    )
+    db.add(deployment)
+
+    # Queue the provisioning job in the same transaction so it can't be lost
+    db.add(new_provision_job(
+        deployment_id,
+        request.region,
+        request.anthropic_api_key,
+        phase='warm_claimed' if warm else 'pending'
+    ))
+    return deployment, warm
+
+
+def deployments_added(deployments: list):
+    """After the commit: refresh caches, schedule expiry and start provisioning"""
+    for deployment in deployments:
+        deployment_changed(deployment)
+        expiry_scheduler.schedule(deployment.deployment_id, deployment.expires_at)
+    if any(deployment.is_free_deploy for deployment in deployments):
+        free_deploys_cache.invalidate("free_deploys")
+
+    # Start provisioning in background
+    provision_worker.wake()
+
+
+@router.post("/provision", response_model=ProvisionResponse)
+async def provision_openclaw(request: ProvisionRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Provision a new OpenClaw VPS for a user
+    """
+    # Checked against the cached catalog, so a bad region fails here rather than in the worker
+    region_error = catalog.region_error(request.region)
+    if region_error:
+        raise HTTPException(status_code=400, detail=region_error)
+
+    try:
+        # Check if user wants to use a free deploy
+        is_free_deploy = 0
+        if request.use_free_deploy:
+            if await claim_free_deploy(db):
+                is_free_deploy = 1
+            else:
+                raise HTTPException(status_code=400, detail="No free deploys available")
+
+        # Create deployment record in database
+        deployment, warm = await add_deployment(db, request, is_free_deploy)
+        await db.commit()
+        deployments_added([deployment])
+
+        if warm:
+            return ProvisionResponse(
+                deployment_id=deployment.deployment_id,
+                status='configuring_openclaw',
+                message='Warm droplet assigned. Use /status endpoint to check progress.',
+                droplet_id=warm.droplet_id,
+                ip_address=warm.ip_address
+            )
+
+        return ProvisionResponse(
+            deployment_id=deployment.deployment_id,
+            status='pending',
+            message='Provisioning started. Use /status endpoint to check progress.'
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting provisioning: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/provision/batch", response_model=BatchProvisionResponse)
+async def provision_openclaw_batch(request: BatchProvisionRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Provision several OpenClaw VPSs in one order (a fleet or a team)
+
+    Every spec is validated before anything is created, free deploy slots are claimed
+    for the whole batch at once, and all deployments commit together or not at all.
+    Progress is at /provision/batch/{batch_id}, streamed at /provision/batch/{batch_id}/stream.
+    """
+    specs = request.deployments
+    if len(specs) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_SIZE} deployments")
+
+    errors = [
+        f"deployments[{index}]: {error}"
+        for index, error in ((index, catalog.region_error(spec.region)) for index, spec in enumerate(specs))
+        if error
+    ]
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    try:
+        batch_id = generate_deployment_id()
+
+        free_count = sum(1 for spec in specs if spec.use_free_deploy)
+        if free_count and not await claim_free_deploy(db, free_count):
+            raise HTTPException(status_code=400, detail=f"Not enough free deploys available for {free_count} deployments")
+
+        deployments = [
+            (await add_deployment(db, spec, 1 if spec.use_free_deploy else 0, batch_id))[0]
+            for spec in specs
+        ]
+        await db.commit()
+        deployments_added(deployments)
+        logger.info(f"Batch {batch_id} queued with {len(deployments)} deployments")
+
+        return BatchProvisionResponse(
+            batch_id=batch_id,
+            deployment_ids=[deployment.deployment_id for deployment in deployments],
+            status='pending',
+            message=f'Provisioning started. Use /provision/batch/{batch_id} to check progress.'
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting batch provisioning: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/provision/batch/{batch_id}")
+async def get_batch_status(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Get the aggregate progress of a batch and the status of each of its deployments
+    """
+    snapshots = await fetch_batch_statuses(db, batch_id)
+    if not snapshots:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    return dict(batch_progress(batch_id, snapshots), deployments=list(snapshots.values()))
+
+
+@router.get("/provision/batch/{batch_id}/stream")
+async def stream_batch_status(batch_id: str, request: Request):
     """
-    config = db.query(FreeDeployConfig).first()
-    if not config:
-        return False
+    Stream the status changes of every deployment in a batch as Server-Sent Events
 
-    if config.is_active != 1:
-        return False
+    Each deployment transition is sent as a `status` event followed by a `batch`
+    event with the updated aggregate progress. The stream ends once every
+    deployment has finished.
+    """
+    key = batch_stream_key(batch_id)
+    # Subscribe before reading the snapshots so no transition can slip in between
+    queue = status_broker.subscribe(key)
+    snapshots = await load_batch_statuses(batch_id)
+    if not snapshots:
+        status_broker.unsubscribe(key, queue)
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    async def events():
+        try:
+            progress = batch_progress(batch_id, snapshots)
+            yield "retry: 3000\n\n" + sse_event(progress, event="batch")
+            last_change = time.monotonic()
+
+            while not progress["done"]:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), STATUS_STREAM_HEARTBEAT)
+                    last_change = time.monotonic()
+                    snapshots[snapshot["deployment_id"]] = snapshot
+                    progress = batch_progress(batch_id, snapshots)
+                    yield sse_event(snapshot) + sse_event(progress, event="batch")
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+                if await request.is_disconnected():
+                    return
+
+                # Transitions written by other processes are only seen by re-reading the rows
+                if STATUS_STREAM_RESYNC_INTERVAL and time.monotonic() - last_change >= STATUS_STREAM_RESYNC_INTERVAL:
+                    last_change = time.monotonic()
+                    latest = await load_batch_statuses(batch_id)
+                    changed = [snapshot for deployment_id, snapshot in latest.items() if snapshots.get(deployment_id) != snapshot]
+                    if changed:
+                        snapshots.update(latest)
+                        progress = batch_progress(batch_id, snapshots)
+                        yield "".join(sse_event(snapshot) for snapshot in changed) + sse_event(progress, event="batch")
+                        continue
+
+                yield ": keepalive\n\n"
+        finally:
+            status_broker.unsubscribe(key, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# First-boot configuration: droplets created with BOOT_CONFIGURE_MODE=cloud-init fetch their
+# key and report readiness here, authenticated by their job's bootstrap token
+def authorize_bootstrap(job_id: str, request: Request):
+    if BOOT_CONFIGURE_MODE != "cloud-init":
+        # No secret to check tokens against
+        raise HTTPException(status_code=404, detail="First-boot configuration is disabled")
+    token = request.headers.get("x-bootstrap-token", "")
+    if not hmac.compare_digest(token, bootstrap_token(job_id)):
+        raise HTTPException(status_code=403, detail="Invalid bootstrap token")
+
+
+@router.post("/bootstrap/{job_id}/key", response_class=PlainTextResponse)
+async def fetch_bootstrap_key(job_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Hand a droplet configuring itself on first boot its Anthropic key, once
+    """
+    authorize_bootstrap(job_id, request)
+    job = await db.get(ProvisionJobModel, job_id)
+    if not job or not job.encrypted_key:
+        raise HTTPException(status_code=404, detail="No key for this job")
+
+    fetched = await db.execute(
+        update(ProvisionJobModel).where(
+            ProvisionJobModel.job_id == job_id,
+            ProvisionJobModel.bootstrap_fetched_at.is_(None)
+        ).values(bootstrap_fetched_at=datetime.utcnow())
+    )
+    await db.commit()
+    if not fetched.rowcount:
+        raise HTTPException(status_code=410, detail="Key already fetched")
+
+    logger.info(f"Job {job_id}: droplet fetched its key")
+    return decrypt_secret(job.encrypted_key)
+
+
+@router.post("/bootstrap/{job_id}/report")
+async def post_bootstrap_report(job_id: str, report: dict, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Record the readiness report of a droplet that configured itself on first boot
+    """
+    authorize_bootstrap(job_id, request)
+    encoded = json.dumps(report)
+    if len(encoded) > 4096:
+        raise HTTPException(status_code=413, detail="Report too large")
+
+    stored = await db.execute(
+        update(ProvisionJobModel).where(ProvisionJobModel.job_id == job_id).values(
+            bootstrap_report=encoded,
+            updated_at=datetime.utcnow()
+        )
+    )
+    await db.commit()
+    if not stored.rowcount:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Report received"}
+
+
+@router.get("/status/{deployment_id}", response_model=DeploymentStatus)
+async def get_deployment_status(deployment_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Get the status of a deployment
+    """
+    snapshot = status_cache.get(deployment_id)
+    if snapshot is None:
+        snapshot = await fetch_deployment_status(db, deployment_id)
+        if not snapshot:
+            raise HTTPException(status_code=404, detail="Deployment not found")
+
+    return DeploymentStatus(**snapshot)
+
+
+@router.get("/status/{deployment_id}/stream")
+async def stream_deployment_status(deployment_id: str, request: Request):
+    """
+    Stream deployment status changes as Server-Sent Events
+    """
+    # Subscribe before reading the snapshot so no transition can slip in between
+    queue = status_broker.subscribe(deployment_id)
+    snapshot = await load_deployment_status(deployment_id)
+    if not snapshot:
+        status_broker.unsubscribe(deployment_id, queue)
+        raise HTTPException(status_code=404, detail="Deployment not found")
+
+    async def events():
+        try:
+            current = snapshot
+            yield "retry: 3000\n\n" + sse_event(current)
+            last_change = time.monotonic()
+
+            while current["status"] not in TERMINAL_STATUSES:
+                try:
+                    current = await asyncio.wait_for(queue.get(), STATUS_STREAM_HEARTBEAT)
+                    last_change = time.monotonic()
+                    yield sse_event(current)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+                if await request.is_disconnected():
+                    return
+
+                # Transitions written by other processes are only seen by re-reading the row
+                if STATUS_STREAM_RESYNC_INTERVAL and time.monotonic() - last_change >= STATUS_STREAM_RESYNC_INTERVAL:
+                    last_change = time.monotonic()
+                    latest = await load_deployment_status(deployment_id)
+                    if latest is None:
+                        return
+                    if latest != current:
+                        current = latest
+                        yield sse_event(current)
+                        continue
+
+                yield ": keepalive\n\n"
+        finally:
+            status_broker.unsubscribe(deployment_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Columns /deployments can return; `fields` selects a subset
+DEPLOYMENT_LIST_FIELDS = [
+    "deployment_id", "status", "wallet_address", "droplet_id", "ip_address", "dashboard_url",
+    "region", "created_at", "updated_at", "expires_at", "error_message",
+]
+DEFAULT_DEPLOYMENT_LIST_FIELDS = [field for field in DEPLOYMENT_LIST_FIELDS if field != "region"]
+
+
+DEPLOYMENTS_PAGE_SIZE = 100
+DEPLOYMENTS_MAX_PAGE_SIZE = 500
+
+
+def encode_deployments_cursor(created_at: datetime, deployment_id: str) -> str:
+    key = [created_at.isoformat(), deployment_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_deployments_cursor(cursor: str) -> tuple:
+    try:
+        created_at, deployment_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(deployment_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def query_deployments(db: AsyncSession, filters: list, fields: list, limit: int, cursor: Optional[tuple],
+                            include_total: bool) -> dict:
+    """
+    One page of deployments, newest first, selecting only the requested columns.
+
+    Pages are keyed on (created_at, deployment_id) so each page is an index range scan
+    regardless of how deep into the history it is.
+    """
+    # The sort key is always selected so the next cursor can be built
+    selected = list(dict.fromkeys(fields + ["created_at", "deployment_id"]))
+    query = select(*[getattr(DeploymentModel, field) for field in selected]).where(*filters)
+
+    if cursor:
+        created_at, deployment_id = cursor
+        # Equivalent to (created_at, deployment_id) < cursor, written so the leading
+        # created_at bound is an index range on both SQLite and Postgres
+        query = query.where(
+            DeploymentModel.created_at <= created_at,
+            or_(DeploymentModel.created_at < created_at, DeploymentModel.deployment_id < deployment_id)
+        )
+
+    rows = (await db.execute(query.order_by(
+        DeploymentModel.created_at.desc(),
+        DeploymentModel.deployment_id.desc()
+    ).limit(limit + 1))).all()
+
+    page = rows[:limit]
+    deployments = []
+    for row in page:
+        item = {}
+        for field in fields:
+            value = getattr(row, field)
+            item[field] = value.isoformat() if isinstance(value, datetime) else value
+        deployments.append(item)
+
+    result = {
+        "deployments": deployments,
+        "count": len(deployments),
+        "next_cursor": (
+            encode_deployments_cursor(page[-1].created_at, page[-1].deployment_id)
+            if len(rows) > limit else None
+        ),
+    }
+    if include_total:
+        result["total"] = await db.scalar(
+            select(func.count(DeploymentModel.deployment_id)).where(*filters)
+        )
+    return result
+
+
+@router.get("/deployments")
+async def list_deployments(
+    wallet: Optional[str] = None,
+    status: Optional[str] = None,
+    region: Optional[str] = None,
+    expires_after: Optional[datetime] = None,
+    expires_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    limit: int = DEPLOYMENTS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List deployments newest first, one page at a time.
+
+    Filters: wallet, status (comma separated), region and an expiry window. `fields` is a
+    comma separated list of columns to return; pass the returned `next_cursor` as `cursor`
+    to fetch the next page. `include_total` adds a count of all matching rows.
+    """
+    if not 1 <= limit <= DEPLOYMENTS_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {DEPLOYMENTS_MAX_PAGE_SIZE}")
+
+    if fields:
+        selected_fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected_fields if field not in DEPLOYMENT_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        selected_fields = DEFAULT_DEPLOYMENT_LIST_FIELDS
+
+    # Dashboards ask for a wallet's first page over and over; that shape is served from cache
+    cacheable = bool(wallet) and not any([
+        status, region, expires_after, expires_before, fields, cursor, include_total
+    ]) and limit == DEPLOYMENTS_PAGE_SIZE
+    if cacheable:
+        cached = wallet_cache.get(wallet)
+        if cached is not None:
+            return cached
+
+    filters = []
+    if wallet:
+        filters.append(DeploymentModel.wallet_address == wallet)
+    if status:
+        filters.append(DeploymentModel.status.in_([s.strip() for s in status.split(",") if s.strip()]))
+    if region:
+        filters.append(DeploymentModel.region == region)
+    if expires_after:
+        filters.append(DeploymentModel.expires_at >= expires_after)
+    if expires_before:
+        filters.append(DeploymentModel.expires_at < expires_before)
+
+    result = await query_deployments(
+        db,
+        filters,
+        selected_fields,
+        limit,
+        decode_deployments_cursor(cursor) if cursor else None,
+        include_total
+    )
+    if cacheable:
+        wallet_cache.set(wallet, result)
+    return result
+
+
+@router.delete("/deployment/{deployment_id}")
+async def delete_deployment(deployment_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Delete a deployment and destroy the droplet
+    """
+    deployment = await db.get(DeploymentModel, deployment_id)
+    if not deployment:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+
+    droplet_id = deployment.droplet_id
+
+    if droplet_id:
+        try:
+            await delete_droplet_quietly(droplet_id)
+            logger.info(f"Destroyed droplet {droplet_id}")
+        except Exception as e:
+            logger.error(f"Error destroying droplet: {str(e)}")
+
+    if deployment.snapshot_id:
+        await delete_snapshot_quietly(deployment.snapshot_id)
+
+    # Remove from database, cancelling any provisioning job that has not finished so no worker
+    # creates a droplet for it afterwards (a running job loses its lease and stops)
+    snapshot = dict(deployment_status_payload(deployment), status="deleted")
+    wallet_address = deployment.wallet_address
+    await db.execute(
+        update(ProvisionJobModel)
+        .where(ProvisionJobModel.deployment_id == deployment_id, ProvisionJobModel.status.in_(['queued', 'running']))
+        .values(status='cancelled', lease_owner=None, lease_expires_at=None, encrypted_key=None,
+                last_error='Deployment deleted', updated_at=datetime.utcnow())
+    )
+    await db.delete(deployment)
+    await db.commit()
+    deployment_removed(deployment_id, wallet_address)
+    expiry_scheduler.cancel(deployment_id)
+    publish_status(snapshot)
+
+    return {"message": f"Deployment {deployment_id} deleted"}
+
+
+class RenewRequest(BaseModel):
+    deployment_id: str
+    payment_signature: str
+    wallet_address: str
+
+
+@router.post("/renew")
+async def renew_deployment(request: RenewRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Renew a deployment for another 7 days (requires payment verification)
+    """
+    deployment = await db.get(DeploymentModel, request.deployment_id)
+
+    if not deployment:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+
+    # Verify wallet matches
+    if deployment.wallet_address != request.wallet_address:
+        raise HTTPException(status_code=403, detail="Wallet address does not match deployment owner")
+
+    # Status updates still queued for the deployment go out in this transaction, so a later
+    # flush cannot overwrite the renewal (e.g. a hibernation's 'expired'). take() waits out
+    # a flush already writing them, so the row is re-read afterwards.
+    pending = await status_writer.take(request.deployment_id)
+    await db.refresh(deployment)
+    for key, value in pending.items():
+        setattr(deployment, key, value)
+
+    # Extend expiry by 7 days from now (or from current expiry if still valid)
+    current_expiry = deployment.expires_at or datetime.utcnow()
+    if current_expiry < datetime.utcnow():
+        # Already expired, extend from now
+        new_expiry = datetime.utcnow() + timedelta(days=7)
+    else:
+        # Still valid, extend from current expiry
+        new_expiry = current_expiry + timedelta(days=7)
+
+    deployment.expires_at = new_expiry
+    deployment.payment_signature = request.payment_signature  # Store latest payment
+    deployment.updated_at = datetime.utcnow()
+
+    # If status was 'expired', set it back to 'ready'
+    if deployment.status == 'expired':
+        deployment.status = 'ready'
+
+    # A hibernated deployment is brought back from its snapshot by a restore job
+    restoring = deployment.status == 'hibernated' and bool(deployment.snapshot_id)
+    if restoring:
+        deployment.status = 'restoring'
+        deployment.error_message = None
+        db.add(new_provision_job(request.deployment_id, deployment.region, None))
+
+    await db.commit()
+    publish_status(deployment_changed(deployment))
+    expiry_scheduler.schedule(request.deployment_id, new_expiry)
+    if restoring:
+        provision_worker.wake()
+
+    logger.info(f"Deployment {request.deployment_id} renewed until {new_expiry}")
+
+    return {
+        "message": "Deployment renewed successfully" + (", restoring from snapshot" if restoring else ""),
+        "deployment_id": request.deployment_id,
+        "status": deployment.status,
+        "expires_at": new_expiry.isoformat()
+    }
+
+
+# Statuses of deployments that still own a running droplet past their expiry, in the order
+# the ix_deployments_live_expiry predicate lists them
+LIVE_STATUSES = ['ready', 'expired']
+
+
+def upcoming_expiries_query(until: datetime):
+    """Live deployments due before `until`; the literal status list lets it use the partial expiry index"""
+    return select(DeploymentModel.expires_at, DeploymentModel.deployment_id).where(
+        DeploymentModel.expires_at < until,
+        literal_in(DeploymentModel.status, LIVE_STATUSES)
+    )
+
+
+def load_upcoming_expiries(until: datetime) -> list:
+    """(expires_at, deployment_id) of live deployments due before `until`"""
+    db = SessionLocal()
+    try:
+        return db.execute(upcoming_expiries_query(until)).all()
+    finally:
+        db.close()
+
+
+def load_due_droplets(deployment_ids: list) -> list:
+    """(deployment_id, droplet_id, snapshot_id) for the given deployments that are still live and past expiry"""
+    db = SessionLocal()
+    try:
+        return db.query(DeploymentModel.deployment_id, DeploymentModel.droplet_id, DeploymentModel.snapshot_id).filter(
+            DeploymentModel.deployment_id.in_(deployment_ids),
+            DeploymentModel.expires_at <= datetime.utcnow(),
+            literal_in(DeploymentModel.status, LIVE_STATUSES)
+        ).all()
+    finally:
+        db.close()
+
+
+def mark_deployments_destroyed(deployment_ids: list) -> list:
+    """Mark a batch of deployments destroyed in one transaction and return their snapshots"""
+    if not deployment_ids:
+        return []
+    # Keep the rows loaded across the commit so the snapshots don't reload them one by one
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        deployments = db.query(DeploymentModel).filter(DeploymentModel.deployment_id.in_(deployment_ids)).all()
+        for deployment in deployments:
+            deployment.status = 'destroyed'
+            deployment.snapshot_id = None
+            deployment.updated_at = datetime.utcnow()
+        db.commit()
+        return [deployment_changed(deployment) for deployment in deployments]
+    finally:
+        db.close()
+
+
+def hibernate_snapshot_name(deployment_id: str) -> str:
+    return f"autoclawd-hibernate-{deployment_id}"
+
+
+async def wait_for_action(action: dict, description: str):
+    """Wait for a droplet action to finish; raises if DigitalOcean reports it errored"""
+    client = get_do_client()
+
+    async def finished():
+        current = await client.get_action(action["id"])
+        return current["status"] if current["status"] != "in-progress" else None
+
+    status = await wait_until(finished, PROBE_POLICIES["droplet_action"], description)
+    if status != "completed":
+        raise RuntimeError(f"{description} {status}")
+
+
+async def delete_droplet_quietly(droplet_id: int):
+    try:
+        await get_do_client().delete_droplet(droplet_id)
+    except DigitalOceanError as e:
+        if e.status_code != 404:
+            raise
+
+
+async def delete_snapshot_quietly(snapshot_id: str) -> bool:
+    """Delete a snapshot, treating one that is already gone as deleted; failures are left for the retention sweep"""
+    try:
+        await get_do_client().delete_snapshot(snapshot_id)
+    except DigitalOceanError as e:
+        if e.status_code != 404:
+            logger.warning(f"Could not delete snapshot {snapshot_id}: {e}")
+            return False
+    return True
+
+
+async def hibernate_deployment(deployment_id: str, droplet_id: Optional[int], snapshot_id: Optional[str]) -> bool:
+    """
+    Power off, snapshot and destroy an expired deployment's droplet, recording the snapshot.
+
+    Every step is idempotent, so a hibernation interrupted by a restart is resumed by the
+    next reaper pass: an existing snapshot is found by name and a recorded one is not redone.
+    Returns False if it should be retried later.
+    """
+    client = get_do_client()
+    try:
+        # 'expired' marks a deployment whose term is over but whose droplet still exists. It is
+        # written before anything else, so a renewal from here on finds it and sets it back to ready
+        await status_writer.write(deployment_id, {'status': 'expired'}, wait=True)
+
+        if not snapshot_id and droplet_id:
+            try:
+                droplet = await client.get_droplet(droplet_id)
+            except DigitalOceanError as e:
+                if e.status_code != 404:
+                    raise
+                droplet = None
+
+            if droplet is None:
+                # Nothing left to snapshot
+                for snapshot in await asyncio.to_thread(mark_deployments_destroyed, [deployment_id]):
+                    publish_status(snapshot)
+                return True
+
+            name = hibernate_snapshot_name(deployment_id)
+            snapshots = [s for s in await client.list_droplet_snapshots(droplet_id) if s["name"] == name]
+            if not snapshots:
+                if droplet["status"] != "off":
+                    action = await client.droplet_action(droplet_id, "power_off")
+                    await wait_for_action(action, f"Power off of droplet {droplet_id}")
+                action = await client.droplet_action(droplet_id, "snapshot", name=name)
+                await wait_for_action(action, f"Snapshot of droplet {droplet_id}")
+                snapshots = [s for s in await client.list_droplet_snapshots(droplet_id) if s["name"] == name]
+                if not snapshots:
+                    raise RuntimeError(f"Snapshot {name} not found after the snapshot action completed")
+
+            snapshot_id = str(snapshots[0]["id"])
+            await update_deployment_status(deployment_id, snapshot_id=snapshot_id)
+            # The snapshot must be on record before its droplet is destroyed
+            await status_writer.flush()
+
+        # A renewal may have landed while the droplet was being snapshotted
+        if not await asyncio.to_thread(load_due_droplets, [deployment_id]):
+            logger.info(f"Deployment {deployment_id} was renewed during hibernation, powering it back on")
+            if droplet_id:
+                await client.droplet_action(droplet_id, "power_on")
+            # The renewal may have been overwritten by the 'expired' above; it is live again either way
+            fields = {'status': 'ready'}
+            if snapshot_id and await delete_snapshot_quietly(snapshot_id):
+                fields['snapshot_id'] = None
+            await update_deployment_status(deployment_id, **fields)
+            return True
+
+        if droplet_id:
+            await delete_droplet_quietly(droplet_id)
 
-    if config.claimed_count >= config.total_free_deploys:
+        await update_deployment_status(
+            deployment_id,
+            status='hibernated',
+            hibernated_at=datetime.utcnow(),
+            droplet_id=None,
+            ip_address=None
+        )
+        logger.info(f"Deployment {deployment_id} hibernated to snapshot {snapshot_id}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error hibernating deployment {deployment_id}: {str(e)}")
         return False
 
-    config.claimed_count += 1
-    config.updated_at = datetime.utcnow()
-    db.commit()
 
-    logger.info(f"Free deploy claimed! {config.claimed_count}/{config.total_free_deploys} used")
+class ExpiryScheduler:
+    """
+    Destroys (or hibernates) expired deployments within seconds of their deadline.
+
+    Upcoming deadlines are loaded into a min-heap from an indexed query covering the
+    next two reload intervals, and /provision, /renew and delete update them in place.
+    Renewed or removed deployments leave stale heap entries behind; they are skipped
+    because they no longer match the deadline recorded in `_deadlines`. Due deployments
+    are re-checked against the database and reaped in background batches, so a slow
+    batch never delays the next deadline. Destroys run concurrently under a start-rate
+    limit and are marked destroyed in one commit per batch; hibernations commit per step.
+    Failed reaps are retried `retry_delay` later; reloads keep that backoff rather than
+    re-pushing the already passed deadline from the database.
+    """
+
+    def __init__(self, mode: str, reload_interval: float, concurrency: int, rate: float, batch_size: int,
+                 retry_delay: float):
+        self.mode = mode
+        self.reload_interval = reload_interval
+        self.horizon = timedelta(seconds=2 * reload_interval)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+
+        self._heap = []
+        self._deadlines = {}
+        self._retry_at = {}
+        self._loaded_until: Optional[datetime] = None
+        self._wake = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._next_start = 0.0
+        self._in_flight = set()
+        self._tasks = set()
+        self.reloads = 0
+        self.reaped = 0
+        self.hibernated = 0
+        self.destroy_failures = 0
+
+    def schedule(self, deployment_id: str, expires_at: Optional[datetime]):
+        """Record a new or changed deadline for a deployment"""
+        self._deadlines.pop(deployment_id, None)
+        self._retry_at.pop(deployment_id, None)
+        if expires_at is None or self._loaded_until is None or expires_at >= self._loaded_until:
+            # Beyond the loaded window: the next reload picks it up
+            return
+        self._push(deployment_id, expires_at)
+        self._wake.set()
+
+    def cancel(self, deployment_id: str):
+        self._deadlines.pop(deployment_id, None)
+        self._retry_at.pop(deployment_id, None)
+
+    def _push(self, deployment_id: str, expires_at: datetime):
+        self._deadlines[deployment_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, deployment_id))
+
+    async def reload(self):
+        until = datetime.utcnow() + self.horizon
+        rows = await asyncio.to_thread(load_upcoming_expiries, until)
+        self._heap = []
+        self._deadlines = {}
+        loaded = set()
+        for expires_at, deployment_id in rows:
+            loaded.add(deployment_id)
+            if deployment_id not in self._in_flight:
+                # A deployment waiting out a failed reap keeps its backoff
+                retry_at = self._retry_at.get(deployment_id)
+                self._push(deployment_id, max(expires_at, retry_at) if retry_at else expires_at)
+        # Renewed or reaped elsewhere since the failure: nothing left to retry
+        self._retry_at = {
+            deployment_id: retry_at for deployment_id, retry_at in self._retry_at.items()
+            if deployment_id in loaded or deployment_id in self._in_flight
+        }
+        self._loaded_until = until
+        self.reloads += 1
+        logger.info(f"Expiry scheduler loaded {len(rows)} deadlines before {until.isoformat()}")
+
+    def _pop_due(self, now: datetime) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            expires_at, deployment_id = heapq.heappop(self._heap)
+            if self._deadlines.get(deployment_id) == expires_at:
+                del self._deadlines[deployment_id]
+                due.append(deployment_id)
+        # Drop stale entries so the head of the heap is always a live deadline
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return due
+
+    async def _rate_limit(self):
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + 1 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _destroy(self, deployment_id: str, droplet_id: Optional[int]) -> bool:
+        if not droplet_id:
+            return True
+        async with self._semaphore:
+            await self._rate_limit()
+            try:
+                await get_do_client().delete_droplet(droplet_id)
+                logger.info(f"Destroyed expired droplet {droplet_id} ({deployment_id})")
+            except DigitalOceanError as e:
+                if e.status_code != 404:
+                    logger.error(f"Error destroying expired droplet {droplet_id}: {e}")
+                    return False
+            except Exception as e:
+                logger.error(f"Error destroying expired droplet {droplet_id}: {str(e)}")
+                return False
+        return True
+
+    async def _hibernate(self, deployment_id: str, droplet_id: Optional[int], snapshot_id: Optional[str]) -> bool:
+        async with self._semaphore:
+            await self._rate_limit()
+            return await hibernate_deployment(deployment_id, droplet_id, snapshot_id)
+
+    def _retry_later(self, deployment_id: str):
+        self.destroy_failures += 1
+        retry_at = datetime.utcnow() + timedelta(seconds=self.retry_delay)
+        self._retry_at[deployment_id] = retry_at
+        self._push(deployment_id, retry_at)
+
+    async def reap(self, deployment_ids: list):
+        # Any backoff is used up; failures below record a new one
+        for deployment_id in deployment_ids:
+            self._retry_at.pop(deployment_id, None)
+        # Renewals may have landed since the deadline was loaded; only reap what is still due
+        due = await asyncio.to_thread(load_due_droplets, deployment_ids)
+        if not due:
+            return
+
+        logger.info(f"Reaping {len(due)} expired deployments ({self.mode})")
+        if self.mode == "hibernate":
+            results = await asyncio.gather(*[
+                self._hibernate(deployment_id, droplet_id, snapshot_id)
+                for deployment_id, droplet_id, snapshot_id in due
+            ])
+            for (deployment_id, _, _), ok in zip(due, results):
+                if ok:
+                    self.hibernated += 1
+                else:
+                    self._retry_later(deployment_id)
+            return
+
+        results = await asyncio.gather(*[
+            self._destroy(deployment_id, droplet_id) for deployment_id, droplet_id, _ in due
+        ])
+
+        destroyed = []
+        for (deployment_id, _, _), ok in zip(due, results):
+            if ok:
+                destroyed.append(deployment_id)
+            else:
+                self._retry_later(deployment_id)
+
+        for snapshot in await asyncio.to_thread(mark_deployments_destroyed, destroyed):
+            publish_status(snapshot)
+        self.reaped += len(destroyed)
+
+    async def _reap_batch(self, deployment_ids: list):
+        try:
+            await self.reap(deployment_ids)
+        except Exception as e:
+            logger.error(f"Error reaping expired deployments: {str(e)}")
+            for deployment_id in deployment_ids:
+                self._retry_later(deployment_id)
+        finally:
+            self._in_flight.difference_update(deployment_ids)
+            self._wake.set()
+
+    def _spawn(self, deployment_ids: list):
+        self._in_flight.update(deployment_ids)
+        task = asyncio.create_task(self._reap_batch(deployment_ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _stop(self):
+        """Cancel reaps in progress and forget the loaded deadlines until the next run reloads them"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._heap = []
+        self._deadlines = {}
+        self._retry_at = {}
+        self._loaded_until = None
+
+    async def run(self):
+        next_reload = 0.0
+        try:
+            while True:
+                try:
+                    if time.monotonic() >= next_reload:
+                        await self.reload()
+                        next_reload = time.monotonic() + self.reload_interval
+
+                    due = self._pop_due(datetime.utcnow())
+                    if due:
+                        self._spawn(due)
+                        continue
+                except Exception as e:
+                    logger.error(f"Error in expiry scheduler: {str(e)}")
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+
+                timeout = next_reload - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), max(0.0, timeout))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Stopped on losing leadership: the new leader reaps from here, so nothing may run on
+            await self._stop()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "scheduled": len(self._deadlines),
+            "in_flight": len(self._in_flight),
+            "next_deadline": self._heap[0][0].isoformat() if self._heap else None,
+            "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            "reloads": self.reloads,
+            "reaped": self.reaped,
+            "hibernated": self.hibernated,
+            "destroy_failures": self.destroy_failures,
+        }
+
+
+expiry_scheduler = ExpiryScheduler(
+    EXPIRY_MODE,
+    EXPIRY_RELOAD_INTERVAL,
+    EXPIRY_DESTROY_CONCURRENCY,
+    EXPIRY_DESTROY_RATE,
+    EXPIRY_BATCH_SIZE,
+    EXPIRY_RETRY_DELAY
+)
+
+
+def acquire_scheduler_lease(name: str, holder: str, lease_seconds: float) -> bool:
+    """
+    Take or extend a named lease; True while `holder` owns it.
+
+    The lease moves only through a conditional UPDATE (ours, or expired), so two
+    processes can never both hold it; the row is created by the first process to ask.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    db = SessionLocal()
+    try:
+        held = db.query(SchedulerLeaseModel).filter(
+            SchedulerLeaseModel.name == name,
+            or_(SchedulerLeaseModel.holder == holder, SchedulerLeaseModel.expires_at < now)
+        ).update({
+            SchedulerLeaseModel.holder: holder,
+            SchedulerLeaseModel.expires_at: expires_at,
+        }, synchronize_session=False)
+        if held:
+            db.commit()
+            return True
+        if db.get(SchedulerLeaseModel, name) is not None:
+            db.rollback()
+            return False
+        db.add(SchedulerLeaseModel(name=name, holder=holder, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process created it first
+            db.rollback()
+            return False
+        return True
+    finally:
+        db.close()
+
+
+def release_scheduler_lease(name: str, holder: str):
+    """Expire our lease now so the next process can take it without waiting it out"""
+    db = SessionLocal()
+    try:
+        db.query(SchedulerLeaseModel).filter(
+            SchedulerLeaseModel.name == name,
+            SchedulerLeaseModel.holder == holder
+        ).update({SchedulerLeaseModel.expires_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+scheduler_leader = LeaderElection(
+    "scheduler",
+    f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}",
+    SCHEDULER_LEASE_SECONDS,
+    acquire_scheduler_lease,
+    release_scheduler_lease
+)
+
+
+def load_snapshots_to_evict(now: datetime) -> list:
+    """(deployment_id, snapshot_id) of hibernated deployments past retention or beyond the snapshot cap"""
+    db = SessionLocal()
+    try:
+        hibernated = db.query(DeploymentModel.deployment_id, DeploymentModel.snapshot_id, DeploymentModel.hibernated_at).filter(
+            DeploymentModel.status == 'hibernated'
+        ).order_by(DeploymentModel.hibernated_at).all()
+        cutoff = now - timedelta(days=HIBERNATE_RETENTION_DAYS)
+        over_cap = max(0, len(hibernated) - HIBERNATE_MAX_SNAPSHOTS)
+        return [
+            (deployment_id, snapshot_id)
+            for i, (deployment_id, snapshot_id, hibernated_at) in enumerate(hibernated)
+            if i < over_cap or (hibernated_at and hibernated_at < cutoff)
+        ]
+    finally:
+        db.close()
+
+
+def load_referenced_snapshot_ids() -> set:
+    db = SessionLocal()
+    try:
+        return {
+            snapshot_id for (snapshot_id,) in
+            db.query(DeploymentModel.snapshot_id).filter(DeploymentModel.snapshot_id.isnot(None)).all()
+        }
+    finally:
+        db.close()
+
+
+async def enforce_snapshot_retention():
+    """
+    Evict hibernation snapshots that outlived the retention period or the count cap (oldest
+    first), then delete any of our snapshots no deployment refers to any more.
+    """
+    evicted = []
+    for deployment_id, snapshot_id in await asyncio.to_thread(load_snapshots_to_evict, datetime.utcnow()):
+        if not snapshot_id or await delete_snapshot_quietly(snapshot_id):
+            evicted.append(deployment_id)
+    for snapshot in await asyncio.to_thread(mark_deployments_destroyed, evicted):
+        publish_status(snapshot)
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} hibernation snapshots")
+
+    # Orphans: restores whose snapshot delete failed, hibernations interrupted after snapshotting.
+    # Young snapshots are skipped so an in-progress hibernation can still record its own
+    referenced = await asyncio.to_thread(load_referenced_snapshot_ids)
+    orphan_cutoff = datetime.utcnow() - timedelta(hours=1)
+    for snapshot in await get_do_client().list_snapshots():
+        if not snapshot["name"].startswith("autoclawd-hibernate-") or str(snapshot["id"]) in referenced:
+            continue
+        created_at = datetime.fromisoformat(snapshot["created_at"].replace("Z", "+00:00")).replace(tzinfo=None)
+        if created_at < orphan_cutoff:
+            logger.info(f"Deleting orphaned snapshot {snapshot['id']} ({snapshot['name']})")
+            await delete_snapshot_quietly(str(snapshot["id"]))
+
+
+async def run_snapshot_retention():
+    while True:
+        try:
+            await enforce_snapshot_retention()
+        except Exception as e:
+            logger.error(f"Error enforcing snapshot retention: {str(e)}")
+        await asyncio.sleep(SNAPSHOT_RETENTION_INTERVAL)
+
+
+async def startup_event():
+    """Start background tasks on app startup"""
+    logger.info("Starting AutoClaw API...")
+    logger.info(f"Frontend URL: {FRONTEND_URL}")
+    # One copy of the periodic jobs across all processes; every process keeps its own catalog
+    scheduler_leader.register("expiry_scheduler", expiry_scheduler.run)
+    logger.info(f"Registered expiry scheduler ({EXPIRY_MODE} mode)")
+    if DIGITALOCEAN_TOKEN:
+        asyncio.create_task(catalog.run(CATALOG_REFRESH_INTERVAL))
+        scheduler_leader.register("snapshot_retention", run_snapshot_retention)
+    if WARM_POOL_SIZES and DIGITALOCEAN_TOKEN:
+        scheduler_leader.register("warm_pool", replenish_warm_pool)
+        logger.info(f"Registered warm pool replenisher: {WARM_POOL_SIZES}")
+    asyncio.create_task(scheduler_leader.run())
+    if EMBEDDED_WORKER:
+        asyncio.create_task(provision_worker.run())
+        logger.info("Started embedded provisioning worker")
+
+
+async def shutdown_event():
+    """Hand off the scheduler lease, write queued status updates and close pooled database connections"""
+    await scheduler_leader.resign()
+    try:
+        await status_writer.flush()
+    except Exception as e:
+        logger.error(f"Error flushing status updates on shutdown: {str(e)}")
+    await async_engine.dispose()
+    engine.dispose()
+    if _do_client is not None:
+        await _do_client.aclose()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(prepare_database)
+    await startup_event()
+    yield
+    await shutdown_event()
+
+
+async def run_worker():
+    """Standalone provisioning worker process"""
+    logger.info("Starting AutoClaw provisioning worker...")
+    await provision_worker.run()
+
+
+@router.get("/")
+async def root():
+    """Health check endpoint"""
+    logger.info("Health check endpoint called")
+    return {
+        "service": "AutoClaw - OpenClaw Provisioning Platform",
+        "status": "running",
+        "version": "1.0.0"
+    }
+
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Internal provisioning statistics
+    """
+    return {
+        "provisioning": provision_scheduler.stats(),
+        "jobs": await asyncio.to_thread(count_jobs_by_status),
+        "droplet_poller": droplet_poller.stats(),
+        "expiry": expiry_scheduler.stats(),
+        "scheduler": scheduler_leader.stats(),
+        "status_streams": status_broker.stats(),
+        "status_writer": status_writer.stats(),
+        "droplet_batcher": droplet_batcher.stats(),
+        "cache": {
+            "status": status_cache.stats(),
+            "wallets": wallet_cache.stats(),
+            "free_deploys": free_deploys_cache.stats(),
+        },
+        "ssh": session_totals(),
+        "digitalocean": get_do_client().stats() if DIGITALOCEAN_TOKEN else None,
+        "catalog": catalog.stats()
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(db: AsyncSession = Depends(get_db)):
+    """
+    Prometheus metrics: provisioning phase durations and failures, and in-flight deployments
+    """
+    counts = (await db.execute(
+        select(DeploymentModel.status, func.count(DeploymentModel.deployment_id))
+        .where(literal_in(DeploymentModel.status, IN_FLIGHT_STATUSES))
+        .group_by(DeploymentModel.status)
+    )).all()
+    by_status = dict.fromkeys(IN_FLIGHT_STATUSES, 0)
+    by_status.update(counts)
+    DEPLOYMENTS_IN_FLIGHT.replace({(status,): count for status, count in by_status.items()})
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/free-deploys")
+async def get_free_deploys(db: AsyncSession = Depends(get_db)):
+    """
+    Get the status of free deploy promotion
+    """
+    cached = free_deploys_cache.get("free_deploys")
+    if cached is not None:
+        return cached
+
+    result = await load_free_deploys(db)
+    free_deploys_cache.set("free_deploys", result)
+    return result
+
+
+async def load_free_deploys(db: AsyncSession) -> dict:
+    config = await db.scalar(select(FreeDeployConfig).order_by(FreeDeployConfig.id).limit(1))
+    if not config:
+        return {
+            "is_active": False,
+            "total": 0,
+            "claimed": 0,
+            "remaining": 0
+        }
+
+    remaining = max(0, config.total_free_deploys - config.claimed_count)
+    is_active = config.is_active == 1 and remaining > 0
+
+    return {
+        "is_active": is_active,
+        "total": config.total_free_deploys,
+        "claimed": config.claimed_count,
+        "remaining": remaining
+    }
+
+
+async def claim_free_deploy(db: AsyncSession, count: int = 1) -> bool:
+    """
+    Try to claim `count` free deploys in the caller's transaction. Returns True if successful.
+
+    The check and the increment are one conditional UPDATE ... RETURNING, so the
+    database arbitrates concurrent claims from any number of workers and the promo
+    can never be over-claimed. A batch claims all of its slots or none. The claim
+    commits (or rolls back) together with the caller's deployment rows.
+    """
+    claimed = (await db.execute(
+        update(FreeDeployConfig)
+        .where(
+            FreeDeployConfig.id == select(func.min(FreeDeployConfig.id)).scalar_subquery(),
+            FreeDeployConfig.is_active == 1,
+            FreeDeployConfig.claimed_count <= FreeDeployConfig.total_free_deploys - count
+        )
+        .values(claimed_count=FreeDeployConfig.claimed_count + count, updated_at=datetime.utcnow())
+        .returning(FreeDeployConfig.claimed_count, FreeDeployConfig.total_free_deploys)
+    )).first()
+    if not claimed:
+        return False
+
+    logger.info(f"Free deploy{'s' if count > 1 else ''} claimed! {claimed.claimed_count}/{claimed.total_free_deploys} used")
     return True
 
 
+def create_app() -> FastAPI:
+    """The API application: every endpoint, CORS, and the background tasks its lifespan starts"""
+    application = FastAPI(title="AutoClaw - OpenClaw Provisioning Platform", lifespan=lifespan)
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    application.include_router(router)
+    return application
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command == "migrate":
+        prepare_database()
+    elif command == "worker":
+        asyncio.run(run_worker())
+    else:
+        import uvicorn
+        # Local development: bring the schema up to date, then serve
+        prepare_database()
+        uvicorn.run(app, host="0.0.0.0", port=8000)
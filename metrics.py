@@ -0,0 +1,116 @@
+"""
+Minimal Prometheus metrics for the /metrics endpoint.
+
+Counters, gauges and histograms keyed by label values, rendered in the Prometheus
+text exposition format. Values are per process: with separate worker processes,
+scrape each of them.
+"""
+
+import threading
+from typing import Iterable
+
+# Provisioning phases take from about a second (a warm claim) to many minutes
+DURATION_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600, 900)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _samples(self) -> list:
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def replace(self, values: dict):
+        """Swap in a full set of samples, {label values tuple: value}"""
+        with self._lock:
+            self._values = dict(values)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> list:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
@@ -0,0 +1,142 @@
+"""
+Versioned schema migrations for SQLite and PostgreSQL.
+
+Tables are created by SQLAlchemy's create_all; everything create_all cannot do on
+an existing database (new columns, indexes) is a numbered migration here. Applied
+versions are recorded in schema_migrations, and each migration runs in its own
+transaction together with its bookkeeping row.
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the Postgres advisory lock that serializes concurrent runners
+MIGRATION_LOCK_KEY = 0x6175746f636c
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    """ADD COLUMN unless it exists (create_all already adds it on fresh databases)"""
+    columns = {existing["name"] for existing in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _add_is_free_deploy(conn: Connection):
+    _add_column(conn, "deployments", "is_free_deploy", "INTEGER DEFAULT 0")
+
+
+def _deployment_indexes(conn: Connection):
+    # Wallet listings (/deployments?wallet=, the dashboard) page newest first
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_deployments_wallet_created "
+        "ON deployments (wallet_address, created_at, deployment_id)"
+    ))
+    # Unfiltered keyset pagination on (created_at, deployment_id)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_deployments_created "
+        "ON deployments (created_at, deployment_id)"
+    ))
+    # Expiry checks only ever look at live deployments, which are a small slice of history
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_deployments_live_expiry "
+        "ON deployments (expires_at) WHERE status IN ('ready', 'expired')"
+    ))
+
+
+def _hibernation(conn: Connection):
+    _add_column(conn, "deployments", "snapshot_id", "VARCHAR")
+    _add_column(conn, "deployments", "hibernated_at", "TIMESTAMP")
+    # Snapshot retention walks hibernated deployments oldest first
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_deployments_hibernated "
+        "ON deployments (hibernated_at) WHERE status = 'hibernated'"
+    ))
+
+
+def _boot_configuration(conn: Connection):
+    _add_column(conn, "provision_jobs", "bootstrap_fetched_at", "TIMESTAMP")
+    _add_column(conn, "provision_jobs", "bootstrap_report", "TEXT")
+
+
+def _phase_timings(conn: Connection):
+    _add_column(conn, "deployments", "phase_timings", "TEXT")
+    # /metrics counts in-flight deployments by status on every scrape
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_deployments_in_flight ON deployments (status) "
+        "WHERE status IN ('pending', 'creating_droplet', 'waiting_for_droplet', 'configuring_openclaw', 'restoring')"
+    ))
+
+
+def _provision_batches(conn: Connection):
+    _add_column(conn, "deployments", "batch_id", "VARCHAR")
+    # Batch progress reads every deployment of one batch
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_deployments_batch_id ON deployments (batch_id)"))
+
+
+# (version, name, apply). Append only; never renumber or edit an applied migration
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add_is_free_deploy", _add_is_free_deploy),
+    (2, "deployment_indexes", _deployment_indexes),
+    (3, "hibernation", _hibernation),
+    (4, "boot_configuration", _boot_configuration),
+    (5, "phase_timings", _phase_timings),
+    (6, "provision_batches", _provision_batches),
+]
+
+
+def _ensure_version_table(engine: Engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "name VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine: Engine) -> set:
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine, target: Optional[int] = None) -> list:
+    """
+    Apply every pending migration up to target (default: all) and return the versions applied.
+
+    On PostgreSQL concurrent runners (several web/worker processes starting at once)
+    are serialized with an advisory lock; the losers find nothing left to do.
+    """
+    _ensure_version_table(engine)
+    is_postgres = engine.dialect.name == "postgresql"
+    applied = []
+
+    with engine.connect() as lock_conn:
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            done = applied_versions(engine)
+            for version, name, apply in MIGRATIONS:
+                if version in done or (target is not None and version > target):
+                    continue
+                with engine.begin() as conn:
+                    apply(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                        {"version": version, "name": name, "applied_at": datetime.utcnow()}
+                    )
+                applied.append(version)
+                logger.info(f"Migration {version} ({name}) applied")
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                lock_conn.commit()
+
+    return applied
@@ -0,0 +1,82 @@
+"""
+Probe-driven waiting for provisioning phases.
+
+Instead of fixed sleeps, each phase polls a cheap readiness probe with jittered
+exponential backoff and moves on the moment the probe succeeds.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbePolicy:
+    """How long a phase may wait and how its probe interval grows"""
+    timeout: float
+    initial_delay: float = 1.0
+    max_delay: float = 10.0
+    factor: float = 2.0
+    jitter: float = 0.5
+
+
+def backoff_delays(policy: ProbePolicy) -> Iterator[float]:
+    """Yield jittered exponential delays, capped at policy.max_delay"""
+    delay = policy.initial_delay
+    while True:
+        # Equal jitter: keep at least (1 - jitter) of the delay so probes never bunch up at zero
+        yield delay * (1 - policy.jitter * random.random())
+        delay = min(policy.max_delay, delay * policy.factor)
+
+
+async def wait_until(probe: Callable[[], Awaitable[object]], policy: ProbePolicy, description: str):
+    """
+    Await probe until it returns a truthy value and return that value.
+
+    Exceptions raised by the probe count as "not ready yet". Raises TimeoutError
+    once policy.timeout seconds have passed without a successful probe.
+    """
+    started = time.monotonic()
+    deadline = started + policy.timeout
+    delays = backoff_delays(policy)
+    attempts = 0
+    last_error: Optional[Exception] = None
+
+    while True:
+        attempts += 1
+        try:
+            result = await probe()
+        except Exception as e:
+            result = None
+            last_error = e
+            logger.info(f"{description}: probe failed ({e})")
+
+        if result:
+            logger.info(f"{description}: ready after {time.monotonic() - started:.1f}s ({attempts} probes)")
+            return result
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            detail = f" (last error: {last_error})" if last_error else ""
+            raise TimeoutError(f"{description}: not ready within {policy.timeout:.0f} seconds{detail}")
+
+        await asyncio.sleep(min(next(delays), remaining))
+
+
+async def tcp_port_open(host: str, port: int, timeout: float = 2.0) -> bool:
+    """Cheap TCP connect probe"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
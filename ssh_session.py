@@ -0,0 +1,238 @@
+"""
+Reusable SSH sessions for droplet provisioning.
+
+One SSHSession keeps a single authenticated paramiko Transport alive for a droplet
+for the whole provisioning run. Commands and SFTP open channels on that transport,
+and the session reconnects transparently if the transport drops.
+
+AsyncSSHSession exposes the same session to asyncio code. Each blocking paramiko
+call runs on a small dedicated executor and holds a thread only while it is doing
+network I/O; all waiting between calls happens on the event loop.
+"""
+
+import asyncio
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+# paramiko (and the cryptography stack under it) is imported on first connect, not at import
+if TYPE_CHECKING:
+    import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Process-wide counters across all sessions
+_totals_lock = threading.Lock()
+_totals = {
+    "sessions": 0,
+    "handshakes": 0,
+    "handshake_failures": 0,
+    "handshake_seconds": 0.0,
+    "commands": 0,
+}
+
+
+def session_totals() -> dict:
+    """Aggregate handshake/command counters for every session created by this process"""
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["avg_handshake_seconds"] = (
+        totals["handshake_seconds"] / totals["handshakes"] if totals["handshakes"] else 0.0
+    )
+    return totals
+
+
+def _add_totals(**deltas):
+    with _totals_lock:
+        for key, value in deltas.items():
+            _totals[key] += value
+
+
+class SSHSession:
+    """A per-droplet SSH connection that is reused across provisioning phases"""
+
+    def __init__(
+        self,
+        host: str,
+        key_filename: str,
+        username: str = "root",
+        port: int = 22,
+        connect_timeout: float = 30,
+        keepalive_interval: int = 30,
+    ):
+        self.host = host
+        self.key_filename = key_filename
+        self.username = username
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.keepalive_interval = keepalive_interval
+
+        self._client: Optional["paramiko.SSHClient"] = None
+        self._lock = threading.RLock()
+
+        self.handshakes = 0
+        self.handshake_failures = 0
+        self.reconnects = 0
+        self.commands = 0
+        self.handshake_seconds = 0.0
+        self.last_handshake_seconds: Optional[float] = None
+
+        _add_totals(sessions=1)
+
+    @property
+    def is_connected(self) -> bool:
+        transport = self._client.get_transport() if self._client else None
+        return bool(transport and transport.is_active())
+
+    def connect(self, timeout: Optional[float] = None) -> "paramiko.SSHClient":
+        """Return the connected client, doing a TCP/kex/auth handshake only if needed"""
+        import paramiko
+
+        with self._lock:
+            if self.is_connected:
+                return self._client
+
+            if self._client is not None:
+                # The previous transport dropped; this is a reconnect
+                self.reconnects += 1
+                self._close_client()
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            connect_timeout = timeout or self.connect_timeout
+
+            started = time.monotonic()
+            try:
+                client.connect(
+                    self.host,
+                    port=self.port,
+                    username=self.username,
+                    key_filename=self.key_filename,
+                    timeout=connect_timeout,
+                    banner_timeout=connect_timeout,
+                    auth_timeout=connect_timeout,
+                )
+            except Exception:
+                client.close()
+                self.handshake_failures += 1
+                _add_totals(handshake_failures=1)
+                raise
+
+            elapsed = time.monotonic() - started
+            client.get_transport().set_keepalive(self.keepalive_interval)
+
+            self._client = client
+            self.handshakes += 1
+            self.handshake_seconds += elapsed
+            self.last_handshake_seconds = elapsed
+            _add_totals(handshakes=1, handshake_seconds=elapsed)
+            logger.info(f"SSH handshake with {self.host} took {elapsed:.2f}s (handshake #{self.handshakes})")
+            return client
+
+    def exec(self, command: str, timeout: Optional[float] = None) -> tuple:
+        """
+        Run a command on a new channel and wait for it.
+
+        Returns (exit_status, stdout, stderr). If the channel cannot be opened because the
+        transport went away, the session reconnects and retries once; the command itself
+        is never re-run once it has started.
+        """
+        import paramiko
+
+        for attempt in range(2):
+            client = self.connect()
+            try:
+                stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+                break
+            except (paramiko.SSHException, EOFError, socket.error):
+                if attempt:
+                    raise
+                logger.info(f"SSH transport to {self.host} dropped, reconnecting")
+                with self._lock:
+                    self._close_client()
+                    self.reconnects += 1
+
+        self.commands += 1
+        _add_totals(commands=1)
+        out = stdout.read().decode()
+        err = stderr.read().decode()
+        exit_status = stdout.channel.recv_exit_status()
+        return exit_status, out, err
+
+    def open_sftp(self) -> "paramiko.SFTPClient":
+        """Open an SFTP subsystem channel on the shared transport"""
+        return self.connect().open_sftp()
+
+    def stats(self) -> dict:
+        return {
+            "host": self.host,
+            "handshakes": self.handshakes,
+            "handshake_failures": self.handshake_failures,
+            "reconnects": self.reconnects,
+            "commands": self.commands,
+            "handshake_seconds": round(self.handshake_seconds, 3),
+            "last_handshake_seconds": (
+                round(self.last_handshake_seconds, 3) if self.last_handshake_seconds is not None else None
+            ),
+        }
+
+    def _close_client(self):
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception:
+                pass
+            self._client = None
+
+    def close(self):
+        with self._lock:
+            self._close_client()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncSSHSession:
+    """asyncio facade over an SSHSession"""
+
+    def __init__(self, session: SSHSession, executor: ThreadPoolExecutor, command_timeout: float = 120):
+        self.session = session
+        self.executor = executor
+        self.command_timeout = command_timeout
+
+    @property
+    def host(self) -> str:
+        return self.session.host
+
+    @property
+    def port(self) -> int:
+        return self.session.port
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(session, *args) on the SSH executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, self.session, *args)
+
+    async def connect(self, timeout: Optional[float] = None):
+        await self.run(lambda session: session.connect(timeout=timeout))
+
+    async def exec(self, command: str, timeout: Optional[float] = None) -> tuple:
+        return await self.run(lambda session: session.exec(command, timeout=timeout or self.command_timeout))
+
+    async def close(self):
+        await self.run(lambda session: session.close())
+
+    def stats(self) -> dict:
+        return self.session.stats()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,58 @@
+"""
+In-process pub/sub for deployment status changes.
+
+Writers publish a deployment's status snapshot after committing it; Server-Sent
+Events streams subscribe per deployment and forward each snapshot as it happens.
+"""
+
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StatusBroker:
+    """Fan-out of status snapshots to the subscribers of each deployment"""
+
+    def __init__(self, max_queued: int = 100):
+        self.max_queued = max_queued
+        self._subscribers = {}
+        self.published = 0
+
+    def subscribe(self, deployment_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        self._subscribers.setdefault(deployment_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, deployment_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(deployment_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[deployment_id]
+
+    def publish(self, deployment_id: str, snapshot: dict):
+        """Deliver a snapshot to every subscriber; must be called on the event loop thread"""
+        self.published += 1
+        for queue in self._subscribers.get(deployment_id, ()):
+            if queue.full():
+                # A slow client only needs the latest state
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "deployments": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+        }
+
+
+def sse_event(data: dict, event: str = "status") -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"